@@ -0,0 +1,397 @@
+import argparse
+import contextlib
+import gzip
+import json
+import lzma
+import os
+import shutil
+import sqlite3
+from datetime import datetime, timedelta
+
+import database as db
+import write_buffer
+from config import (
+    BACKUP_DIR, BACKUP_KEEP, BACKUP_COMPRESSION, BACKUP_PART_SIZE, BACKUP_FULL_INTERVAL_DAYS
+)
+
+# Siqish turlari: nomi -> (kengaytma, ochuvchi funksiya)
+COMPRESSORS = {
+    'gzip': ('.gz', gzip.open),
+    'xz': ('.xz', lzma.open),
+}
+
+COPY_CHUNK = 1024 * 1024
+
+# Tiklash uchun qabul qilinadigan fayl turlari
+RESTORE_EXTENSIONS = ('.db', '.db.gz', '.db.xz')
+
+class RestoreError(Exception):
+    """Zaxira fayli tiklash uchun yaroqsiz"""
+
+def snapshot(dest_path, pages=256, sleep=0.005):
+    """Bazaning izchil nusxasini olish (sqlite3 backup API, sahifalab)
+
+    Har bir qadamda faqat `pages` ta sahifa ko'chiriladi, qadamlar orasida
+    yozuvchilar ishlashda davom etadi.
+    """
+    # Buferdagi yozuvlar ham nusxaga tushishi uchun
+    write_buffer.flush_all()
+    source = db.get_connection()
+    target = sqlite3.connect(dest_path)
+    try:
+        source.backup(target, pages=pages, sleep=sleep)
+    finally:
+        target.close()
+        source.close()
+
+def compress(src_path, compression=BACKUP_COMPRESSION):
+    """Faylni oqim bilan siqish, siqilgan fayl yo'lini qaytaradi"""
+    extension, opener = COMPRESSORS[compression]
+    dest_path = src_path + extension
+    
+    with open(src_path, 'rb') as source, opener(dest_path, 'wb') as target:
+        shutil.copyfileobj(source, target, COPY_CHUNK)
+    
+    return dest_path
+
+def split(path, part_size=BACKUP_PART_SIZE):
+    """Katta faylni Bot API chegarasiga sig'adigan bo'laklarga ajratish"""
+    if os.path.getsize(path) <= part_size:
+        return [path]
+    
+    parts = []
+    with open(path, 'rb') as source:
+        while True:
+            part_path = f"{path}.part{len(parts) + 1:03d}"
+            written = 0
+            with open(part_path, 'wb') as target:
+                while written < part_size:
+                    chunk = source.read(min(COPY_CHUNK, part_size - written))
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    written += len(chunk)
+            
+            if written == 0:
+                os.remove(part_path)
+                break
+            parts.append(part_path)
+    
+    os.remove(path)
+    return parts
+
+def list_backups():
+    """Lokal nusxalar: {nusxa nomi: [fayllar]}, eng yangisi birinchi"""
+    if not os.path.isdir(BACKUP_DIR):
+        return {}
+    
+    backups = {}
+    for filename in sorted(os.listdir(BACKUP_DIR), reverse=True):
+        if not filename.startswith('backup_'):
+            continue
+        # backup_YYYYmmdd_HHMMSS
+        name = filename[:22]
+        backups.setdefault(name, []).append(os.path.join(BACKUP_DIR, filename))
+    
+    for files in backups.values():
+        files.sort()
+    return backups
+
+def is_delta(files):
+    """Nusxa inkremental (delta) fayllardan iboratmi"""
+    return any('.delta.' in os.path.basename(path) for path in files)
+
+def rotate(keep=BACKUP_KEEP):
+    """Eng yangi `keep` ta nusxadan boshqasini o'chirish
+
+    Eng oxirgi to'liq nusxa har doim saqlanadi - deltalar unga tayanadi.
+    """
+    backups = list(list_backups().items())
+    latest_full = next((name for name, files in backups if not is_delta(files)), None)
+    
+    removed = 0
+    for name, files in backups[keep:]:
+        if name == latest_full:
+            continue
+        for path in files:
+            os.remove(path)
+        removed += 1
+    return removed
+
+def create_backup(compression=BACKUP_COMPRESSION):
+    """To'liq zaxira: nusxa -> siqish -> bo'laklash -> rotatsiya
+
+    Yuborish uchun tayyor fayllar ro'yxatini qaytaradi.
+    """
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    raw_path = os.path.join(BACKUP_DIR, f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
+    
+    # Nusxadan oldingi jurnal boshi: undan keyingi o'zgarishlar deltaga kiradi
+    journal_head = db.get_journal_head()
+    snapshot(raw_path)
+    try:
+        archive_path = compress(raw_path, compression)
+    finally:
+        os.remove(raw_path)
+    
+    files = split(archive_path)
+    db.trim_journal(journal_head)
+    db.set_setting('journal_base_id', journal_head)
+    db.set_setting('last_full_backup', os.path.basename(raw_path))
+    db.set_setting('last_full_backup_at', datetime.now().isoformat())
+    rotate()
+    db.set_setting('last_backup_at', datetime.now().isoformat())
+    return files
+
+def create_incremental_backup():
+    """Oxirgi to'liq zaxiradan beri o'zgarishlar (delta) fayli
+
+    Har bir delta oxirgi to'liq nusxaga nisbatan barcha o'zgarishlarni
+    o'z ichiga oladi - tiklash uchun to'liq nusxa + eng oxirgi delta yetarli.
+    """
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    base_id = int(db.get_setting('journal_base_id', 0))
+    head_id = db.get_journal_head()
+    delta_path = os.path.join(BACKUP_DIR, f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.delta.jsonl.gz")
+    
+    changes = 0
+    with gzip.open(delta_path, 'wt', encoding='utf-8') as target:
+        header = {
+            'base_backup': db.get_setting('last_full_backup'),
+            'base_id': base_id,
+            'head_id': head_id,
+            'schema_version': db.SCHEMA_VERSION,
+        }
+        target.write(json.dumps(header) + '\n')
+        for change in db.iter_journal(base_id, head_id):
+            target.write(json.dumps(change, ensure_ascii=False) + '\n')
+            changes += 1
+    
+    files = split(delta_path)
+    rotate()
+    db.set_setting('last_backup_at', datetime.now().isoformat())
+    return files, changes
+
+def create_scheduled_backup():
+    """Avto-zaxira: rejimga qarab to'liq yoki delta
+
+    Inkremental rejimda ham har BACKUP_FULL_INTERVAL_DAYS kunda to'liq nusxa olinadi.
+    """
+    last_full = db.get_setting('last_full_backup_at')
+    full_due = (
+        not last_full
+        or datetime.now() - datetime.fromisoformat(last_full) >= timedelta(days=BACKUP_FULL_INTERVAL_DAYS)
+    )
+    if db.is_incremental_backup_enabled() and not full_due:
+        files, _ = create_incremental_backup()
+        return files
+    return create_backup()
+
+def seconds_until(hour, minute=0, now=None):
+    """Keyingi soat HH:MM gacha qolgan soniyalar"""
+    now = now or datetime.now()
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+def is_backup_due(max_age_hours=24):
+    """Oxirgi avto-zaxiradan beri `max_age_hours` soat o'tganmi"""
+    last_backup = db.get_setting('last_backup_at')
+    if not last_backup:
+        return True
+    return datetime.now() - datetime.fromisoformat(last_backup) > timedelta(hours=max_age_hours)
+
+# ============ Zaxiradan tiklash ============
+
+def decompress(path):
+    """Siqilgan faylni yonidagi .db faylga ochish, .db yo'lini qaytaradi"""
+    for extension, opener in COMPRESSORS.values():
+        if path.endswith(extension):
+            dest_path = path[:-len(extension)]
+            try:
+                with opener(path, 'rb') as source, open(dest_path, 'wb') as target:
+                    shutil.copyfileobj(source, target, COPY_CHUNK)
+            except (OSError, EOFError, lzma.LZMAError) as e:
+                # open() ning o'zi muvaffaqiyatsiz bo'lsa fayl yaratilmagan bo'ladi
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(dest_path)
+                raise RestoreError(f"arxivni ochib bo'lmadi: {e}")
+            return dest_path
+    return path
+
+def open_backup(path):
+    """Zaxira faylini o'qish uchun ochish (siqilgan bo'lsa ochib)"""
+    for extension, opener in COMPRESSORS.values():
+        if path.endswith(extension):
+            return opener(path, 'rb')
+    return open(path, 'rb')
+
+def validate(path):
+    """Faylni tekshirish va eski versiyani joriy sxemaga keltirish
+
+    Tekshiruvlar: PRAGMA integrity_check, majburiy jadvallar va sxema versiyasi.
+    Faylning asl sxema versiyasini qaytaradi.
+    """
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        try:
+            result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            raise RestoreError(f"SQLite bazasi emas: {e}")
+        if result != 'ok':
+            raise RestoreError(f"integrity_check: {result}")
+        
+        tables = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        missing = [table for table in db.REQUIRED_TABLES if table not in tables]
+        if missing:
+            raise RestoreError(f"jadvallar yo'q: {', '.join(missing)}")
+        
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version > db.SCHEMA_VERSION:
+            raise RestoreError(f"sxema versiyasi {version} botning versiyasidan ({db.SCHEMA_VERSION}) yangi")
+        
+        # Sahifa o'lchami jonli baza bilan bir xil bo'lishi kerak (WAL rejimida backup talabi)
+        live = db.get_connection()
+        live_page_size = live.execute('PRAGMA page_size').fetchone()[0]
+        live.close()
+        if conn.execute('PRAGMA page_size').fetchone()[0] != live_page_size:
+            conn.execute('PRAGMA journal_mode=DELETE')
+            conn.execute(f'PRAGMA page_size = {live_page_size}')
+            conn.execute('VACUUM')
+        
+        if version < db.SCHEMA_VERSION:
+            db.migrate(conn)
+        return version
+    finally:
+        conn.close()
+
+def apply_restore(path):
+    """Tekshirilgan bazani jonli bazaga atomik ko'chirish
+
+    Nusxa bitta backup qadamida (bitta tranzaksiyada) yoziladi: boshqa
+    ulanishlar yoki eski, yoki to'liq yangi ma'lumotni ko'radi. Buferdagi
+    yozuvlar avval eski bazaga yoziladi - keyin tiklangan bazaga tushmaydi.
+    """
+    with db.write_lock():
+        write_buffer.flush_all()
+        source = sqlite3.connect(path)
+        target = db.get_connection()
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        db.invalidate_caches()
+
+def restore_from_file(upload_path):
+    """Yuklangan zaxiradan tiklash: ochish -> tekshirish -> ko'chirish
+
+    Faylning asl sxema versiyasini qaytaradi, yaroqsiz bo'lsa RestoreError.
+    """
+    db_path = upload_path
+    try:
+        db_path = decompress(upload_path)
+        version = validate(db_path)
+        apply_restore(db_path)
+        return version
+    finally:
+        for path in {upload_path, db_path, db_path + '-wal', db_path + '-shm'}:
+            if os.path.exists(path):
+                os.remove(path)
+
+# ============ Deltani qayta qo'llash ============
+
+def replay_delta(conn, delta_path, credits=None):
+    """Delta faylidagi o'zgarishlarni bazaga qo'llash (commit qilmaydi)
+
+    credits berilsa, balanslarga tushgan summalar o'zgarish kuni bo'yicha
+    unga qo'shiladi ({kun: summa}) - kunlik balance_credits uchun.
+    """
+    columns = {}
+    applied = 0
+    
+    with gzip.open(delta_path, 'rt', encoding='utf-8') as source:
+        header = json.loads(source.readline())
+        for line in source:
+            change = json.loads(line)
+            table = change['table_name']
+            key = db.JOURNALED_TABLES[table]
+            
+            if change['op'] == 'delete':
+                if table == 'withdrawals':
+                    # Retention o'chirgani - jami hisobda qolishi kerak (settings jurnalga yozilmaydi)
+                    db.preserve_withdrawal_totals(conn.cursor(), [change['row_key']])
+                conn.execute(f'DELETE FROM {table} WHERE {key} = ?', (change['row_key'],))
+            else:
+                if table not in columns:
+                    columns[table] = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+                row = {c: v for c, v in json.loads(change['row_data']).items() if c in columns[table]}
+                if table == 'balances' and credits is not None:
+                    previous = conn.execute('SELECT total_earned FROM balances WHERE user_id = ?',
+                                            (change['row_key'],)).fetchone()
+                    earned = (row.get('total_earned') or 0) - (previous[0] if previous else 0)
+                    if earned > 0:
+                        day = change['changed_at'][:10]
+                        credits[day] = credits.get(day, 0) + earned
+                names = ', '.join(row)
+                placeholders = ', '.join('?' for _ in row)
+                conn.execute(f'INSERT OR REPLACE INTO {table} ({names}) VALUES ({placeholders})', list(row.values()))
+            applied += 1
+    
+    return header, applied
+
+def _backup_day(name):
+    """'backup_YYYYmmdd_HHMMSS.db' -> 'YYYY-mm-dd' (nom noma'lum bo'lsa None)"""
+    try:
+        return datetime.strptime(name[7:22], '%Y%m%d_%H%M%S').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+def restore_incremental(full_path, delta_paths, output_path):
+    """To'liq nusxa + deltalardan yangi baza fayli yig'ish
+
+    Natija oddiy .db fayl - uni bot orqali odatdagidek tiklash mumkin.
+    """
+    with open_backup(full_path) as source, open(output_path, 'wb') as target:
+        shutil.copyfileobj(source, target, COPY_CHUNK)
+    
+    conn = sqlite3.connect(output_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        # Triggerlar kunlik statistikani "bugun" ga yozib yubormasligi uchun
+        daily_rollups = conn.execute('SELECT day, metric, value FROM daily_rollups').fetchall()
+        credits = {}
+        base_day = None
+        
+        for delta_path in delta_paths:
+            header, applied = replay_delta(conn, delta_path, credits)
+            base_day = base_day or _backup_day(header.get('base_backup'))
+            print(f"{delta_path}: {applied} ta o'zgarish (asos: {header.get('base_backup')})")
+        
+        # To'liq nusxadagi statistika, undan keyingi kunlar esa tiklangan qatorlardan qayta hisoblanadi
+        conn.execute('DELETE FROM daily_rollups')
+        conn.executemany('INSERT INTO daily_rollups (day, metric, value) VALUES (?, ?, ?)', daily_rollups)
+        since = base_day or min(credits, default=None)
+        if since:
+            db._backfill_daily_rollups(conn.cursor(), since)
+        conn.executemany('''
+            INSERT INTO daily_rollups (day, metric, value) VALUES (?, 'balance_credits', ?)
+            ON CONFLICT(day, metric) DO UPDATE SET value = value + excluded.value
+        ''', credits.items())
+        db.rebuild_stats_counters(conn)
+        conn.execute('DELETE FROM change_journal')
+        conn.commit()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="To'liq zaxira + delta fayllardan bazani tiklash")
+    parser.add_argument('full', help="to'liq zaxira (.db, .db.gz, .db.xz)")
+    parser.add_argument('deltas', nargs='+', help='delta fayllar (.delta.jsonl.gz), eskisidan yangisiga')
+    parser.add_argument('-o', '--output', default='restored.db', help='natija fayli')
+    args = parser.parse_args()
+    
+    restore_incremental(args.full, args.deltas, args.output)
+    print(f"Tayyor: {args.output} - uni botga zaxira sifatida yuboring")
@@ -7,6 +7,9 @@ load_dotenv()
 # Bot konfiguratsiyasi
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
+# Bot API server manzili (bo'sh - api.telegram.org; masalan lokal tools/fake_bot_api.py)
+TELEGRAM_API_SERVER = os.getenv("TELEGRAM_API_SERVER", "")
+
 # Admin ID raqamlari (bir nechta admin bo'lishi mumkin)
 ADMINS = [int(os.getenv("ADMIN_ID", 0)), 5425876649]
 
@@ -15,14 +18,91 @@ API_ID = int(os.getenv("API_ID", 32774640))
 API_HASH = os.getenv("API_HASH", "9adc3168498b133b918d793d6377ffe1")
 
 # Database fayli
-DATABASE_FILE = "bot_database.db"
+DATABASE_FILE = os.getenv("DATABASE_FILE", "bot_database.db")
 
 # User sessions papkasi
 SESSIONS_DIR = "sessions"
 
+# Zaxira nusxalar
+BACKUP_DIR = "backups"
+BACKUP_KEEP = 7  # Saqlanadigan lokal nusxalar soni
+BACKUP_COMPRESSION = "gzip"  # gzip yoki xz
+BACKUP_PART_SIZE = 45 * 1024 * 1024  # Bot API 50 MB yuklash chegarasidan kichik
+BACKUP_HOUR = 3  # Avto-zaxira vaqti (soat 03:00)
+BACKUP_FULL_INTERVAL_DAYS = 7  # Inkremental rejimda to'liq zaxira oralig'i
+
 # Referal tizimi
 REFERRAL_REWARD = 1000  # Har bir referal uchun 1000 so'm
 MIN_WITHDRAWAL = 15000  # Minimal pul yechish 15000 so'm
+REQUIRED_REFERRALS = 5  # Xizmatlarga kirish uchun kerakli referal soni
+
+# Ma'lumotlarni saqlash muddati, kun (0 - o'chirilmaydi); retention.py
+RETENTION_DAYS = {
+    'join_requests': 180,  # Faqat faol bo'lmagan kanallar so'rovlari
+    'bot_started': 180,
+    'user_history': 365,
+    'withdrawals': 180,  # Qayta ishlanganlari, ARCHIVE_DIR ga arxivlanadi
+    'outbox': 30,  # Yuborilgan va "dead" xabarlar
+    'change_journal': 30,  # Faqat inkremental rejim o'chiq bo'lsa; oxirida (boshqalarning o'chirishlari ham)
+}
+RETENTION_BATCH = 500  # Bitta tranzaksiyada o'chiriladigan qatorlar
+RETENTION_HOUR = 4  # Kunlik tozalash vaqti (soat 04:00)
+ARCHIVE_DIR = "archive"
+
+# Xabarlar navbati (outbox)
+OUTBOX_RATE = 20  # Soniyasiga yuboriladigan xabarlar (Bot API ~30/s chegarasidan past)
+OUTBOX_MAX_ATTEMPTS = 5  # Shundan keyin xabar "dead" holatiga o'tadi
+
+# Write-behind bufer (join request va bot_started yozuvlari guruhlab yoziladi)
+WRITE_BUFFER_MAX_ROWS = 500  # Shuncha qator yig'ilsa darhol yoziladi
+WRITE_BUFFER_MAX_DELAY_MS = 200  # Qator buferda ko'pi bilan shuncha turadi
+
+# Monitoring (Prometheus /metrics), 0 - o'chirilgan
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+
+# SQL profiler (DB_PROFILE=1 bilan yoqiladi)
+DB_PROFILE = os.getenv("DB_PROFILE", "0") == "1"
+DB_SLOW_QUERY_MS = int(os.getenv("DB_SLOW_QUERY_MS", 50))
+
+# Event loop watchdog: heartbeat oralig'i va bloklanish chegarasi, ms
+LOOP_HEARTBEAT_MS = int(os.getenv("LOOP_HEARTBEAT_MS", 100))
+LOOP_STALL_THRESHOLD_MS = int(os.getenv("LOOP_STALL_THRESHOLD_MS", 300))
+LOOP_STALL_HISTORY = 50  # Xotirada saqlanadigan oxirgi bloklanishlar
+
+# Xotira: keshlar uchun umumiy byudjet (oshsa tozalanadi) va tekshiruv oralig'i, soniya
+CACHE_MEMORY_BUDGET_MB = int(os.getenv("CACHE_MEMORY_BUDGET_MB", 64))
+MEMORY_CHECK_INTERVAL = 60
+TRACEMALLOC_FRAMES = 10  # /memory start da saqlanadigan stack chuqurligi
+
+# Foydalanuvchi bo'yicha cheklov (token bucket): sinf -> (soniyasiga tiklanadigan token, sig'im)
+THROTTLING = os.getenv("THROTTLING", "1") == "1"
+THROTTLE_RATES = {
+    'default': (2, 8),  # Oddiy menyu tugmalari va xabarlar
+    'gated': (0.5, 4),  # Obuna tekshiruvi (har bir kanal uchun get_chat_member)
+    'callback': (1, 6),  # Inline tugmalar
+    'search': (0.2, 3),  # Qidiruv va telefon raqamini aniqlash
+    'login': (0.2, 6),  # Telegram akkauntga kirish bosqichlari (MTProto so'rovlari)
+}
+
+# Logging: navbat orqali alohida threadda yoziladi; bitta joydan (fayl:qator) chiqadigan
+# xabarlar LOG_RATE_WINDOW soniyada LOG_RATE_LIMIT tadan oshsa har LOG_SAMPLE_EVERY tadan biri yoziladi
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", 20))
+LOG_RATE_WINDOW = 10
+LOG_SAMPLE_EVERY = 100
+LOG_QUEUE_SIZE = 10000  # To'lsa yangi yozuvlar tashlanadi (loop kutmaydi)
+
+# Tracing: har bir update uchun spanlar (DB, Bot API, MTProto) JSONL faylga (TRACING=1 bilan yoqiladi)
+TRACING = os.getenv("TRACING", "0") == "1"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.01))  # Oddiy updatelar ulushi
+TRACE_SLOW_MS = int(os.getenv("TRACE_SLOW_MS", 1000))  # Bundan sekin va xatoli updatelar doim yoziladi
+TRACE_MAX_SPANS = 500  # Bitta trace dagi spanlar chegarasi
+TRACE_FILE = os.getenv("TRACE_FILE", "traces/traces.jsonl")
+TRACE_FILE_MAX_MB = 20  # Shundan keyin fayl aylantiriladi (traces.jsonl.1, .2, ...)
+TRACE_FILE_BACKUPS = 5
+
+# To'xtash (SIGTERM) da ishlanayotgan updatelar va xizmatlarni kutish muddati, soniya
+SHUTDOWN_TIMEOUT = int(os.getenv("SHUTDOWN_TIMEOUT", 20))
 
 # Bot haqida
 BOT_NAME = "Tahlilchi Bot"
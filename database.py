@@ -1,18 +1,133 @@
+import json
 import sqlite3
-from datetime import datetime
-from config import DATABASE_FILE
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from config import DATABASE_FILE, REQUIRED_REFERRALS
+from models import User, UserSession, PendingWithdrawal
+from write_buffer import WriteBuffer
+
+# Sxema versiyasi (PRAGMA user_version) - sxema o'zgarganda oshiriladi
+SCHEMA_VERSION = 5
+
+# Zaxiradan tiklash uchun majburiy jadvallar
+REQUIRED_TABLES = (
+    'users', 'user_history', 'channels', 'join_requests', 'user_groups', 'referrals',
+    'settings', 'user_sessions', 'bot_started', 'balances', 'withdrawals'
+)
+
+# Bazani butunlay almashtiruvchi amallar uchun qulf
+_write_lock = threading.RLock()
+
+# Bazadagi ma'lumotga bog'liq xotira keshlari (tiklashdan keyin tozalanadi)
+_cache_invalidators = []
+
+# Keshlar avlodi: invalidate_caches() oshiradi. Yuklovchi o'qishdan oldingi avlodni
+# eslab qoladi va u o'zgargan bo'lsa (o'qish eski bazadan bo'lgan) natijani keshga yozmaydi
+_cache_generation = 0
+_cache_lock = threading.Lock()
+
+# Xizmatlarga kirishi ochilgan foydalanuvchilar (flag qaytarilmaydi - kesh xavfsiz)
+_unlocked_users = set()
+
+# settings jadvali (key -> value) va faol kanallar; None - hali yuklanmagan
+_settings_cache = None
+_channels_cache = None
+
+# SQL so'rovlarini kuzatuvchilar (metrics, profiler) - har bir statement matni bilan chaqiriladi
+_statement_listeners = []
+
+def add_statement_listener(func):
+    """Bajarilgan har bir SQL statement haqida xabar oluvchi funksiyani qo'shish"""
+    _statement_listeners.append(func)
+    return func
+
+def _notify_statement(statement):
+    for listener in _statement_listeners:
+        listener(statement)
+
+# Ulanish klassi (profiler o'z klassini o'rnatishi mumkin)
+_connection_factory = sqlite3.Connection
+
+def set_connection_factory(factory):
+    """get_connection ishlatadigan sqlite3.Connection klassini almashtirish"""
+    global _connection_factory
+    _connection_factory = factory
 
 def get_connection():
     """Database ulanishini olish"""
-    conn = sqlite3.connect(DATABASE_FILE)
+    conn = sqlite3.connect(DATABASE_FILE, factory=_connection_factory)
     conn.row_factory = sqlite3.Row
+    if _statement_listeners:
+        conn.set_trace_callback(_notify_statement)
     return conn
 
+@contextmanager
+def write_lock():
+    """Bazani almashtiruvchi va ommaviy amallar (tiklash, retention, VACUUM) uchun jarayon ichidagi qulf
+
+    Oddiy yozuvchilar va kesh yuklovchilar bu qulfni olmaydi - ularni ketma-ket
+    qilmaydi. Qatorlar atomarligini SQLite tranzaksiyalari (tiklashda - bitta
+    backup qadami), keshlar izchilligini kesh avlodi ta'minlaydi.
+    """
+    with _write_lock:
+        yield
+
+def register_cache_invalidator(func):
+    """Baza almashtirilganda chaqiriladigan kesh tozalovchini ro'yxatga olish"""
+    _cache_invalidators.append(func)
+    return func
+
+def invalidate_caches():
+    """Barcha xotira keshlarini tozalash (avlod oshadi - parallel yuklovchilar natijasi tashlanadi)"""
+    global _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        for func in _cache_invalidators:
+            func()
+
+def _store_cache(generation, store):
+    """store() ni faqat generation dan beri invalidate_caches() chaqirilmagan bo'lsa bajarish"""
+    with _cache_lock:
+        if generation != _cache_generation:
+            return False
+        store()
+        return True
+
+def memory_caches():
+    """Xotira keshlari hajmini o'lchash uchun: {nom: (keshni qaytaruvchi, tozalovchi)}"""
+    return {
+        'settings': (lambda: _settings_cache, _clear_settings),
+        'channels': (lambda: _channels_cache, _clear_channels),
+        'unlocked_users': (lambda: _unlocked_users, _clear_unlocked_users),
+    }
+
 def init_database():
     """Database jadvallarini yaratish"""
     conn = get_connection()
+    migrate(conn)
+    conn.close()
+
+def checkpoint():
+    """WAL ni asosiy faylga ko'chirish va qisqartirish (to'xtashdan oldin)"""
+    conn = get_connection()
+    result = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+    conn.execute('PRAGMA optimize')
+    conn.close()
+    return tuple(result)
+
+def migrate(conn):
+    """Sxemani joriy versiyaga keltirish (yangi va eski bazalar uchun)"""
     cursor = conn.cursor()
     
+    # Yangi baza: o'chirilgan sahifalar retention.py da qismlab qaytariladi
+    # (mavjud bazani o'tkazish - python retention.py --convert)
+    if cursor.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()[0] == 0:
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    
+    # WAL rejimi - o'quvchilar (zaxira nusxa ham) yozuvchilarni to'smaydi
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
     # Foydalanuvchilar jadvali
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -24,6 +139,7 @@ def init_database():
             language_code TEXT,
             is_bot INTEGER DEFAULT 0,
             is_premium INTEGER DEFAULT 0,
+            is_reachable INTEGER DEFAULT 1,
             created_at TEXT,
             updated_at TEXT
         )
@@ -155,19 +271,406 @@ def init_database():
         )
     ''')
     
+    # Statistika hisoblagichlari (triggerlar orqali yangilanadi)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            key TEXT PRIMARY KEY,
+            value INTEGER DEFAULT 0
+        )
+    ''')
+    
+    # Kunlik statistika (kun + ko'rsatkich bo'yicha)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            day TEXT,
+            metric TEXT,
+            value INTEGER DEFAULT 0,
+            PRIMARY KEY (day, metric)
+        )
+    ''')
+    
+    # Qator darajasidagi o'zgarishlar jurnali (inkremental zaxira uchun)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_journal (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT,
+            op TEXT,
+            row_key INTEGER,
+            row_data TEXT,
+            changed_at TEXT
+        )
+    ''')
+    
+    # Yuborilishi kerak bo'lgan xabarlar (biznes o'zgarishi bilan bitta tranzaksiyada yoziladi)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            kind TEXT,
+            payload TEXT,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at TEXT,
+            last_error TEXT,
+            created_at TEXT,
+            sent_at TEXT
+        )
+    ''')
+    
+    # Eski bazalar uchun yangi ustunlar
+    _add_column(cursor, 'users', 'is_reachable', 'INTEGER DEFAULT 1')
+    if _add_column(cursor, 'users', 'referral_count', 'INTEGER DEFAULT 0'):
+        cursor.execute('''
+            UPDATE users SET referral_count = (
+                SELECT COUNT(*) FROM referrals WHERE referrer_id = users.user_id
+            )
+        ''')
+    if _add_column(cursor, 'users', 'services_unlocked', 'INTEGER DEFAULT 0'):
+        cursor.execute('UPDATE users SET services_unlocked = 1 WHERE referral_count >= ?', (REQUIRED_REFERRALS,))
+    
+    # Indekslar
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at, user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_referrals_referrer ON referrals(referrer_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_withdrawals_status ON withdrawals(status, id)')
+    
+    for trigger_sql in STATS_TRIGGERS:
+        cursor.execute(trigger_sql)
+    
+    # Hisoblagichlar bo'sh bo'lsa - mavjud ma'lumotlardan to'ldirish
+    cursor.execute('SELECT COUNT(*) FROM stats_counters')
+    if cursor.fetchone()[0] == 0:
+        rebuild_stats_counters(conn)
+        _backfill_daily_rollups(cursor)
+    
+    # Jurnal triggerlari ustunlar qo'shilgandan keyin yaratiladi (faqat inkremental rejimda)
+    _sync_journal_triggers(cursor)
+    
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.commit()
+
+def _add_column(cursor, table, column, definition):
+    """Jadvalda ustun bo'lmasa qo'shish (qo'shilgan bo'lsa True)"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column in [row['name'] for row in cursor.fetchall()]:
+        return False
+    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return True
+
+# ============ Statistika hisoblagichlari ============
+
+def _bump_counter(key_expr, delta_expr):
+    """stats_counters ni oshirish uchun SQL"""
+    return f'''
+            INSERT INTO stats_counters (key, value) VALUES ({key_expr}, {delta_expr})
+            ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;'''
+
+def _bump_daily(metric_expr, delta_expr):
+    """daily_rollups ni oshirish uchun SQL"""
+    return f'''
+            INSERT INTO daily_rollups (day, metric, value) VALUES (date('now', 'localtime'), {metric_expr}, {delta_expr})
+            ON CONFLICT(day, metric) DO UPDATE SET value = value + excluded.value;'''
+
+STATS_TRIGGERS = [
+    f'''
+        CREATE TRIGGER IF NOT EXISTS stats_users_insert AFTER INSERT ON users
+        BEGIN
+            {_bump_counter("'users'", "1")}
+            {_bump_counter("'reachable_users'", "NEW.is_reachable")}
+            {_bump_daily("'new_users'", "1")}
+        END
+    ''',
+    f'''
+        CREATE TRIGGER IF NOT EXISTS stats_users_reachable AFTER UPDATE OF is_reachable ON users
+        WHEN NEW.is_reachable != OLD.is_reachable
+        BEGIN
+            {_bump_counter("'reachable_users'", "NEW.is_reachable - OLD.is_reachable")}
+        END
+    ''',
+    f'''
+        CREATE TRIGGER IF NOT EXISTS stats_referrals_insert AFTER INSERT ON referrals
+        BEGIN
+            {_bump_counter("'referrals'", "1")}
+            {_bump_daily("'referrals'", "1")}
+        END
+    ''',
+    f'''
+        CREATE TRIGGER IF NOT EXISTS stats_balances_insert AFTER INSERT ON balances
+        BEGIN
+            {_bump_counter("'balance_credits'", "NEW.total_earned")}
+            {_bump_daily("'balance_credits'", "NEW.total_earned")}
+        END
+    ''',
+    f'''
+        CREATE TRIGGER IF NOT EXISTS stats_balances_credit AFTER UPDATE OF total_earned ON balances
+        WHEN NEW.total_earned > OLD.total_earned
+        BEGIN
+            {_bump_counter("'balance_credits'", "NEW.total_earned - OLD.total_earned")}
+            {_bump_daily("'balance_credits'", "NEW.total_earned - OLD.total_earned")}
+        END
+    ''',
+    f'''
+        CREATE TRIGGER IF NOT EXISTS stats_withdrawals_insert AFTER INSERT ON withdrawals
+        BEGIN
+            {_bump_counter("'withdrawals_' || NEW.status", "1")}
+            {_bump_counter("'withdrawals_' || NEW.status || '_amount'", "NEW.amount")}
+            {_bump_daily("'withdrawals_created'", "1")}
+        END
+    ''',
+    f'''
+        CREATE TRIGGER IF NOT EXISTS stats_withdrawals_status AFTER UPDATE OF status ON withdrawals
+        WHEN NEW.status != OLD.status
+        BEGIN
+            {_bump_counter("'withdrawals_' || OLD.status", "-1")}
+            {_bump_counter("'withdrawals_' || OLD.status || '_amount'", "-OLD.amount")}
+            {_bump_counter("'withdrawals_' || NEW.status", "1")}
+            {_bump_counter("'withdrawals_' || NEW.status || '_amount'", "NEW.amount")}
+            {_bump_daily("'withdrawals_' || NEW.status", "1")}
+        END
+    ''',
+    f'''
+        CREATE TRIGGER IF NOT EXISTS stats_channels_insert AFTER INSERT ON channels
+        BEGIN
+            {_bump_counter("'channels_active'", "NEW.is_active")}
+        END
+    ''',
+    f'''
+        CREATE TRIGGER IF NOT EXISTS stats_channels_delete AFTER DELETE ON channels
+        BEGIN
+            {_bump_counter("'channels_active'", "-OLD.is_active")}
+        END
+    ''',
+    f'''
+        CREATE TRIGGER IF NOT EXISTS stats_channels_toggle AFTER UPDATE OF is_active ON channels
+        WHEN NEW.is_active != OLD.is_active
+        BEGIN
+            {_bump_counter("'channels_active'", "NEW.is_active - OLD.is_active")}
+        END
+    ''',
+]
+
+# settings dagi o'chirilgan yozuvlar hisobi: ARCHIVED_COUNTER_PREFIX + stats_counters kaliti
+ARCHIVED_COUNTER_PREFIX = 'archived_'
+
+def rebuild_stats_counters(conn):
+    """Hisoblagichlarni jadvallardan qaytadan hisoblash (commit qilmaydi)"""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM stats_counters')
+    cursor.execute('''
+        INSERT INTO stats_counters (key, value)
+        SELECT 'users', COUNT(*) FROM users
+        UNION ALL SELECT 'reachable_users', COUNT(*) FROM users WHERE is_reachable = 1
+        UNION ALL SELECT 'referrals', COUNT(*) FROM referrals
+        UNION ALL SELECT 'balance_credits', COALESCE(SUM(total_earned), 0) FROM balances
+        UNION ALL SELECT 'channels_active', COUNT(*) FROM channels WHERE is_active = 1
+    ''')
+    cursor.execute('''
+        INSERT INTO stats_counters (key, value)
+        SELECT 'withdrawals_' || status, COUNT(*) FROM withdrawals GROUP BY status
+        UNION ALL
+        SELECT 'withdrawals_' || status || '_amount', SUM(amount) FROM withdrawals GROUP BY status
+    ''')
+    # Retention o'chirgan (arxivlangan) so'rovlar ham jami hisobda qoladi
+    cursor.execute(f'''
+        INSERT INTO stats_counters (key, value)
+        SELECT substr(key, {len(ARCHIVED_COUNTER_PREFIX) + 1}), CAST(value AS INTEGER) FROM settings
+        WHERE key LIKE '{ARCHIVED_COUNTER_PREFIX}%'
+        ON CONFLICT(key) DO UPDATE SET value = value + excluded.value
+    ''')
+
+def preserve_withdrawal_totals(cursor, ids):
+    """O'chirilayotgan so'rovlarni settings dagi hisobga qo'shish (joriy tranzaksiyada)
+
+    rebuild_stats_counters ularni withdrawals_* hisoblagichlariga qaytarib qo'shadi.
+    """
+    placeholders = ','.join('?' * len(ids))
+    cursor.execute(f'''
+        INSERT INTO settings (key, value)
+        SELECT '{ARCHIVED_COUNTER_PREFIX}withdrawals_' || status, COUNT(*) FROM withdrawals
+        WHERE id IN ({placeholders}) GROUP BY status
+        UNION ALL
+        SELECT '{ARCHIVED_COUNTER_PREFIX}withdrawals_' || status || '_amount', SUM(amount) FROM withdrawals
+        WHERE id IN ({placeholders}) GROUP BY status
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + excluded.value
+    ''', [*ids, *ids])
+
+def _backfill_daily_rollups(cursor, since=''):
+    """Kunlik statistikani mavjud vaqt belgilaridan to'ldirish (since - shu kundan boshlab)
+
+    balance_credits qatorlardan tiklanmaydi (balances faqat jami summani saqlaydi).
+    """
+    cursor.execute('''
+        INSERT OR REPLACE INTO daily_rollups (day, metric, value)
+        SELECT substr(created_at, 1, 10), 'new_users', COUNT(*) FROM users
+        WHERE created_at >= :since GROUP BY 1
+        UNION ALL
+        SELECT substr(joined_at, 1, 10), 'referrals', COUNT(*) FROM referrals
+        WHERE joined_at >= :since GROUP BY 1
+        UNION ALL
+        SELECT substr(created_at, 1, 10), 'withdrawals_created', COUNT(*) FROM withdrawals
+        WHERE created_at >= :since GROUP BY 1
+        UNION ALL
+        SELECT substr(processed_at, 1, 10), 'withdrawals_' || status, COUNT(*) FROM withdrawals
+        WHERE processed_at >= :since AND status != 'pending' GROUP BY 1, 2
+    ''', {'since': since})
+
+def get_stats_counters():
+    """Barcha statistika hisoblagichlarini olish"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT key, value FROM stats_counters')
+    counters = {row['key']: row['value'] for row in cursor.fetchall()}
+    conn.close()
+    return counters
+
+def get_daily_rollups(days=7):
+    """Oxirgi kunlar statistikasi: {kun: {ko'rsatkich: qiymat}}"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT day, metric, value FROM daily_rollups
+        WHERE day > date('now', 'localtime', ?)
+        ORDER BY day DESC
+    ''', (f'-{days} days',))
+    rollups = {}
+    for row in cursor.fetchall():
+        rollups.setdefault(row['day'], {})[row['metric']] = row['value']
+    conn.close()
+    return rollups
+
+# ============ O'zgarishlar jurnali ============
+
+# Jurnalga yoziladigan jadvallar: jadval -> birlamchi kalit
+JOURNALED_TABLES = {
+    'users': 'user_id',
+    'referrals': 'id',
+    'balances': 'user_id',
+    'withdrawals': 'id',
+    'channels': 'id',
+    'user_sessions': 'user_id',
+}
+
+# Faqat shu ustunlar o'zgarsa jurnalga yozilmaydi
+JOURNAL_IGNORED_COLUMNS = ('updated_at',)
+
+def _create_journal_triggers(cursor):
+    """change_journal triggerlarini jadvallarning joriy ustunlari bo'yicha qayta yaratish"""
+    for table, key in JOURNALED_TABLES.items():
+        cursor.execute(f'PRAGMA table_info({table})')
+        columns = [row['name'] for row in cursor.fetchall()]
+        row_json = 'json_object(' + ', '.join(f"'{c}', NEW.{c}" for c in columns) + ')'
+        changed = ' OR '.join(f'NEW.{c} IS NOT OLD.{c}' for c in columns if c not in JOURNAL_IGNORED_COLUMNS)
+        
+        journal_insert = f'''
+            INSERT INTO change_journal (table_name, op, row_key, row_data, changed_at)
+            VALUES ('{table}', 'upsert', NEW.{key}, {row_json}, datetime('now', 'localtime'));'''
+        
+        for event, condition in (('INSERT', ''), ('UPDATE', f'WHEN {changed}')):
+            cursor.execute(f'DROP TRIGGER IF EXISTS journal_{table}_{event.lower()}')
+            cursor.execute(f'''
+                CREATE TRIGGER journal_{table}_{event.lower()} AFTER {event} ON {table}
+                {condition}
+                BEGIN {journal_insert}
+                END
+            ''')
+        
+        cursor.execute(f'DROP TRIGGER IF EXISTS journal_{table}_delete')
+        cursor.execute(f'''
+            CREATE TRIGGER journal_{table}_delete AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO change_journal (table_name, op, row_key, row_data, changed_at)
+                VALUES ('{table}', 'delete', OLD.{key}, NULL, datetime('now', 'localtime'));
+            END
+        ''')
+
+def _drop_journal_triggers(cursor):
+    """change_journal triggerlarini o'chirish"""
+    for table in JOURNALED_TABLES:
+        for event in ('insert', 'update', 'delete'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS journal_{table}_{event}')
+
+def _sync_journal_triggers(cursor):
+    """Triggerlarni zaxira rejimiga moslash: jurnal faqat inkremental rejimda yoziladi
+
+    Aks holda jurnalni hech narsa qisqartirmaydi va u cheksiz o'sadi.
+    """
+    cursor.execute("SELECT value FROM settings WHERE key = 'backup_mode'")
+    row = cursor.fetchone()
+    if row and row[0] == 'incremental':
+        _create_journal_triggers(cursor)
+    else:
+        _drop_journal_triggers(cursor)
+        cursor.execute('DELETE FROM change_journal')
+
+def get_journal_head():
+    """Jurnaldagi oxirgi yozuv ID si"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM change_journal')
+    head = cursor.fetchone()[0]
+    conn.close()
+    return head
+
+def iter_journal(after_id, upto_id, batch_size=1000):
+    """(after_id, upto_id] oralig'idagi jurnal yozuvlarini tartib bilan berish"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        while True:
+            cursor.execute('''
+                SELECT * FROM change_journal WHERE id > ? AND id <= ?
+                ORDER BY id LIMIT ?
+            ''', (after_id, upto_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+            after_id = rows[-1]['id']
+    finally:
+        conn.close()
+
+def trim_journal(upto_id):
+    """To'liq zaxiraga kirgan jurnal yozuvlarini o'chirish"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM change_journal WHERE id <= ?', (upto_id,))
     conn.commit()
     conn.close()
 
 # ============ Sozlamalar ============
 
-def get_setting(key, default=None):
-    """Sozlamani olish"""
+def _fetch_settings():
+    """settings jadvalini o'qish va (avlod o'zgarmagan bo'lsa) keshga yozish"""
+    generation = _cache_generation
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT value FROM settings WHERE key = ?', (key,))
-    result = cursor.fetchone()
+    cursor.execute('SELECT key, value FROM settings')
+    settings = {row['key']: row['value'] for row in cursor.fetchall()}
     conn.close()
-    return result['value'] if result else default
+    
+    def store():
+        global _settings_cache
+        _settings_cache = settings
+    _store_cache(generation, store)
+    return settings
+
+def load_settings():
+    """settings jadvalini to'liq keshga yuklash"""
+    return len(_fetch_settings())
+
+@register_cache_invalidator
+def _clear_settings():
+    """Sozlamalar keshini tozalash"""
+    global _settings_cache
+    _settings_cache = None
+
+def get_setting(key, default=None):
+    """Sozlamani olish"""
+    settings = _settings_cache
+    if settings is None:
+        settings = _fetch_settings()
+    return settings.get(key, default)
 
 def set_setting(key, value):
     """Sozlamani saqlash"""
@@ -177,6 +680,8 @@ def set_setting(key, value):
         INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)
     ''', (key, str(value)))
     conn.commit()
+    if _settings_cache is not None:
+        _settings_cache[key] = str(value)
     conn.close()
 
 def is_auto_backup_enabled():
@@ -189,34 +694,125 @@ def toggle_auto_backup():
     set_setting('auto_backup', 'false' if current else 'true')
     return not current
 
+def is_incremental_backup_enabled():
+    """Avto-zaxira inkremental rejimdami"""
+    return get_setting('backup_mode', 'full') == 'incremental'
+
+def toggle_backup_mode():
+    """Zaxira rejimini almashtirish (to'liq/inkremental)"""
+    current = is_incremental_backup_enabled()
+    set_setting('backup_mode', 'full' if current else 'incremental')
+    conn = get_connection()
+    with conn:
+        _sync_journal_triggers(conn.cursor())
+    conn.close()
+    if not current:
+        # Jurnal endi yozila boshlaydi - deltalar uchun yangi to'liq zaxira kerak
+        set_setting('last_full_backup_at', '')
+    return not current
+
 # ============ Referal tizimi ============
 
-def add_referral(referrer_id, referred_id):
-    """Referal qo'shish"""
+def _increment_referral_count(cursor, referrer_id):
+    """users.referral_count ni oshirish va kirish flagini yangilash, yangi sonni qaytaradi"""
+    cursor.execute('''
+        UPDATE users SET
+            referral_count = referral_count + 1,
+            services_unlocked = MAX(services_unlocked, referral_count + 1 >= ?)
+        WHERE user_id = ?
+    ''', (REQUIRED_REFERRALS, referrer_id))
+    cursor.execute('SELECT referral_count FROM users WHERE user_id = ?', (referrer_id,))
+    result = cursor.fetchone()
+    
+    if result is None:
+        # Taklif qilgan odam botda ro'yxatdan o'tmagan
+        cursor.execute('SELECT COUNT(*) FROM referrals WHERE referrer_id = ?', (referrer_id,))
+        return cursor.fetchone()[0]
+    return result['referral_count']
+
+def credit_referral(referrer_id, referred_id, reward, referred_name=''):
+    """Referal qo'shish, mukofot berish va xabarni navbatga qo'yish - bitta tranzaksiyada
+
+    Foydalanuvchi allaqachon kimdir tomonidan taklif qilingan bo'lsa None,
+    aks holda (referallar soni, joriy balans) qaytaradi.
+    """
     conn = get_connection()
     cursor = conn.cursor()
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    now = datetime.now()
     
     try:
-        cursor.execute('''
-            INSERT INTO referrals (referrer_id, referred_id, joined_at)
-            VALUES (?, ?, ?)
-        ''', (referrer_id, referred_id, now))
-        conn.commit()
-        conn.close()
-        return True
+        with conn:
+            cursor.execute('''
+                INSERT INTO referrals (referrer_id, referred_id, joined_at)
+                VALUES (?, ?, ?)
+            ''', (referrer_id, referred_id, now.strftime("%Y-%m-%d %H:%M:%S")))
+            cursor.execute('''
+                INSERT INTO balances (user_id, balance, total_earned, total_withdrawn, updated_at)
+                VALUES (?, ?, ?, 0, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    balance = balance + excluded.balance,
+                    total_earned = total_earned + excluded.total_earned,
+                    updated_at = excluded.updated_at
+            ''', (referrer_id, reward, reward, now.isoformat()))
+            ref_count = _increment_referral_count(cursor, referrer_id)
+            cursor.execute('SELECT balance FROM balances WHERE user_id = ?', (referrer_id,))
+            balance = cursor.fetchone()['balance']
+            _enqueue_notification(cursor, referrer_id, 'referral_reward', {
+                'first_name': referred_name,
+                'reward': reward,
+                'balance': balance,
+                'ref_count': ref_count,
+            })
     except sqlite3.IntegrityError:
         conn.close()
-        return False
+        return None
+    
+    conn.close()
+    return ref_count, balance
 
 def get_referral_count(user_id):
     """Foydalanuvchi taklif qilgan odamlar soni"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM referrals WHERE referrer_id = ?', (user_id,))
-    count = cursor.fetchone()[0]
+    cursor.execute('SELECT referral_count FROM users WHERE user_id = ?', (user_id,))
+    result = cursor.fetchone()
     conn.close()
-    return count
+    return result['referral_count'] if result else 0
+
+def is_services_unlocked(user_id):
+    """Foydalanuvchi REQUIRED_REFERRALS ga yetganmi (ochilganlar xotirada keshlanadi)"""
+    if user_id in _unlocked_users:
+        return True
+    
+    generation = _cache_generation
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT services_unlocked OR referral_count >= ? AS unlocked FROM users WHERE user_id = ?
+    ''', (REQUIRED_REFERRALS, user_id))
+    result = cursor.fetchone()
+    conn.close()
+    
+    if result and result['unlocked']:
+        _store_cache(generation, lambda: _unlocked_users.add(user_id))
+        return True
+    return False
+
+def load_unlocked_users():
+    """Kirishi ochilgan barcha foydalanuvchilarni keshga yuklash"""
+    generation = _cache_generation
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT user_id FROM users WHERE services_unlocked = 1')
+    user_ids = [row['user_id'] for row in cursor.fetchall()]
+    conn.close()
+    _store_cache(generation, lambda: _unlocked_users.update(user_ids))
+    return len(_unlocked_users)
+
+@register_cache_invalidator
+def _clear_unlocked_users():
+    """Kirish keshini tozalash"""
+    _unlocked_users.clear()
 
 def get_referrals(user_id):
     """Foydalanuvchi taklif qilgan odamlar ro'yxati"""
@@ -233,15 +829,6 @@ def get_referrals(user_id):
     conn.close()
     return referrals
 
-def has_referrer(user_id):
-    """Foydalanuvchi kimdir tomonidan taklif qilinganmi"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT referrer_id FROM referrals WHERE referred_id = ?', (user_id,))
-    result = cursor.fetchone()
-    conn.close()
-    return result is not None
-
 # ============ Foydalanuvchilar bilan ishlash ============
 
 def add_or_update_user(user):
@@ -274,20 +861,25 @@ def add_or_update_user(user):
         cursor.execute('''
             UPDATE users SET 
                 first_name = ?, last_name = ?, username = ?, 
-                language_code = ?, is_premium = ?, updated_at = ?
+                language_code = ?, is_premium = ?, is_reachable = 1, updated_at = ?
             WHERE user_id = ?
         ''', (user.first_name, user.last_name or '', user.username or '',
               user.language_code or '', 1 if getattr(user, 'is_premium', False) else 0, 
               now, user.id))
     else:
-        # Yangi foydalanuvchi qo'shish
+        # Yangi foydalanuvchi qo'shish. Ro'yxatdan o'tmasdan oldin olingan
+        # referallar ham hisobga olinadi (ular uchun referral_count oshmagan)
+        cursor.execute('SELECT COUNT(*) FROM referrals WHERE referrer_id = ?', (user.id,))
+        ref_count = cursor.fetchone()[0]
         cursor.execute('''
             INSERT INTO users (user_id, first_name, last_name, username, 
-                              language_code, is_bot, is_premium, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                              language_code, is_bot, is_premium, created_at, updated_at,
+                              referral_count, services_unlocked)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (user.id, user.first_name, user.last_name or '', user.username or '',
               user.language_code or '', 1 if user.is_bot else 0,
-              1 if getattr(user, 'is_premium', False) else 0, now, now))
+              1 if getattr(user, 'is_premium', False) else 0, now, now,
+              ref_count, 1 if ref_count >= REQUIRED_REFERRALS else 0))
     
     conn.commit()
     conn.close()
@@ -345,19 +937,67 @@ def get_all_users():
     """Barcha foydalanuvchilarni olish"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users ORDER BY created_at DESC")
+    cursor.row_factory = User.from_row
+    cursor.execute(f"SELECT {User.columns()} FROM users ORDER BY created_at DESC")
     users = cursor.fetchall()
     conn.close()
-    return [dict(u) for u in users]
+    return users
+
+def get_users_page(cursor_key=None, direction='next', limit=10):
+    """Foydalanuvchilar sahifasi - (created_at, user_id) bo'yicha keyset
+
+    cursor_key - (created_at, user_id) juftligi: 'next' uchun oldingi sahifaning
+    oxirgi qatori, 'prev' uchun joriy sahifaning birinchi qatori.
+    (users, has_prev, has_next) qaytaradi, users eng yangisidan boshlab.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.row_factory = User.from_row
+    
+    # Keyingi sahifa bor-yo'qligini bilish uchun bitta ortiqcha qator olinadi
+    if cursor_key is None:
+        cursor.execute(f'''
+            SELECT {User.columns()} FROM users ORDER BY created_at DESC, user_id DESC LIMIT ?
+        ''', (limit + 1,))
+    elif direction == 'prev':
+        cursor.execute(f'''
+            SELECT {User.columns()} FROM users WHERE (created_at, user_id) > (?, ?)
+            ORDER BY created_at ASC, user_id ASC LIMIT ?
+        ''', (cursor_key[0], cursor_key[1], limit + 1))
+    else:
+        cursor.execute(f'''
+            SELECT {User.columns()} FROM users WHERE (created_at, user_id) < (?, ?)
+            ORDER BY created_at DESC, user_id DESC LIMIT ?
+        ''', (cursor_key[0], cursor_key[1], limit + 1))
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    if direction == 'prev' and cursor_key is not None:
+        rows.reverse()
+        return rows, has_more, True
+    return rows, cursor_key is not None, has_more
 
 def get_users_count():
     """Foydalanuvchilar sonini olish"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) as count FROM users")
+    cursor.execute("SELECT value FROM stats_counters WHERE key = 'users'")
     result = cursor.fetchone()
     conn.close()
-    return result['count']
+    return result['value'] if result else 0
+
+def set_user_reachable(user_id, reachable):
+    """Foydalanuvchiga xabar yetib borishini belgilash (botni bloklaganda 0)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET is_reachable = ? WHERE user_id = ?",
+                   (1 if reachable else 0, user_id))
+    conn.commit()
+    conn.close()
 
 # ============ Guruhlar bilan ishlash ============
 
@@ -407,6 +1047,7 @@ def add_channel(channel_id, channel_username, channel_title, added_by, is_reques
         result = False
     
     conn.close()
+    _clear_channels()
     return result
 
 def remove_channel(channel_id):
@@ -419,25 +1060,44 @@ def remove_channel(channel_id):
     deleted = cursor.rowcount > 0
     conn.commit()
     conn.close()
+    _clear_channels()
     return deleted
 
-def get_active_channels():
-    """Faol kanallarni olish"""
+def _fetch_channels():
+    """Faol kanallarni o'qish va (avlod o'zgarmagan bo'lsa) keshga yozish"""
+    generation = _cache_generation
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM channels WHERE is_active = 1")
-    channels = cursor.fetchall()
+    channels = [dict(c) for c in cursor.fetchall()]
     conn.close()
+    
+    def store():
+        global _channels_cache
+        _channels_cache = channels
+    _store_cache(generation, store)
+    return channels
+
+def load_channels():
+    """Faol kanallarni keshga yuklash (har bir obunani tekshirishda kerak bo'ladi)"""
+    return len(_fetch_channels())
+
+@register_cache_invalidator
+def _clear_channels():
+    """Kanallar keshini tozalash"""
+    global _channels_cache
+    _channels_cache = None
+
+def get_active_channels():
+    """Faol kanallarni olish"""
+    channels = _channels_cache
+    if channels is None:
+        channels = _fetch_channels()
     return [dict(c) for c in channels]
 
 def get_request_channels():
     """So'rovli kanallarni olish"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM channels WHERE is_active = 1 AND is_request_channel = 1")
-    channels = cursor.fetchall()
-    conn.close()
-    return [dict(c) for c in channels]
+    return [channel for channel in get_active_channels() if channel['is_request_channel']]
 
 def toggle_channel(channel_id):
     """Kanal holatini o'zgartirish"""
@@ -446,31 +1106,27 @@ def toggle_channel(channel_id):
     cursor.execute("UPDATE channels SET is_active = NOT is_active WHERE channel_id = ?", (str(channel_id),))
     conn.commit()
     conn.close()
+    _clear_channels()
 
 # ============ Join Request bilan ishlash ============
 
+# Join requestlar to'lqin bo'lib keladi - write_buffer orqali guruhlab yoziladi
+_join_requests_buffer = WriteBuffer('join_requests', '''
+    INSERT INTO join_requests (user_id, channel_id, requested_at)
+    VALUES (?, ?, ?)
+    ON CONFLICT(user_id, channel_id) DO UPDATE SET requested_at = excluded.requested_at
+''', 'DELETE FROM join_requests WHERE user_id = ? AND channel_id = ?', get_connection)
+
 def add_join_request(user_id, channel_id):
-    """Foydalanuvchi so'rovini saqlash"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    """Foydalanuvchi so'rovini saqlash (buferga; bir necha yuz ms ichida yoziladi)"""
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    try:
-        cursor.execute('''
-            INSERT INTO join_requests (user_id, channel_id, requested_at)
-            VALUES (?, ?, ?)
-            ON CONFLICT(user_id, channel_id) DO UPDATE SET requested_at = ?
-        ''', (user_id, str(channel_id), now, now))
-        conn.commit()
-        result = True
-    except:
-        result = False
-    
-    conn.close()
-    return result
+    _join_requests_buffer.add((user_id, str(channel_id)), (user_id, str(channel_id), now))
+    return True
 
 def has_join_request(user_id, channel_id):
     """Foydalanuvchi so'rov yuborganmi tekshirish"""
+    if _join_requests_buffer.contains((user_id, str(channel_id))):
+        return True
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
@@ -482,6 +1138,7 @@ def has_join_request(user_id, channel_id):
 
 def remove_join_request(user_id, channel_id):
     """So'rovni o'chirish"""
+    _join_requests_buffer.discard((user_id, str(channel_id)))
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
@@ -545,43 +1202,39 @@ def get_active_online_sessions():
     """Online yoqilgan barcha sessiyalarni olish"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM user_sessions WHERE is_active = 1 AND online_enabled = 1')
+    cursor.row_factory = UserSession.from_row
+    cursor.execute(f'SELECT {UserSession.columns()} FROM user_sessions WHERE is_active = 1 AND online_enabled = 1')
     results = cursor.fetchall()
     conn.close()
-    return [dict(r) for r in results]
+    return results
 
 def get_active_clock_sessions():
     """Soat yoqilgan barcha sessiyalarni olish"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM user_sessions WHERE is_active = 1 AND clock_enabled = 1')
+    cursor.row_factory = UserSession.from_row
+    cursor.execute(f'SELECT {UserSession.columns()} FROM user_sessions WHERE is_active = 1 AND clock_enabled = 1')
     results = cursor.fetchall()
     conn.close()
-    return [dict(r) for r in results]
+    return results
 
 # ============ Bot Started ============
 
+_bot_started_buffer = WriteBuffer('bot_started', '''
+    INSERT OR IGNORE INTO bot_started (user_id, bot_username, started_at)
+    VALUES (?, ?, ?)
+''', 'DELETE FROM bot_started WHERE user_id = ? AND bot_username = ?', get_connection, keep='first')
+
 def add_bot_started(user_id, bot_username):
-    """Foydalanuvchi botni ishga tushirganini saqlash"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    """Foydalanuvchi botni ishga tushirganini saqlash (buferga)"""
     now = datetime.now().isoformat()
-    
-    try:
-        cursor.execute('''
-            INSERT OR IGNORE INTO bot_started (user_id, bot_username, started_at)
-            VALUES (?, ?, ?)
-        ''', (user_id, bot_username.lower(), now))
-        conn.commit()
-        result = True
-    except:
-        result = False
-    
-    conn.close()
-    return result
+    _bot_started_buffer.add((user_id, bot_username.lower()), (user_id, bot_username.lower(), now))
+    return True
 
 def has_bot_started(user_id, bot_username):
     """Foydalanuvchi botni ishga tushirganini tekshirish"""
+    if _bot_started_buffer.contains((user_id, bot_username.lower())):
+        return True
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
@@ -593,6 +1246,7 @@ def has_bot_started(user_id, bot_username):
 
 def remove_bot_started(user_id, bot_username):
     """Bot started yozuvini o'chirish"""
+    _bot_started_buffer.discard((user_id, bot_username.lower()))
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
@@ -615,106 +1269,237 @@ def get_user_balance(user_id):
         return dict(result)
     return {'user_id': user_id, 'balance': 0, 'total_earned': 0, 'total_withdrawn': 0}
 
-def add_balance(user_id, amount):
-    """Foydalanuvchi balansiga pul qo'shish"""
+def create_withdrawal_request(user_id, amount, card_number, first_name, admin_ids):
+    """Balansdan ayirish, so'rov yaratish va adminlarga xabar - bitta tranzaksiyada
+
+    Balans yetarli bo'lmasa None, aks holda so'rov ID sini qaytaradi.
+    """
     conn = get_connection()
     cursor = conn.cursor()
     now = datetime.now().isoformat()
     
-    # Avval mavjud balansni tekshirish
-    cursor.execute('SELECT balance, total_earned FROM balances WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    
-    if result:
-        new_balance = result['balance'] + amount
-        new_total = result['total_earned'] + amount
+    with conn:
         cursor.execute('''
-            UPDATE balances SET balance = ?, total_earned = ?, updated_at = ?
-            WHERE user_id = ?
-        ''', (new_balance, new_total, now, user_id))
-    else:
-        cursor.execute('''
-            INSERT INTO balances (user_id, balance, total_earned, total_withdrawn, updated_at)
-            VALUES (?, ?, ?, 0, ?)
-        ''', (user_id, amount, amount, now))
+            UPDATE balances SET balance = balance - ?, total_withdrawn = total_withdrawn + ?, updated_at = ?
+            WHERE user_id = ? AND balance >= ?
+        ''', (amount, amount, now, user_id, amount))
+        if cursor.rowcount == 0:
+            withdrawal_id = None
+        else:
+            cursor.execute('''
+                INSERT INTO withdrawals (user_id, amount, card_number, status, created_at)
+                VALUES (?, ?, ?, 'pending', ?)
+            ''', (user_id, amount, card_number, now))
+            withdrawal_id = cursor.lastrowid
+            
+            for admin_id in admin_ids:
+                _enqueue_notification(cursor, admin_id, 'withdrawal_new', {
+                    'withdrawal_id': withdrawal_id,
+                    'user_id': user_id,
+                    'first_name': first_name,
+                    'amount': amount,
+                    'card_number': card_number,
+                })
     
-    conn.commit()
     conn.close()
+    return withdrawal_id
+
+# So'rovlar navbati qatori: withdrawals ustunlari + foydalanuvchi ismi (PendingWithdrawal tartibida)
+_PENDING_WITHDRAWAL_COLUMNS = ', '.join(
+    f"u.{name}" if name in ('first_name', 'username') else f"w.{name}" for name in PendingWithdrawal._fields
+)
+
+# So'rovlar navbati filtrlari: kalit -> (qo'shimcha shart, parametr)
+WITHDRAWAL_FILTERS = {
+    'all': ('', None),
+    'a50': ('AND w.amount >= ?', lambda: 50000),
+    'a100': ('AND w.amount >= ?', lambda: 100000),
+    'old': ('AND w.created_at <= ?', lambda: (datetime.now() - timedelta(hours=24)).isoformat()),
+}
 
-def subtract_balance(user_id, amount):
-    """Foydalanuvchi balansidan pul ayirish"""
+def _withdrawal_filter(filter_key):
+    """Filtr sharti va parametrlari"""
+    condition, param = WITHDRAWAL_FILTERS.get(filter_key, WITHDRAWAL_FILTERS['all'])
+    return condition, (param(),) if param else ()
+
+def get_withdrawals_page(filter_key='all', cursor_id=0, direction='next', limit=10):
+    """Kutilayotgan so'rovlar sahifasi - (status, id) indeksi bo'yicha keyset
+
+    cursor_id - 'next' uchun oldingi sahifaning oxirgi ID si, 'prev' uchun
+    joriy sahifaning birinchi ID si. (withdrawals, has_prev, has_next)
+    qaytaradi, eng eski so'rovdan boshlab.
+    """
     conn = get_connection()
     cursor = conn.cursor()
-    now = datetime.now().isoformat()
+    cursor.row_factory = PendingWithdrawal.from_row
+    condition, params = _withdrawal_filter(filter_key)
     
-    cursor.execute('SELECT balance, total_withdrawn FROM balances WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
+    # Keyingi sahifa bor-yo'qligini bilish uchun bitta ortiqcha qator olinadi
+    if direction == 'prev':
+        cursor.execute(f'''
+            SELECT {_PENDING_WITHDRAWAL_COLUMNS}
+            FROM withdrawals w LEFT JOIN users u ON w.user_id = u.user_id
+            WHERE w.status = 'pending' AND w.id < ? {condition}
+            ORDER BY w.id DESC LIMIT ?
+        ''', (cursor_id, *params, limit + 1))
+    else:
+        cursor.execute(f'''
+            SELECT {_PENDING_WITHDRAWAL_COLUMNS}
+            FROM withdrawals w LEFT JOIN users u ON w.user_id = u.user_id
+            WHERE w.status = 'pending' AND w.id > ? {condition}
+            ORDER BY w.id ASC LIMIT ?
+        ''', (cursor_id, *params, limit + 1))
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    if direction == 'prev':
+        rows.reverse()
+        return rows, has_more, True
+    return rows, cursor_id > 0, has_more
+
+def _finish_withdrawal(cursor, withdrawal_id, status, now):
+    """Kutilayotgan so'rovni yakunlash (rad etilsa pul qaytariladi) va xabarni navbatga qo'yish
+
+    So'rov topilmasa yoki allaqachon ko'rib chiqilgan bo'lsa None qaytaradi.
+    """
+    cursor.execute('''
+        UPDATE withdrawals SET status = ?, processed_at = ?
+        WHERE id = ? AND status = 'pending'
+    ''', (status, now, withdrawal_id))
+    if cursor.rowcount == 0:
+        return None
     
-    if result and result['balance'] >= amount:
-        new_balance = result['balance'] - amount
-        new_withdrawn = result['total_withdrawn'] + amount
+    cursor.execute('SELECT * FROM withdrawals WHERE id = ?', (withdrawal_id,))
+    withdrawal = dict(cursor.fetchone())
+    
+    if status == 'rejected':
         cursor.execute('''
-            UPDATE balances SET balance = ?, total_withdrawn = ?, updated_at = ?
+            UPDATE balances SET balance = balance + ?, total_withdrawn = total_withdrawn - ?, updated_at = ?
             WHERE user_id = ?
-        ''', (new_balance, new_withdrawn, now, user_id))
-        conn.commit()
-        conn.close()
-        return True
+        ''', (withdrawal['amount'], withdrawal['amount'], now, withdrawal['user_id']))
+    
+    _enqueue_notification(cursor, withdrawal['user_id'], f'withdrawal_{status}', {
+        'withdrawal_id': withdrawal_id,
+        'amount': withdrawal['amount'],
+        'card_number': withdrawal['card_number'],
+    })
+    return withdrawal
+
+def finish_withdrawal(withdrawal_id, status):
+    """So'rovni tasdiqlash ('approved') yoki rad etish ('rejected') - bitta tranzaksiyada"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    with conn:
+        withdrawal = _finish_withdrawal(cursor, withdrawal_id, status, datetime.now().isoformat())
     
     conn.close()
-    return False
+    return withdrawal
 
-def create_withdrawal(user_id, amount, card_number):
-    """Pul yechish so'rovi yaratish"""
+def bulk_finish_withdrawals(filter_key, first_id, last_id, status):
+    """Sahifadagi (first_id..last_id oralig'idagi, filtrga mos) so'rovlarni bitta tranzaksiyada yakunlash
+
+    Oraliq ko'rsatilgan sahifa bilan chegaralanadi: yangi so'rovlar ID si kattaroq
+    bo'lgani uchun unga tushmaydi. (soni, jami summa) qaytaradi.
+    """
     conn = get_connection()
     cursor = conn.cursor()
+    condition, params = _withdrawal_filter(filter_key)
     now = datetime.now().isoformat()
+    count = total = 0
+    
+    with conn:
+        cursor.execute(f'''
+            SELECT w.id FROM withdrawals w
+            WHERE w.status = 'pending' AND w.id BETWEEN ? AND ? {condition}
+            ORDER BY w.id
+        ''', (first_id, last_id, *params))
+        for row in cursor.fetchall():
+            withdrawal = _finish_withdrawal(cursor, row['id'], status, now)
+            if withdrawal:
+                count += 1
+                total += withdrawal['amount']
     
+    conn.close()
+    return count, total
+
+def get_withdrawal_by_id(withdrawal_id):
+    """ID bo'yicha pul yechish so'rovini olish"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM withdrawals WHERE id = ?', (withdrawal_id,))
+    result = cursor.fetchone()
+    conn.close()
+    return dict(result) if result else None
+
+# ============ Outbox (xabarlar navbati) ============
+
+def _enqueue_notification(cursor, chat_id, kind, payload):
+    """Xabarni joriy tranzaksiya ichida navbatga qo'yish"""
+    now = datetime.now().isoformat()
     cursor.execute('''
-        INSERT INTO withdrawals (user_id, amount, card_number, status, created_at)
-        VALUES (?, ?, ?, 'pending', ?)
-    ''', (user_id, amount, card_number, now))
+        INSERT INTO outbox (chat_id, kind, payload, status, next_attempt_at, created_at)
+        VALUES (?, ?, ?, 'pending', ?, ?)
+    ''', (chat_id, kind, json.dumps(payload, ensure_ascii=False), now, now))
+
+def enqueue_notification(chat_id, kind, payload):
+    """Xabarni navbatga qo'yish"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    _enqueue_notification(cursor, chat_id, kind, payload)
     conn.commit()
-    withdrawal_id = cursor.lastrowid
     conn.close()
-    return withdrawal_id
 
-def get_pending_withdrawals():
-    """Kutilayotgan pul yechish so'rovlarini olish"""
+def get_due_notifications(limit=50):
+    """Yuborish vaqti kelgan xabarlar"""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
-        SELECT w.*, u.first_name, u.username 
-        FROM withdrawals w 
-        JOIN users u ON w.user_id = u.user_id 
-        WHERE w.status = 'pending'
-        ORDER BY w.created_at ASC
-    ''')
+        SELECT * FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?
+        ORDER BY next_attempt_at, id LIMIT ?
+    ''', (datetime.now().isoformat(), limit))
     result = cursor.fetchall()
     conn.close()
     return [dict(row) for row in result]
 
-def process_withdrawal(withdrawal_id, status):
-    """Pul yechish so'rovini tasdiqlash/rad etish"""
+def mark_notification_sent(notification_id):
+    """Xabar yuborildi"""
     conn = get_connection()
     cursor = conn.cursor()
-    now = datetime.now().isoformat()
-    
     cursor.execute('''
-        UPDATE withdrawals SET status = ?, processed_at = ?
-        WHERE id = ?
-    ''', (status, now, withdrawal_id))
+        UPDATE outbox SET status = 'sent', attempts = attempts + 1, sent_at = ? WHERE id = ?
+    ''', (datetime.now().isoformat(), notification_id))
     conn.commit()
     conn.close()
 
-def get_withdrawal_by_id(withdrawal_id):
-    """ID bo'yicha pul yechish so'rovini olish"""
+def mark_notification_failed(notification_id, error, retry_in=None, count_attempt=True):
+    """Xabar yuborilmadi: retry_in soniyadan keyin qayta urinish, None bo'lsa - dead"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM withdrawals WHERE id = ?', (withdrawal_id,))
-    result = cursor.fetchone()
+    if retry_in is None:
+        cursor.execute('''
+            UPDATE outbox SET status = 'dead', attempts = attempts + ?, last_error = ? WHERE id = ?
+        ''', (1 if count_attempt else 0, error, notification_id))
+    else:
+        next_attempt = (datetime.now() + timedelta(seconds=retry_in)).isoformat()
+        cursor.execute('''
+            UPDATE outbox SET attempts = attempts + ?, last_error = ?, next_attempt_at = ? WHERE id = ?
+        ''', (1 if count_attempt else 0, error, next_attempt, notification_id))
+    conn.commit()
     conn.close()
-    return dict(result) if result else None
+
+def get_outbox_stats():
+    """Outbox holati: {status: soni}"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT status, COUNT(*) AS count FROM outbox GROUP BY status')
+    stats = {row['status']: row['count'] for row in cursor.fetchall()}
+    conn.close()
+    return stats
 
 # Database ni ishga tushirish
 if __name__ == "__main__":
@@ -0,0 +1,234 @@
+"""SQL profiler (ixtiyoriy, config.DB_PROFILE)
+
+database.get_connection ga ProfiledConnection factory ulanadi: har bir
+execute vaqti o'lchanadi, sekin so'rovlar chaqiruvchi funksiya bilan
+logga yoziladi va normallashtirilgan statement bo'yicha yig'iladi.
+set_trace_callback orqali triggerlar ichida bajarilgan statementlar ham
+sanaladi (Python trigger statementlari uchun ham yuqori darajadagi
+statement matnini beradi, shuning uchun birinchisidan keyingilari
+trigger hisoblanadi).
+"""
+import logging
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+import database as db
+from config import DB_SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+_stats = {}  # normallashtirilgan SQL -> StatementStats
+_stats_lock = threading.Lock()
+_local = threading.local()
+_enabled = False
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+_NAMED_PARAM_RE = re.compile(r"[:@$]([A-Za-z_]\w*)")
+_TRANSACTION_VERBS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+class StatementStats:
+    """Bitta normallashtirilgan statement bo'yicha yig'indi"""
+    __slots__ = ('sql', 'sample', 'params', 'count', 'total', 'max', 'rows', 'trigger_statements', 'callers')
+
+    def __init__(self, sql, sample):
+        self.sql = sql
+        self.sample = sample
+        self.params = _null_params(sample)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.trigger_statements = 0
+        self.callers = {}
+
+
+def normalize(sql):
+    """Literal qiymatlarni ? ga almashtirib, bo'shliqlarni qisqartirish"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(?...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def _null_params(sql):
+    """EXPLAIN uchun NULL parametrlar: nomlanganlar uchun {nom: None}, aks holda ? lar soni
+
+    Parametrlar qiymatidan emas, SQL matnidan olinadi - executemany da qiymat
+    qatorlar ro'yxati, nomlangan parametrlarda esa lug'at bo'ladi.
+    """
+    sql = _STRING_RE.sub("''", sql)
+    names = _NAMED_PARAM_RE.findall(sql)
+    if names:
+        return dict.fromkeys(names)
+    return (None,) * sql.count('?')
+
+
+def _caller():
+    """SQL ni chaqirgan database.py (yoki boshqa modul) funksiyasi"""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get('__name__') in (__name__, 'metrics', 'contextlib'):
+        frame = frame.f_back
+    if frame is None:
+        return 'unknown'
+    return f"{frame.f_globals.get('__name__')}.{frame.f_code.co_name}"
+
+
+def _record(sql, caller):
+    key = normalize(sql)
+    with _stats_lock:
+        entry = _stats.get(key)
+        if entry is None:
+            entry = _stats[key] = StatementStats(key, sql)
+        entry.count += 1
+        entry.callers[caller] = entry.callers.get(caller, 0) + 1
+    return entry
+
+
+def _on_trace(statement):
+    """set_trace_callback: joriy execute davomida bajarilgan statementlarni sanash"""
+    if getattr(_local, 'current', None) is not None and not statement.lstrip().upper().startswith(_TRANSACTION_VERBS):
+        _local.traced += 1
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """execute/executemany va fetch vaqtini o'lchovchi cursor"""
+
+    def _timed(self, method, sql, params):
+        caller = _caller()
+        entry = _record(sql, caller)
+        _local.current = entry
+        _local.traced = 0
+        start = time.perf_counter()
+        try:
+            return method(self, sql, params)
+        finally:
+            elapsed = time.perf_counter() - start
+            _local.current = None
+            if _local.traced > 1:
+                with _stats_lock:
+                    entry.trigger_statements += _local.traced - 1
+            self._entry = entry
+            self._add_time(elapsed)
+            if elapsed * 1000 >= DB_SLOW_QUERY_MS:
+                logger.warning(f"Sekin SQL ({elapsed * 1000:.1f} ms) {caller}: {normalize(sql)[:300]}")
+
+    def _add_time(self, elapsed, rows=0):
+        entry = getattr(self, '_entry', None)
+        if entry is None:
+            return
+        with _stats_lock:
+            entry.total += elapsed
+            entry.max = max(entry.max, elapsed)
+            entry.rows += rows
+
+    def execute(self, sql, params=()):
+        return self._timed(sqlite3.Cursor.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._timed(sqlite3.Cursor.executemany, sql, seq_of_params)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._add_time(time.perf_counter() - start, 1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(size if size is not None else self.arraysize)
+        self._add_time(time.perf_counter() - start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._add_time(time.perf_counter() - start, len(rows))
+        return rows
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Cursor lari ProfiledCursor bo'lgan ulanish"""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+def enable():
+    """Profilerni yoqish (bir marta)"""
+    global _enabled
+    if _enabled:
+        return
+    db.set_connection_factory(ProfiledConnection)
+    db.add_statement_listener(_on_trace)
+    _enabled = True
+    logger.info(f"SQL profiler yoqildi (sekin so'rov chegarasi: {DB_SLOW_QUERY_MS} ms)")
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Yig'ilgan statistikani tozalash"""
+    with _stats_lock:
+        _stats.clear()
+
+
+def top_statements(limit=10):
+    """Jami vaqt bo'yicha eng og'ir statementlar"""
+    with _stats_lock:
+        entries = list(_stats.values())
+    entries.sort(key=lambda entry: entry.total, reverse=True)
+    return entries[:limit]
+
+
+def explain(entry):
+    """Statement uchun EXPLAIN QUERY PLAN qatorlari"""
+    if not entry.sample.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')):
+        return []
+    conn = sqlite3.connect(db.DATABASE_FILE)
+    try:
+        rows = conn.execute(f'EXPLAIN QUERY PLAN {entry.sample}', entry.params).fetchall()
+        return [row[3] for row in rows]
+    except sqlite3.Error as e:
+        return [f'xato: {e}']
+    finally:
+        conn.close()
+
+
+def report(limit=10, explain_top=5):
+    """Admin uchun matnli hisobot (oddiy matn, fayl sifatida yuborish mumkin)"""
+    entries = top_statements(limit)
+    if not entries:
+        return "SQL profiler: hali ma'lumot yo'q."
+
+    lines = [f"SQL profiler - top {len(entries)} (jami vaqt bo'yicha), sekin chegarasi {DB_SLOW_QUERY_MS} ms", '']
+    for i, entry in enumerate(entries, 1):
+        callers = ', '.join(f"{name} x{count}" for name, count in
+                            sorted(entry.callers.items(), key=lambda item: -item[1])[:3])
+        lines.append(
+            f"{i}. {entry.total * 1000:.1f} ms jami | {entry.count} marta | "
+            f"o'rt. {entry.total / entry.count * 1000:.2f} ms | maks. {entry.max * 1000:.1f} ms | "
+            f"{entry.rows} qator | trigger statementlar: {entry.trigger_statements}"
+        )
+        lines.append(f"   {entry.sql[:400]}")
+        lines.append(f"   chaqiruvchi: {callers}")
+        if i <= explain_top:
+            for step in explain(entry):
+                marker = '!! ' if step.startswith('SCAN') and 'USING' not in step else ''
+                lines.append(f"   plan: {marker}{step}")
+        lines.append('')
+    return '\n'.join(lines)
@@ -43,13 +43,14 @@ def admin_panel_reply_keyboard():
     return keyboard
 
 
-def backup_keyboard(auto_backup_enabled=False):
+def backup_keyboard(auto_backup_enabled=False, incremental=False):
     """Zaxira nusxa boshqaruvi tugmalari"""
     status = "🟢" if auto_backup_enabled else "🔴"
+    mode = "Inkremental" if incremental else "To'liq"
     keyboard = ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text="📥 Zaxira olish")],
-            [KeyboardButton(text=f"⏰ Avto-zaxira: {status}")],
+            [KeyboardButton(text=f"⏰ Avto-zaxira: {status}"), KeyboardButton(text=f"🧩 Rejim: {mode}")],
             [KeyboardButton(text="📤 Zaxiradan tiklash")],
             [KeyboardButton(text="🔙 Orqaga")]
         ],
@@ -157,16 +158,79 @@ def withdraw_keyboard():
     return keyboard
 
 
-def admin_withdrawals_keyboard(withdrawals):
-    buttons = []
+WITHDRAWAL_FILTER_LABELS = {
+    'all': "Hammasi",
+    'a50': "≥50 000",
+    'a100': "≥100 000",
+    'old': ">24 soat",
+}
+
+
+def admin_withdrawals_keyboard(withdrawals, filter_key='all', has_prev=False, has_next=False):
+    """So'rovlar navbati: filtrlar, sahifadagi so'rovlar, sahifalash va ommaviy amallar"""
+    buttons = [[
+        InlineKeyboardButton(
+            text=f"✓ {label}" if key == filter_key else label,
+            callback_data=f"wq|p|{key}|next|0"
+        )
+        for key, label in WITHDRAWAL_FILTER_LABELS.items()
+    ]]
     for w in withdrawals:
         buttons.append([InlineKeyboardButton(
             text=f"#{w['id']} - {w['first_name']} - {w['amount']} so'm",
             callback_data=f"view_withdrawal_{w['id']}"
         )])
+    
+    nav = []
+    if has_prev:
+        nav.append(InlineKeyboardButton(
+            text="⬅️ Oldingi", callback_data=f"wq|p|{filter_key}|prev|{withdrawals[0]['id']}"
+        ))
+    if has_next:
+        nav.append(InlineKeyboardButton(
+            text="Keyingi ➡️", callback_data=f"wq|p|{filter_key}|next|{withdrawals[-1]['id']}"
+        ))
+    if nav:
+        buttons.append(nav)
+    
+    if withdrawals:
+        page = f"{filter_key}|{withdrawals[0]['id']}|{withdrawals[-1]['id']}"
+        buttons.append([
+            InlineKeyboardButton(text="✅ Sahifani tasdiqlash", callback_data=f"wq|b|approved|{page}"),
+            InlineKeyboardButton(text="❌ Sahifani rad etish", callback_data=f"wq|b|rejected|{page}")
+        ])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+def bulk_withdrawals_confirm_keyboard(status, filter_key, first_id, last_id):
+    """Ommaviy tasdiqlash/rad etishni tasdiqlash"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="✅ Ha", callback_data=f"wq|c|{status}|{filter_key}|{first_id}|{last_id}"),
+            InlineKeyboardButton(text="❌ Yo'q", callback_data=f"wq|p|{filter_key}|next|{first_id - 1}")
+        ]
+    ])
+    return keyboard
+
+
+def users_page_keyboard(users, has_prev, has_next):
+    """Foydalanuvchilar sahifasi uchun oldingi/keyingi tugmalari"""
+    nav = []
+    if has_prev:
+        first = users[0]
+        nav.append(InlineKeyboardButton(
+            text="⬅️ Oldingi",
+            callback_data=f"users_page|prev|{first['created_at']}|{first['user_id']}"
+        ))
+    if has_next:
+        last = users[-1]
+        nav.append(InlineKeyboardButton(
+            text="Keyingi ➡️",
+            callback_data=f"users_page|next|{last['created_at']}|{last['user_id']}"
+        ))
+    return InlineKeyboardMarkup(inline_keyboard=[nav] if nav else [])
+
+
 def process_withdrawal_keyboard(withdrawal_id):
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
@@ -0,0 +1,184 @@
+"""Bot hayot sikli: issiq start, fon xizmatlari nazorati va to'xtashda drain
+
+    app = lifecycle.Lifecycle(bot, dp)
+    app.add_service('outbox', lambda: outbox.run_dispatcher(bot, render))
+    app.on_shutdown(db.checkpoint)
+    await app.run()
+
+run() quyidagi tartibda ishlaydi:
+1. preload() - keshlar (kanallar, sozlamalar, ochilgan foydalanuvchilar) va
+   bot identity update qabul qilishdan oldin yuklanadi;
+2. xizmatlar nazorat ostida ishga tushadi (yiqilsa - kechikish bilan qayta);
+3. polling; SIGTERM/SIGINT da yangi update olish to'xtaydi, ishlanayotgan
+   updatelar, xizmatlar va on_shutdown hooklari SHUTDOWN_TIMEOUT ichida
+   yakunlanadi, oxirida Bot sessiyasi yopiladi.
+"""
+import asyncio
+import inspect
+import logging
+import signal
+import time
+
+from aiogram import BaseMiddleware
+
+import database as db
+import metrics
+from config import SHUTDOWN_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """Outer middleware: ishlanayotgan updatelar tasklari (drain uchun)"""
+
+    def __init__(self):
+        self.tasks = set()
+
+    async def __call__(self, handler, event, data):
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            return await handler(event, data)
+        finally:
+            self.tasks.discard(task)
+
+
+class Lifecycle:
+    """Bot, dispatcher va fon xizmatlarining ishga tushishi va to'xtashi"""
+
+    def __init__(self, bot, dp, shutdown_timeout=SHUTDOWN_TIMEOUT):
+        self.bot = bot
+        self.dp = dp
+        self.shutdown_timeout = shutdown_timeout
+        self.services = {}
+        self._factories = {}
+        self._shutdown_hooks = []
+        self._stopping = False
+        self.in_flight = InFlightMiddleware()
+        dp.update.outer_middleware(self.in_flight)
+
+    # ============ Ishga tushish ============
+
+    async def preload(self):
+        """Issiq keshlarni to'ldirish; {nom: soniya} qaytaradi"""
+        timings = {}
+        for name, loader in (('channels', db.load_channels), ('settings', db.load_settings),
+                             ('unlocked_users', db.load_unlocked_users)):
+            started = time.perf_counter()
+            count = await asyncio.to_thread(loader)
+            timings[name] = time.perf_counter() - started
+            logger.info(f"Kesh yuklandi: {name} ({count} ta, {timings[name]:.3f} s)")
+
+        started = time.perf_counter()
+        me = await self.bot.me()
+        timings['bot_identity'] = time.perf_counter() - started
+        logger.info(f"Bot: @{me.username}")
+        return timings
+
+    def add_service(self, name, factory, restart_delay=5):
+        """Fon xizmatini ro'yxatga olish; factory() - xizmat korutinasini qaytaradi"""
+        self._factories[name] = (factory, restart_delay)
+
+    def on_shutdown(self, func):
+        """To'xtashda (xizmatlar to'xtagandan keyin) chaqiriladigan funksiya yoki korutina"""
+        self._shutdown_hooks.append(func)
+        return func
+
+    async def _supervise(self, name, factory, restart_delay):
+        """Xizmatni ishlatish; kutilmaganda tugasa yoki yiqilsa qayta ishga tushirish"""
+        delay = restart_delay
+        while not self._stopping:
+            started = time.monotonic()
+            try:
+                await factory()
+                logger.warning(f"Xizmat '{name}' kutilmaganda tugadi")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Xizmat '{name}' yiqildi: {e}")
+            metrics.service_restarts_total.inc(service=name)
+            # Uzoq ishlagan xizmat uchun kechikish qayta boshlanadi, tez-tez yiqilsa oshib boradi
+            delay = restart_delay if time.monotonic() - started > 60 else min(delay * 2, 300)
+            await asyncio.sleep(delay)
+
+    def start_services(self):
+        for name, (factory, restart_delay) in self._factories.items():
+            self.services[name] = asyncio.create_task(self._supervise(name, factory, restart_delay), name=name)
+
+    # ============ To'xtash ============
+
+    def request_stop(self):
+        """Signal handler: yangi updatelarni olishni to'xtatish"""
+        if self._stopping:
+            return
+        self._stopping = True
+        logger.info("To'xtash so'raldi - polling to'xtatilmoqda")
+        asyncio.get_running_loop().create_task(self._stop_polling())
+
+    async def _stop_polling(self):
+        try:
+            await self.dp.stop_polling()
+        except RuntimeError:
+            # Polling hali boshlanmagan yoki allaqachon to'xtagan
+            pass
+
+    async def shutdown(self):
+        """Ishlanayotgan updatelar, xizmatlar va hooklarni muddat ichida yakunlash"""
+        self._stopping = True
+        deadline = time.monotonic() + self.shutdown_timeout
+
+        def remaining():
+            return max(0.1, deadline - time.monotonic())
+
+        # 1. Polling allaqachon to'xtagan - boshlangan handlerlar tugashini kutish
+        pending = set(self.in_flight.tasks)
+        if pending:
+            logger.info(f"{len(pending)} ta update yakunlanishi kutilmoqda")
+            _, pending = await asyncio.wait(pending, timeout=remaining() / 2)
+            for task in pending:
+                task.cancel()
+
+        # 2. Fon xizmatlari (MTProto klientlari `async with` orqali yopiladi)
+        for task in self.services.values():
+            task.cancel()
+        if self.services:
+            _, pending = await asyncio.wait(self.services.values(), timeout=remaining())
+            if pending:
+                logger.warning(f"Muddat ichida to'xtamagan xizmatlar: {', '.join(t.get_name() for t in pending)}")
+
+        # 3. Buferlar, WAL checkpoint va boshqa hooklar
+        for hook in self._shutdown_hooks:
+            name = getattr(hook, '__qualname__', repr(hook))
+            try:
+                if inspect.iscoroutinefunction(hook):
+                    await asyncio.wait_for(hook(), timeout=remaining())
+                else:
+                    await asyncio.wait_for(asyncio.to_thread(hook), timeout=remaining())
+            except Exception as e:
+                logger.error(f"Shutdown hook '{name}' xatosi: {e!r}")
+
+        # 4. Bot sessiyasi
+        await self.bot.session.close()
+        logger.info("Bot to'xtatildi")
+
+    # ============ Asosiy ============
+
+    async def run(self, **polling_kwargs):
+        """preload -> xizmatlar -> polling -> (signal) -> shutdown"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        await self.preload()
+        self.start_services()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except NotImplementedError:
+                # Windows
+                pass
+        logger.info(f"Update qabul qilishga tayyor ({time.perf_counter() - started:.2f} s)")
+
+        try:
+            await self.dp.start_polling(self.bot, handle_signals=False, close_bot_session=False,
+                                        **polling_kwargs)
+        finally:
+            await self.shutdown()
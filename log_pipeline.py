@@ -0,0 +1,200 @@
+"""Bloklanmaydigan logging: navbat, call-site bo'yicha cheklash va yig'ma xabarlar
+
+setup() root loggerga QueueHandler o'rnatadi: event loop faqat yozuvni
+navbatga qo'yadi, konsolga yozish QueueListener threadida bajariladi.
+Navbat (LOG_QUEUE_SIZE) to'lsa yangi yozuvlar kutmasdan tashlanadi.
+
+Bitta joydan (fayl:qator) chiqadigan yozuvlar LOG_RATE_WINDOW soniyada
+LOG_RATE_LIMIT tadan oshsa, qolganlaridan har LOG_SAMPLE_EVERY tasidan biri
+"[1/N]" belgisi bilan yoziladi; o'tkazib yuborilganlar soni oyna tugagach
+bitta xabar bilan chiqadi. CRITICAL yozuvlar cheklanmaydi.
+
+Ko'p elementli aylanishlar (soat, online, broadcast) har bir element uchun
+emas, Tally orqali bitta yig'ma qator yozadi:
+
+    with log_pipeline.Tally(logger, "Clock pass") as tally:
+        for session in sessions:
+            ...
+            tally.ok()  # yoki tally.fail(session.user_id, e)
+    # Clock pass: 812 ok, 3 failed in 41.0 s (FloodWait×2, AuthKeyUnregistered×1; ...)
+"""
+import asyncio
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from collections import Counter
+
+import metrics
+from config import LOG_LEVEL, LOG_RATE_LIMIT, LOG_RATE_WINDOW, LOG_SAMPLE_EVERY, LOG_QUEUE_SIZE
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+logger = logging.getLogger(__name__)
+
+_listener = None
+_rate_limiter = None
+
+
+class RateLimitFilter(logging.Filter):
+    """Call-site (fayl, qator) bo'yicha oynali cheklov va namunalash"""
+
+    def __init__(self, limit=LOG_RATE_LIMIT, window=LOG_RATE_WINDOW, sample_every=LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.sample_every = sample_every
+        self.sites = {}  # (fayl, qator) -> [oyna boshi, yozuvlar, o'tkazib yuborilganlar, logger nomi]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.CRITICAL or record.name == __name__:
+            return True
+        key = (record.pathname, record.lineno)
+        reported = 0
+        with self._lock:
+            site = self.sites.get(key)
+            if site is None or record.created - site[0] >= self.window:
+                reported = site[2] if site else 0
+                site = self.sites[key] = [record.created, 0, 0, record.name]
+            site[1] += 1
+            over = site[1] - self.limit
+            if over > 0 and over % self.sample_every:
+                site[2] += 1
+                metrics.log_records_suppressed_total.inc(reason='rate_limited')
+                return False
+        if reported:
+            _report(key, record.name, reported)
+        if over > 0:
+            record.msg = f"{record.msg} [1/{self.sample_every}]"
+        return True
+
+    def flush(self, now=None):
+        """Oynasi tugagan call-site lar uchun o'tkazib yuborilganlar haqida xabar"""
+        now = now or time.time()
+        with self._lock:
+            finished = [(key, site) for key, site in self.sites.items() if site[2] and now - site[0] >= self.window]
+            for key, _ in finished:
+                del self.sites[key]
+        for key, site in finished:
+            _report(key, site[3], site[2])
+
+
+def _report(key, name, count):
+    path, lineno = key
+    logger.warning(f"{name} ({path.rsplit('/', 1)[-1]}:{lineno}): {count} ta o'xshash yozuv o'tkazib yuborildi")
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Navbat to'la bo'lsa kutmaydi - yozuvni tashlaydi"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.log_records_suppressed_total.inc(reason='queue_full')
+
+
+def setup(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """logging.basicConfig o'rniga: root logger -> cheklov -> navbat -> konsol threadi"""
+    global _listener, _rate_limiter
+    if _listener is not None:
+        return
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(fmt))
+
+    _rate_limiter = RateLimitFilter()
+    handler = _DroppingQueueHandler(records)
+    handler.addFilter(_rate_limiter)
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(records, console, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop)
+
+
+def stop():
+    """Qolgan yozuvlarni yozib, threadni to'xtatish (shutdown hook va atexit)
+
+    Keyingi yozuvlar navbatsiz, to'g'ridan-to'g'ri konsolga yoziladi.
+    """
+    global _listener
+    if _listener is None:
+        return
+    if _rate_limiter is not None:
+        _rate_limiter.flush(now=float('inf'))
+    _listener.stop()
+    logging.getLogger().handlers = list(_listener.handlers)
+    _listener = None
+
+
+def queue_depth():
+    """Navbatda kutayotgan yozuvlar soni - metrikalar uchun"""
+    return _listener.queue.qsize() if _listener is not None else 0
+
+
+async def run_reporter(interval=LOG_RATE_WINDOW):
+    """Jim qolgan call-site lar uchun ham o'tkazib yuborilganlar xabarini chiqarish (lifecycle xizmati)"""
+    while True:
+        await asyncio.sleep(interval)
+        if _rate_limiter is not None:
+            _rate_limiter.flush()
+
+
+class Tally:
+    """Aylanish natijalarini (ok/failed/skipped) bitta yig'ma log qatoriga jamlash
+
+    Alohida xatolar DEBUG darajasida yoziladi; yig'ma qator xato bo'lmasa INFO,
+    bo'lsa WARNING. Bo'sh aylanish (element yo'q) yozilmaydi.
+    """
+
+    def __init__(self, log, name, examples=3):
+        self.log = log
+        self.name = name
+        self.examples = examples
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.errors = Counter()
+        self.samples = []
+        self.started = time.perf_counter()
+
+    def ok(self):
+        self.succeeded += 1
+
+    def skip(self):
+        self.skipped += 1
+
+    def fail(self, subject, error):
+        self.failed += 1
+        self.errors[type(error).__name__] += 1
+        if len(self.samples) < self.examples:
+            self.samples.append(f"{subject}: {error}")
+        self.log.debug(f"{self.name}: {subject}: {error!r}", stacklevel=2)
+
+    @property
+    def total(self):
+        return self.succeeded + self.failed + self.skipped
+
+    def summary(self):
+        text = f"{self.name}: {self.succeeded} ok, {self.failed} failed"
+        if self.skipped:
+            text += f", {self.skipped} skipped"
+        text += f" in {time.perf_counter() - self.started:.1f} s"
+        if self.errors:
+            errors = ', '.join(f"{name}×{count}" for name, count in self.errors.most_common())
+            text += f" ({errors}; {' | '.join(self.samples)})"
+        return text
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.total:
+            # stacklevel=2 - call-site sifatida `with` yozilgan joy (cheklov har bir aylanish uchun alohida)
+            self.log.log(logging.WARNING if self.failed else logging.INFO, self.summary(), stacklevel=2)
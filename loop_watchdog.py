@@ -0,0 +1,181 @@
+"""Event loop watchdog: kechikishni o'lchash va bloklagan kodni aniqlash
+
+Heartbeat korutinasi har LOOP_HEARTBEAT_MS da uyg'onadi va kechikishini
+bot_loop_lag_seconds ga yozadi. Alohida thread heartbeat qachon oxirgi
+marta urganini kuzatadi: loop LOOP_STALL_THRESHOLD_MS dan uzoq javob
+bermasa (sqlite chaqiruvi, og'ir formatlash, sinxron I/O), loop threadining
+stacki sys._current_frames() orqali shu paytning o'zida olinadi va undan
+handler/fon funksiyasi hamda database.py funksiyasi aniqlanadi. Loop
+qaytgach bloklanishning to'liq davomiyligi yoziladi.
+
+Oxirgi LOOP_STALL_HISTORY ta hodisa xotiradagi ring buferda saqlanadi:
+admin /stalls buyrug'i va metrics serveridagi /debug/loop_stalls orqali.
+
+    app.add_service('loop_watchdog', loop_watchdog.run)
+"""
+import asyncio
+import html
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import metrics
+from config import LOOP_HEARTBEAT_MS, LOOP_STALL_THRESHOLD_MS, LOOP_STALL_HISTORY
+
+logger = logging.getLogger(__name__)
+
+# Handler yoki fon funksiyasi deb hisoblanadigan modullar (bot `python main.py` bilan ishlaydi)
+APP_MODULES = ('__main__', 'main')
+STACK_LIMIT = 40
+
+stalls = deque(maxlen=LOOP_STALL_HISTORY)
+_lock = threading.Lock()
+_state = {'beat': None, 'stall': None, 'thread_id': None, 'loop': None}
+
+
+def _frame_module(frame):
+    return frame.f_globals.get('__name__', '?')
+
+
+def _describe(frame):
+    """'modul.funksiya (fayl:qator)'"""
+    code = frame.f_code
+    return f"{_frame_module(frame)}.{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _walk(frame):
+    """Stack freymlari tashqaridan ichkariga"""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def capture(thread_id):
+    """Berilgan threadning joriy stacki: (freymlar, handler, db funksiyasi)"""
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return [], None, None
+    frames = _walk(frame)
+    # Handler - loopdagi eng tashqi ilova funksiyasi, DB funksiyasi - eng ichkisi
+    handler = next((f.f_code.co_name for f in frames
+                    if _frame_module(f) in APP_MODULES and f.f_code.co_name != '<module>'), None)
+    db_function = next((f.f_code.co_name for f in reversed(frames) if _frame_module(f) == 'database'), None)
+    return [_describe(f) for f in frames[-STACK_LIMIT:]], handler, db_function
+
+
+def _current_task_name(loop):
+    try:
+        task = asyncio.current_task(loop)
+    except RuntimeError:
+        return None
+    return task.get_name() if task is not None else None
+
+
+def _record_stall(blocked):
+    """Side thread: loop bloklanganda stackni olib, ring buferga yozish"""
+    stack, handler, db_function = capture(_state['thread_id'])
+    stall = {
+        'at': datetime.now().isoformat(timespec='seconds'),
+        'lag_ms': round(blocked * 1000),
+        'finished': False,
+        'handler': handler,
+        'db_function': db_function,
+        'task': _current_task_name(_state['loop']),
+        'stack': stack,
+    }
+    stalls.append(stall)
+    metrics.loop_stalls_total.inc(handler=handler or 'unknown', db_function=db_function or '')
+    logger.warning(f"Event loop {stall['lag_ms']} ms dan beri bloklangan: "
+                   f"{handler or '?'} / {db_function or '-'} -> {stack[-1] if stack else '?'}")
+    return stall
+
+
+def _watch(interval, threshold, stop):
+    """Side thread: heartbeat kechiksa loop threadi stackini olish (har bloklanishda bir marta)"""
+    while not stop.wait(interval / 2):
+        with _lock:
+            beat = _state['beat']
+            if beat is None or _state['stall'] is not None:
+                continue
+            blocked = time.monotonic() - beat - interval
+            if blocked >= threshold:
+                _state['stall'] = _record_stall(blocked)
+
+
+def _on_beat(lag, threshold):
+    """Heartbeat: kechikishni yozish va bloklanish hodisasini yopish"""
+    metrics.loop_lag_seconds.observe(lag)
+    with _lock:
+        _state['beat'] = time.monotonic()
+        stall, _state['stall'] = _state['stall'], None
+    if stall is not None:
+        stall['lag_ms'] = round(lag * 1000)
+        stall['finished'] = True
+        logger.warning(f"Event loop {stall['lag_ms']} ms bloklandi ({stall['handler'] or '?'})")
+    elif lag >= threshold:
+        # Thread tekshiruvlari orasiga tushgan qisqa bloklanish - stack olinmadi
+        stalls.append({
+            'at': datetime.now().isoformat(timespec='seconds'), 'lag_ms': round(lag * 1000),
+            'finished': True, 'handler': None, 'db_function': None, 'task': None, 'stack': [],
+        })
+        metrics.loop_stalls_total.inc(handler='unknown', db_function='')
+
+
+async def run(interval=LOOP_HEARTBEAT_MS / 1000, threshold=LOOP_STALL_THRESHOLD_MS / 1000):
+    """Heartbeat va kuzatuvchi threadni ishga tushirish (lifecycle xizmati)"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        _state.update(beat=time.monotonic(), stall=None, thread_id=threading.get_ident(), loop=loop)
+    stop = threading.Event()
+    watcher = threading.Thread(target=_watch, args=(interval, threshold, stop), name='loop-watchdog', daemon=True)
+    watcher.start()
+    try:
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            _on_beat(max(0.0, time.monotonic() - expected), threshold)
+    finally:
+        stop.set()
+        with _lock:
+            _state['beat'] = None
+
+
+@metrics.register_endpoint('/debug/loop_stalls')
+def recent(limit=None):
+    """Oxirgi bloklanishlar (yangisi birinchi)"""
+    items = list(stalls)[::-1]
+    return items[:limit] if limit else items
+
+
+def format_report(limit=10):
+    """Admin /stalls uchun HTML hisobot"""
+    items = recent(limit)
+    if not items:
+        return f"✅ Event loop {LOOP_STALL_THRESHOLD_MS} ms dan uzoq bloklanmagan."
+    text = f"🧊 <b>Event loop bloklanishlari</b> (≥{LOOP_STALL_THRESHOLD_MS} ms, oxirgi {len(items)} ta)\n\n"
+    for stall in items:
+        running = '' if stall['finished'] else ' (davom etmoqda)'
+        where = stall['handler'] or stall['task'] or '?'
+        db_function = f" / db.{stall['db_function']}" if stall['db_function'] else ''
+        text += f"• {stall['at'][5:16]} — <b>{stall['lag_ms']} ms</b>{running}: <code>{html.escape(where + db_function)}</code>\n"
+        if stall['stack']:
+            text += f"  ↳ <code>{html.escape(stall['stack'][-1])}</code>\n"
+    return text
+
+
+def format_stacks():
+    """Barcha saqlangan hodisalarning to'liq stacklari (fayl sifatida yuborish uchun)"""
+    lines = []
+    for stall in recent():
+        lines.append(f"{stall['at']}  {stall['lag_ms']} ms  handler={stall['handler']}  "
+                     f"db={stall['db_function']}  task={stall['task']}")
+        lines.extend(f"    {frame}" for frame in stall['stack'] or ['(stack olinmadi)'])
+        lines.append('')
+    return '\n'.join(lines)
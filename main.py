@@ -3,42 +3,71 @@ import re
 import asyncio
 import os
 import hashlib
+import json
+import time
 from datetime import datetime
 from aiogram import Bot, Dispatcher, Router, F
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import Message, CallbackQuery, ChatShared
+from aiogram.types import Message, CallbackQuery, ChatShared, FSInputFile, BufferedInputFile
 from aiogram.enums import ChatType, ChatMemberStatus
-
-from pyrogram import Client
-from pyrogram.errors import (
-    PhoneCodeInvalid, PhoneCodeExpired, SessionPasswordNeeded,
-    PasswordHashInvalid, PhoneNumberInvalid, FloodWait
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from config import (
+    BOT_TOKEN, ADMINS, SESSIONS_DIR, REFERRAL_REWARD, MIN_WITHDRAWAL, REQUIRED_REFERRALS,
+    BACKUP_DIR, BACKUP_HOUR, BACKUP_FULL_INTERVAL_DAYS, METRICS_PORT,
+    DB_PROFILE, TELEGRAM_API_SERVER, TRACING, THROTTLING
 )
-
-from config import BOT_TOKEN, ADMINS, SESSIONS_DIR, REFERRAL_REWARD, MIN_WITHDRAWAL
 import database as db
 import keyboards as kb
-
-# Logging sozlash
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+import backup
+import outbox
+import metrics
+import db_profiler
+import mtproto
+import lifecycle
+import write_buffer
+import retention
+import loop_watchdog
+import tracing
+import memory_stats
+import log_pipeline
+import throttling
+
+# Logging sozlash (navbat orqali alohida threadda, call-site bo'yicha cheklangan)
+log_pipeline.setup()
 logger = logging.getLogger(__name__)
 
 # Sessions papkasini yaratish
 os.makedirs(SESSIONS_DIR, exist_ok=True)
 
 # Bot va Dispatcher
-bot = Bot(token=BOT_TOKEN, parse_mode="HTML")
+if TELEGRAM_API_SERVER:
+    # Boshqa Bot API server (lokal server yoki tools/fake_bot_api.py)
+    bot = Bot(token=BOT_TOKEN, parse_mode="HTML",
+              session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER)))
+else:
+    bot = Bot(token=BOT_TOKEN, parse_mode="HTML")
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 router = Router()
 dp.include_router(router)
 
+# Foydalanuvchi bo'yicha cheklov (metrics/tracing middleware laridan oldin - tashlanganlar handlerga yetmaydi)
+throttler = throttling.setup(router, exempt=ADMINS) if THROTTLING else None
+
+# Handler, DB va Bot API metrikalari
+metrics.setup_bot(dp, router, bot)
+metrics.setup_database(db)
+if DB_PROFILE:
+    db_profiler.enable()
+if TRACING:
+    tracing.setup(dp, router, bot, db, db_skip=metrics.DB_UNTIMED)
+
 # Aktiv Pyrogram clientlar
 active_clients = {}
 
@@ -136,6 +165,7 @@ async def check_bot_started(user_id, bot_username):
     # Hozircha bazadagi yozuvni tekshiramiz
     return db.has_bot_started(user_id, bot_username)
 
+@metrics.timed('check_user_subscription')
 async def check_user_subscription(user_id):
     """Foydalanuvchi barcha kanallarga obuna bo'lganini tekshirish"""
     # Admin majburiy obunadan o'tmaydi
@@ -172,6 +202,7 @@ async def check_user_subscription(user_id):
     
     return True
 
+@metrics.timed('require_subscription')
 async def require_subscription(message: Message):
     """Obuna talab qilish"""
     # Admin majburiy obunadan o'tmaydi
@@ -243,9 +274,6 @@ def format_user_info(user_data, history=None):
 
 # ============ Start va asosiy handlerlar ============
 
-# Kerakli referal soni
-REQUIRED_REFERRALS = 5
-
 @router.message(Command("start"), StateFilter("*"))
 async def cmd_start(message: Message, state: FSMContext):
     """Start buyrug'i"""
@@ -258,26 +286,13 @@ async def cmd_start(message: Message, state: FSMContext):
     if len(args) > 1 and args[1].startswith("ref_"):
         try:
             referrer_id = int(args[1].replace("ref_", ""))
-            if referrer_id != message.from_user.id and not db.has_referrer(message.from_user.id):
-                db.add_referral(referrer_id, message.from_user.id)
-                # Taklif qilgan odamga pul qo'shish
-                db.add_balance(referrer_id, REFERRAL_REWARD)
-                # Taklif qilgan odamga xabar yuborish
-                try:
-                    ref_count = db.get_referral_count(referrer_id)
-                    balance_info = db.get_user_balance(referrer_id)
-                    await bot.send_message(
-                        referrer_id, 
-                        f"🎉 <b>Yangi referal!</b>\n\n"
-                        f"👤 <b>{message.from_user.first_name}</b> sizning havolangiz orqali qo'shildi.\n\n"
-                        f"� <b>+{REFERRAL_REWARD:,} so'm</b> balansingizga qo'shildi!\n"
-                        f"💵 Joriy balans: <b>{balance_info['balance']:,}</b> so'm\n"
-                        f"👥 Jami referallar: <b>{ref_count}</b> ta"
-                    )
-                except:
-                    pass
-        except:
-            pass
+            if referrer_id != message.from_user.id:
+                # Referal + mukofot + xabar bitta tranzaksiyada, xabarni outbox yuboradi
+                if db.credit_referral(referrer_id, message.from_user.id, REFERRAL_REWARD,
+                                      message.from_user.first_name):
+                    outbox.wakeup()
+        except Exception as e:
+            logger.error(f"Referal xatosi: {e}")
     
     if not await require_subscription(message):
         return
@@ -313,10 +328,14 @@ async def check_referral_requirement(message: Message):
     if is_admin(user_id):
         return True
     
+    # Ochilgan foydalanuvchilar uchun xotiradagi tekshiruv yoki bitta PK o'qish
+    if db.is_services_unlocked(user_id):
+        return True
+    
     ref_count = db.get_referral_count(user_id)
     
     if ref_count < REQUIRED_REFERRALS:
-        bot_info = await bot.get_me()
+        bot_info = await bot.me()
         ref_link = f"https://t.me/{bot_info.username}?start=ref_{user_id}"
         
         await message.answer(
@@ -359,7 +378,7 @@ async def show_referral(message: Message, state: FSMContext):
     user_id = message.from_user.id
     ref_count = db.get_referral_count(user_id)
     balance_info = db.get_user_balance(user_id)
-    bot_info = await bot.get_me()
+    bot_info = await bot.me()
     ref_link = f"https://t.me/{bot_info.username}?start=ref_{user_id}"
     
     balance = balance_info['balance']
@@ -522,7 +541,11 @@ async def start_telegram_login(message: Message, state: FSMContext, service_type
             )
         return
     
-    # Yangi login kerak - avval API_ID so'rash
+    # Yangi login kerak - foydalanuvchi API ma'lumotlarini yozguncha pyrogram fonda yuklanadi
+    if not mtproto.is_loaded():
+        asyncio.get_running_loop().run_in_executor(None, mtproto.load)
+    
+    # Avval API_ID so'rash
     await state.update_data(service_type=service_type)
     await state.set_state(TelegramLoginState.waiting_for_api_id)
     
@@ -629,7 +652,7 @@ async def process_phone_number(message: Message, state: FSMContext):
     
     # Pyrogram client yaratish
     try:
-        client = Client(
+        client = mtproto.create_client(
             name=f"{SESSIONS_DIR}/user_{user_id}",
             api_id=user_api_id,
             api_hash=user_api_hash,
@@ -659,12 +682,12 @@ async def process_phone_number(message: Message, state: FSMContext):
             f"❌ Bekor qilish: /cancel"
         )
         
-    except PhoneNumberInvalid:
+    except mtproto.errors.PhoneNumberInvalid:
         await message.answer(
             "❌ <b>Noto'g'ri telefon raqami!</b>\n\n"
             "Iltimos, to'g'ri raqam yuboring."
         )
-    except FloodWait as e:
+    except mtproto.errors.FloodWait as e:
         await message.answer(
             f"⏳ <b>Juda ko'p urinish!</b>\n\n"
             f"Iltimos, {e.value} soniya kutib turing."
@@ -736,7 +759,7 @@ async def process_code(message: Message, state: FSMContext):
         
         await state.clear()
         
-    except SessionPasswordNeeded:
+    except mtproto.errors.SessionPasswordNeeded:
         # 2FA kerak
         await state.set_state(TelegramLoginState.waiting_for_2fa)
         await message.answer(
@@ -746,12 +769,12 @@ async def process_code(message: Message, state: FSMContext):
             "❌ Bekor qilish: /cancel"
         )
         
-    except PhoneCodeInvalid:
+    except mtproto.errors.PhoneCodeInvalid:
         await message.answer(
             "❌ <b>Noto'g'ri kod!</b>\n\n"
             "Iltimos, to'g'ri kodni yuboring."
         )
-    except PhoneCodeExpired:
+    except mtproto.errors.PhoneCodeExpired:
         await message.answer(
             "❌ <b>Kod eskirgan!</b>\n\n"
             "Iltimos, /cancel bosib, qaytadan boshlang."
@@ -811,7 +834,7 @@ async def process_2fa(message: Message, state: FSMContext):
         
         await state.clear()
         
-    except PasswordHashInvalid:
+    except mtproto.errors.PasswordHashInvalid:
         await message.answer(
             "❌ <b>Noto'g'ri parol!</b>\n\n"
             "Iltimos, to'g'ri parolni yuboring."
@@ -896,8 +919,7 @@ async def backup_menu(message: Message, state: FSMContext):
         return
     
     auto_backup = db.is_auto_backup_enabled()
-    users_count = db.get_users_count()
-    ref_count = len(db.get_all_users())  # Oddiy hisob
+    counters = db.get_stats_counters()
     
     auto_status = "🟢 Yoqilgan" if auto_backup else "🔴 O'chirilgan"
     auto_text = "\n<i>Har kuni soat 03:00 da avtomatik zaxira olinadi</i>" if auto_backup else ""
@@ -905,13 +927,17 @@ async def backup_menu(message: Message, state: FSMContext):
     text = f"💾 <b>ZAXIRA NUSXA</b>\n"
     text += f"━━━━━━━━━━━━━━━\n\n"
     text += f"📊 <b>Ma'lumotlar bazasi:</b>\n"
-    text += f"├ 👥 Foydalanuvchilar: <b>{users_count}</b>\n"
-    text += f"├ 📦 Referallar: <b>{db.get_referral_count(message.from_user.id)}</b>\n"
-    text += f"└ 📢 Kanallar: <b>{len(db.get_active_channels())}</b>\n\n"
-    text += f"⏰ <b>Avtomatik zaxira:</b> {auto_status}{auto_text}\n\n"
-    text += f"📤 <b>Tiklash:</b> Zaxira faylni (.db) shu chatga yuboring"
+    text += f"├ 👥 Foydalanuvchilar: <b>{counters.get('users', 0)}</b>\n"
+    text += f"├ 📦 Referallar: <b>{counters.get('referrals', 0)}</b>\n"
+    text += f"└ 📢 Kanallar: <b>{counters.get('channels_active', 0)}</b>\n\n"
+    text += f"⏰ <b>Avtomatik zaxira:</b> {auto_status}{auto_text}\n"
+    if db.is_incremental_backup_enabled():
+        text += f"🧩 <b>Rejim:</b> Inkremental (har {BACKUP_FULL_INTERVAL_DAYS} kunda to'liq, qolgan kunlari faqat o'zgarishlar)\n\n"
+    else:
+        text += f"🧩 <b>Rejim:</b> To'liq (har safar butun baza)\n\n"
+    text += f"📤 <b>Tiklash:</b> Zaxira faylni (.db, .db.gz, .db.xz) shu chatga yuboring"
     
-    await message.answer(text, reply_markup=kb.backup_keyboard(auto_backup))
+    await message.answer(text, reply_markup=kb.backup_keyboard(auto_backup, db.is_incremental_backup_enabled()))
 
 @router.message(F.text == "📥 Zaxira olish", StateFilter("*"))
 async def get_backup(message: Message, state: FSMContext):
@@ -922,23 +948,35 @@ async def get_backup(message: Message, state: FSMContext):
         await message.answer("❌ Sizda admin huquqlari yo'q!")
         return
     
-    from aiogram.types import FSInputFile
-    import os
-    
-    db_path = "bot_database.db"
-    
-    if os.path.exists(db_path):
-        file = FSInputFile(db_path, filename=f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
-        await message.answer_document(
-            file,
-            caption=f"💾 <b>Zaxira nusxa</b>\n\n"
-                    f"📅 Sana: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-                    f"👥 Foydalanuvchilar: {db.get_users_count()}"
+    try:
+        files = await asyncio.to_thread(backup.create_backup)
+        await send_backup_files(message.chat.id, files)
+    except Exception as e:
+        logger.error(f"Zaxira olishda xato: {e}")
+        await message.answer(f"❌ Zaxira olishda xato: {e}")
+    
+    await message.answer("Davom etish uchun tugmani tanlang:", reply_markup=kb.backup_keyboard(db.is_auto_backup_enabled(), db.is_incremental_backup_enabled()))
+
+async def send_backup_files(chat_id, files):
+    """Zaxira fayllarini yuborish (katta bo'lsa bo'laklab)"""
+    for i, path in enumerate(files, 1):
+        caption = (
+            f"💾 <b>Zaxira nusxa</b>\n\n"
+            f"📅 Sana: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"👥 Foydalanuvchilar: {db.get_users_count()}"
         )
-    else:
-        await message.answer("❌ Database fayli topilmadi!")
-    
-    await message.answer("Davom etish uchun tugmani tanlang:", reply_markup=kb.backup_keyboard(db.is_auto_backup_enabled()))
+        if '.delta.' in path:
+            caption += (
+                f"\n🧩 <b>Inkremental (delta)</b> - oxirgi to'liq zaxiraga qo'llanadi:\n"
+                f"<code>python backup.py FULL.db.gz DELTA.jsonl.gz -o restored.db</code>"
+            )
+        if len(files) > 1:
+            archive_name = os.path.basename(path).rsplit('.part', 1)[0]
+            caption += (
+                f"\n📦 Qism: {i}/{len(files)}\n"
+                f"<i>Birlashtirish: cat {archive_name}.part* > {archive_name}</i>"
+            )
+        await bot.send_document(chat_id, FSInputFile(path), caption=caption)
 
 @router.message(F.text.startswith("⏰ Avto-zaxira:"), StateFilter("*"))
 async def toggle_auto_backup(message: Message, state: FSMContext):
@@ -955,9 +993,31 @@ async def toggle_auto_backup(message: Message, state: FSMContext):
     await message.answer(
         f"⏰ <b>Avtomatik zaxira {status_text}</b>\n\n"
         f"{'Har kuni soat 03:00 da avtomatik zaxira olinadi.' if new_status else 'Avtomatik zaxira o`chirildi.'}",
-        reply_markup=kb.backup_keyboard(new_status)
+        reply_markup=kb.backup_keyboard(new_status, db.is_incremental_backup_enabled())
     )
 
+@router.message(F.text.startswith("🧩 Rejim:"), StateFilter("*"))
+async def toggle_backup_mode(message: Message, state: FSMContext):
+    """Zaxira rejimini almashtirish (to'liq/inkremental)"""
+    await state.clear()
+    
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ Sizda admin huquqlari yo'q!")
+        return
+    
+    incremental = db.toggle_backup_mode()
+    
+    if incremental:
+        text = (
+            "🧩 <b>Inkremental rejim yoqildi</b>\n\n"
+            f"Har {BACKUP_FULL_INTERVAL_DAYS} kunda to'liq zaxira, qolgan kunlari faqat "
+            "oxirgi to'liq zaxiradan beri o'zgarishlar yuboriladi. Keyingi avto-zaxira to'liq bo'ladi."
+        )
+    else:
+        text = "🧩 <b>To'liq rejim yoqildi</b>\n\nHar safar butun baza yuboriladi."
+    
+    await message.answer(text, reply_markup=kb.backup_keyboard(db.is_auto_backup_enabled(), incremental))
+
 @router.message(F.text == "📤 Zaxiradan tiklash", StateFilter("*"))
 async def restore_backup_info(message: Message, state: FSMContext):
     """Zaxiradan tiklash haqida ma'lumot"""
@@ -971,7 +1031,7 @@ async def restore_backup_info(message: Message, state: FSMContext):
     await message.answer(
         "📤 <b>Zaxiradan tiklash</b>\n\n"
         "⚠️ <b>Diqqat!</b> Zaxiradan tiklash joriy ma'lumotlarni o'chirib yuboradi!\n\n"
-        "Zaxira faylni (.db) shu chatga yuboring yoki bekor qilish uchun pastdagi tugmani bosing:",
+        "Zaxira faylni (.db, .db.gz, .db.xz) shu chatga yuboring yoki bekor qilish uchun pastdagi tugmani bosing:",
         reply_markup=kb.cancel_keyboard()
     )
 
@@ -982,27 +1042,43 @@ async def process_backup_file(message: Message, state: FSMContext):
         await message.answer("❌ Sizda admin huquqlari yo'q!")
         return
     
-    if not message.document.file_name.endswith('.db'):
-        await message.answer("❌ Faqat .db formatidagi fayllarni yuklang!")
+    file_name = message.document.file_name or ''
+    extension = next((ext for ext in backup.RESTORE_EXTENSIONS[::-1] if file_name.endswith(ext)), None)
+    if not extension:
+        await message.answer("❌ Faqat .db, .db.gz yoki .db.xz formatidagi fayllarni yuklang!")
         return
     
-    import os
-    import shutil
+    # Faylni vaqtinchalik joyga yuklash (jonli baza ustiga emas)
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    upload_path = os.path.join(BACKUP_DIR, f"upload_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}")
+    file = await bot.get_file(message.document.file_id)
+    await bot.download_file(file.file_path, upload_path)
     
-    # Eski bazani backup qilish
-    if os.path.exists("bot_database.db"):
-        shutil.copy("bot_database.db", "bot_database_old.db")
+    progress = await message.answer("⏳ Zaxira tekshirilmoqda...")
     
-    # Yangi faylni yuklash
-    file = await bot.get_file(message.document.file_id)
-    await bot.download_file(file.file_path, "bot_database.db")
+    try:
+        # Joriy bazaning nusxasi - tiklashdan oldin
+        safety_files = await asyncio.to_thread(backup.create_backup)
+        version = await asyncio.to_thread(backup.restore_from_file, upload_path)
+    except backup.RestoreError as e:
+        await progress.edit_text(f"❌ <b>Zaxira fayli yaroqsiz:</b> {e}\n\nJoriy ma'lumotlar o'zgarmadi.")
+        return
+    except Exception as e:
+        logger.error(f"Zaxiradan tiklashda xato: {e}")
+        await progress.edit_text(f"❌ Zaxiradan tiklashda xato: {e}\n\nJoriy ma'lumotlar o'zgarmadi.")
+        return
+    finally:
+        if os.path.exists(upload_path):
+            os.remove(upload_path)
+    
+    migrated = f"\n🔄 Sxema v{version} → v{db.SCHEMA_VERSION} ga yangilandi." if version < db.SCHEMA_VERSION else ""
     
     await state.clear()
-    await message.answer(
-        "✅ <b>Zaxira muvaffaqiyatli tiklandi!</b>\n\n"
-        "Eski ma'lumotlar <code>bot_database_old.db</code> faylida saqlandi.",
-        reply_markup=kb.backup_keyboard(db.is_auto_backup_enabled())
+    await progress.edit_text(
+        f"✅ <b>Zaxira muvaffaqiyatli tiklandi!</b>{migrated}\n\n"
+        f"Eski ma'lumotlar <code>{os.path.basename(safety_files[0])}</code> nusxasida saqlandi."
     )
+    await message.answer("Davom etish uchun tugmani tanlang:", reply_markup=kb.backup_keyboard(db.is_auto_backup_enabled(), db.is_incremental_backup_enabled()))
 
 @router.message(F.text == "🔙 Orqaga", StateFilter("*"))
 async def back_to_admin_from_backup(message: Message, state: FSMContext):
@@ -1040,12 +1116,42 @@ async def admin_statistics(message: Message, state: FSMContext):
         await message.answer("❌ Sizda admin huquqlari yo'q!")
         return
     
-    users_count = db.get_users_count()
-    channels = db.get_active_channels()
+    counters = db.get_stats_counters()
+    rollups = db.get_daily_rollups(7)
+    
+    def withdrawal_line(status):
+        count = counters.get(f'withdrawals_{status}', 0)
+        amount = counters.get(f'withdrawals_{status}_amount', 0)
+        return f"<b>{count}</b> ta ({amount:,} so'm)"
     
     text = f"📊 <b>Bot statistikasi</b>\n\n"
-    text += f"👥 Jami foydalanuvchilar: <b>{users_count}</b>\n"
-    text += f"📢 Faol kanallar: <b>{len(channels)}</b>\n"
+    text += f"👥 Jami foydalanuvchilar: <b>{counters.get('users', 0)}</b>\n"
+    text += f"📬 Xabar yetadiganlar: <b>{counters.get('reachable_users', 0)}</b>\n"
+    text += f"🔗 Referallar: <b>{counters.get('referrals', 0)}</b>\n"
+    text += f"💰 Jami hisoblangan: <b>{counters.get('balance_credits', 0):,}</b> so'm\n"
+    text += f"📢 Faol kanallar: <b>{counters.get('channels_active', 0)}</b>\n\n"
+    
+    text += f"💸 <b>Pul yechish:</b>\n"
+    text += f"├ ⏳ Kutilmoqda: {withdrawal_line('pending')}\n"
+    text += f"├ ✅ Tasdiqlangan: {withdrawal_line('approved')}\n"
+    text += f"└ ❌ Rad etilgan: {withdrawal_line('rejected')}\n\n"
+    
+    text += f"📈 <b>Oxirgi 7 kun:</b>\n"
+    if rollups:
+        for day, metrics in rollups.items():
+            text += (
+                f"📅 {day[5:]}: 👥 +{metrics.get('new_users', 0)} | "
+                f"🔗 +{metrics.get('referrals', 0)} | "
+                f"💰 +{metrics.get('balance_credits', 0):,} | "
+                f"💸 {metrics.get('withdrawals_created', 0)}\n"
+            )
+        week = {}
+        for metrics in rollups.values():
+            for key, value in metrics.items():
+                week[key] = week.get(key, 0) + value
+        text += f"\n📊 Hafta: 👥 +{week.get('new_users', 0)}, 🔗 +{week.get('referrals', 0)}, 💰 +{week.get('balance_credits', 0):,} so'm"
+    else:
+        text += "<i>Ma'lumot yo'q</i>"
     
     await message.answer(text, reply_markup=kb.admin_panel_reply_keyboard())
 
@@ -1073,24 +1179,48 @@ async def admin_users(message: Message, state: FSMContext):
         await message.answer("❌ Sizda admin huquqlari yo'q!")
         return
     
-    users = db.get_all_users()
+    users, has_prev, has_next = db.get_users_page()
     
     if not users:
         await message.answer("👥 Hozircha foydalanuvchilar yo'q.", reply_markup=kb.admin_panel_reply_keyboard())
         return
     
+    await message.answer(
+        format_users_page(users),
+        reply_markup=kb.users_page_keyboard(users, has_prev, has_next)
+    )
+
+def format_users_page(users):
+    """Foydalanuvchilar sahifasini formatlash"""
     text = f"👥 <b>Foydalanuvchilar ro'yxati</b>\n\n"
-    text += f"Jami: {len(users)} ta\n\n"
+    text += f"Jami: {db.get_users_count()} ta\n\n"
     
-    for i, user in enumerate(users[:10], 1):
+    for user in users:
         name = user['first_name'] or 'Nomsiz'
         username = f"@{user['username']}" if user['username'] else ''
-        text += f"{i}. {name} {username} - <code>{user['user_id']}</code>\n"
+        text += f"• {name} {username} - <code>{user['user_id']}</code>\n"
+        text += f"   📅 {user['created_at']}\n"
+    
+    return text
+
+@router.callback_query(F.data.startswith("users_page|"))
+async def users_page_callback(callback: CallbackQuery):
+    """Foydalanuvchilar ro'yxatida sahifalash"""
+    if not is_admin(callback.from_user.id):
+        return
     
-    if len(users) > 10:
-        text += f"\n... va yana {len(users) - 10} ta"
+    _, direction, created_at, user_id = callback.data.split("|")
+    users, has_prev, has_next = db.get_users_page((created_at, int(user_id)), direction)
     
-    await message.answer(text, reply_markup=kb.admin_panel_reply_keyboard())
+    if not users:
+        await callback.answer("Boshqa foydalanuvchilar yo'q.", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        format_users_page(users),
+        reply_markup=kb.users_page_keyboard(users, has_prev, has_next)
+    )
+    await callback.answer()
 
 @router.message(F.text == "📨 Xabar yuborish", StateFilter("*"))
 async def broadcast_start(message: Message, state: FSMContext):
@@ -1323,7 +1453,7 @@ async def process_add_channel(message: Message, state: FSMContext):
             return
     
     try:
-        bot_member = await bot.get_chat_member(channel_id, (await bot.get_me()).id)
+        bot_member = await bot.get_chat_member(channel_id, (await bot.me()).id)
         if bot_member.status not in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.CREATOR]:
             await message.answer(
                 "❌ Bot bu kanal/guruhda admin emas. Iltimos, botni admin qilib qo'shing.",
@@ -1403,7 +1533,7 @@ async def process_chat_shared(message: Message, state: FSMContext):
     
     # Botning admin ekanligini tekshirish
     try:
-        bot_member = await bot.get_chat_member(channel_id, (await bot.get_me()).id)
+        bot_member = await bot.get_chat_member(channel_id, (await bot.me()).id)
         if bot_member.status not in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.CREATOR]:
             await message.answer(
                 "❌ Bot bu kanal/guruhda admin emas. Iltimos, botni admin qilib qo'shing.",
@@ -1478,30 +1608,32 @@ async def confirm_broadcast(message: Message, state: FSMContext):
     broadcast_chat_id = data.get('broadcast_chat_id')
     
     users = db.get_all_users()
-    sent = 0
-    failed = 0
     
     progress = await message.answer("📤 Xabar yuborilmoqda...")
     
-    for user in users:
-        try:
-            await bot.copy_message(user['user_id'], broadcast_chat_id, broadcast_message_id)
-            sent += 1
-        except Exception as e:
-            failed += 1
-            logger.error(f"Xabar yuborishda xato ({user['user_id']}): {e}")
-        
-        if (sent + failed) % 50 == 0:
+    with log_pipeline.Tally(logger, "Broadcast") as tally:
+        for user in users:
             try:
-                await progress.edit_text(f"📤 Yuborilmoqda... {sent + failed}/{len(users)}")
-            except:
-                pass
+                await bot.copy_message(user.user_id, broadcast_chat_id, broadcast_message_id)
+                tally.ok()
+            except TelegramForbiddenError as e:
+                # Foydalanuvchi botni bloklagan
+                db.set_user_reachable(user.user_id, False)
+                tally.fail(user.user_id, e)
+            except Exception as e:
+                tally.fail(user.user_id, e)
+            
+            if tally.total % 50 == 0:
+                try:
+                    await progress.edit_text(f"📤 Yuborilmoqda... {tally.total}/{len(users)}")
+                except:
+                    pass
     
     await state.clear()
     await progress.edit_text(
         f"✅ <b>Xabar yuborish yakunlandi!</b>\n\n"
-        f"📤 Yuborildi: {sent}\n"
-        f"❌ Xato: {failed}"
+        f"📤 Yuborildi: {tally.succeeded}\n"
+        f"❌ Xato: {tally.failed}"
     )
     await message.answer("🔐 Admin panel", reply_markup=kb.admin_panel_reply_keyboard())
 
@@ -1585,9 +1717,9 @@ async def process_search_user(message: Message, state: FSMContext):
     
     found = []
     for user in users:
-        if (user['username'] and query_lower in user['username'].lower()) or \
-           (user['first_name'] and query_lower in user['first_name'].lower()) or \
-           (user['last_name'] and query_lower in user['last_name'].lower()):
+        if (user.username and query_lower in user.username.lower()) or \
+           (user.first_name and query_lower in user.first_name.lower()) or \
+           (user.last_name and query_lower in user.last_name.lower()):
             found.append(user)
     
     if not found:
@@ -1694,17 +1826,18 @@ async def process_card_number(message: Message, state: FSMContext):
     data = await state.get_data()
     amount = data.get('amount', 0)
     
-    # Balansdan ayirish
-    if not db.subtract_balance(user_id, amount):
-        await state.clear()
-        await message.answer("❌ Xatolik yuz berdi. Balans yetarli emas.", reply_markup=kb.main_menu_keyboard())
-        return
-    
-    # Pul yechish so'rovini yaratish
+    # Balansdan ayirish, so'rov yaratish va adminlarga xabar - bitta tranzaksiyada
     formatted_card = f"{card[:4]} {card[4:8]} {card[8:12]} {card[12:]}"
-    withdrawal_id = db.create_withdrawal(user_id, amount, formatted_card)
+    withdrawal_id = db.create_withdrawal_request(
+        user_id, amount, formatted_card, message.from_user.first_name, ADMINS
+    )
     
     await state.clear()
+    if not withdrawal_id:
+        await message.answer("❌ Xatolik yuz berdi. Balans yetarli emas.", reply_markup=kb.main_menu_keyboard())
+        return
+    outbox.wakeup()
+    
     await message.answer(
         f"✅ <b>So'rov qabul qilindi!</b>\n\n"
         f"📋 So'rov raqami: <b>#{withdrawal_id}</b>\n"
@@ -1713,22 +1846,6 @@ async def process_card_number(message: Message, state: FSMContext):
         f"⏳ So'rov 24 soat ichida ko'rib chiqiladi.",
         reply_markup=kb.main_menu_keyboard()
     )
-    
-    # Adminlarga xabar yuborish
-    for admin_id in ADMINS:
-        try:
-            await bot.send_message(
-                admin_id,
-                f"💰 <b>Yangi pul yechish so'rovi!</b>\n\n"
-                f"📋 So'rov: <b>#{withdrawal_id}</b>\n"
-                f"👤 Foydalanuvchi: {message.from_user.first_name} (<code>{user_id}</code>)\n"
-                f"💵 Summa: <b>{amount:,}</b> so'm\n"
-                f"💳 Karta: <code>{formatted_card}</code>\n\n"
-                f"Admin paneldan ko'ring: /withdrawals",
-                reply_markup=kb.process_withdrawal_keyboard(withdrawal_id)
-            )
-        except:
-            pass
 
 @router.callback_query(F.data == "my_ref_stats")
 async def my_ref_stats_callback(callback: CallbackQuery):
@@ -1753,7 +1870,7 @@ async def back_to_referral_callback(callback: CallbackQuery):
     user_id = callback.from_user.id
     ref_count = db.get_referral_count(user_id)
     balance_info = db.get_user_balance(user_id)
-    bot_info = await bot.get_me()
+    bot_info = await bot.me()
     ref_link = f"https://t.me/{bot_info.username}?start=ref_{user_id}"
     
     balance = balance_info['balance']
@@ -1781,23 +1898,183 @@ async def back_to_referral_callback(callback: CallbackQuery):
 
 # ============ Admin pul yechish boshqaruvi ============
 
+def format_withdrawals_page(withdrawals, filter_key):
+    """So'rovlar navbati sahifasini formatlash"""
+    counters = db.get_stats_counters()
+    text = (
+        f"💰 <b>Kutilayotgan so'rovlar:</b> {counters.get('withdrawals_pending', 0)} ta "
+        f"({counters.get('withdrawals_pending_amount', 0):,} so'm)\n"
+        f"🔎 Filtr: {kb.WITHDRAWAL_FILTER_LABELS.get(filter_key, filter_key)}\n\n"
+    )
+    if not withdrawals:
+        return text + "✅ Bu filtr bo'yicha so'rovlar yo'q."
+    
+    for w in withdrawals:
+        text += f"#{w['id']} - {w['first_name']} - {w['amount']:,} so'm - {w['created_at'][:16]}\n"
+    return text
+
+async def show_withdrawals_page(callback, filter_key, cursor_id=0, direction='next'):
+    """So'rovlar navbati sahifasini xabarda yangilash"""
+    withdrawals, has_prev, has_next = db.get_withdrawals_page(filter_key, cursor_id, direction)
+    await callback.message.edit_text(
+        format_withdrawals_page(withdrawals, filter_key),
+        reply_markup=kb.admin_withdrawals_keyboard(withdrawals, filter_key, has_prev, has_next)
+    )
+
+@router.message(Command("perf"))
+async def admin_perf(message: Message):
+    """Admin: unumdorlik metrikalari qisqacha"""
+    if not is_admin(message.from_user.id):
+        return
+    
+    await message.answer(metrics.perf_report())
+
+@router.message(Command("dbprofile"))
+async def admin_db_profile(message: Message):
+    """Admin: SQL profiler hisoboti (/dbprofile reset - tozalash)"""
+    if not is_admin(message.from_user.id):
+        return
+    
+    if not db_profiler.is_enabled():
+        await message.answer("ℹ️ SQL profiler o'chirilgan. Yoqish uchun: <code>DB_PROFILE=1</code>")
+        return
+    
+    if message.text.split()[-1] == "reset":
+        db_profiler.reset()
+        await message.answer("✅ SQL profiler statistikasi tozalandi.")
+        return
+    
+    report = await asyncio.to_thread(db_profiler.report)
+    await message.answer_document(
+        BufferedInputFile(report.encode('utf-8'), filename=f"db_profile_{datetime.now():%Y%m%d_%H%M%S}.txt"),
+        caption="🐢 SQL profiler: eng og'ir so'rovlar va EXPLAIN QUERY PLAN"
+    )
+
+@router.message(Command("stalls"))
+async def admin_stalls(message: Message):
+    """Admin: event loop bloklanishlari (/stalls stacks - to'liq stacklar fayli)"""
+    if not is_admin(message.from_user.id):
+        return
+    
+    if message.text.split()[-1] == "stacks" and loop_watchdog.stalls:
+        await message.answer_document(
+            BufferedInputFile(loop_watchdog.format_stacks().encode('utf-8'),
+                              filename=f"loop_stalls_{datetime.now():%Y%m%d_%H%M%S}.txt"),
+            caption="🧊 Event loop bloklanishlari: loop threadi stacklari"
+        )
+        return
+    
+    await message.answer(loop_watchdog.format_report())
+
+@router.message(Command("memory"))
+async def admin_memory(message: Message):
+    """Admin: xotira hisoboti (/memory start|snapshot|stop - tracemalloc)"""
+    if not is_admin(message.from_user.id):
+        return
+    
+    action = message.text.split()[-1]
+    if action == "start":
+        await asyncio.to_thread(memory_stats.start_tracing)
+        await message.answer("🔬 tracemalloc yoqildi, boshlang'ich snapshot olindi.\n"
+                             "Keyinroq: /memory snapshot")
+    elif action == "stop":
+        memory_stats.stop_tracing()
+        await message.answer("✅ tracemalloc o'chirildi.")
+    elif action == "snapshot":
+        if not memory_stats.tracemalloc.is_tracing():
+            await message.answer("ℹ️ tracemalloc o'chiq. Avval: /memory start")
+            return
+        report = await asyncio.to_thread(memory_stats.snapshot_report)
+        await message.answer_document(
+            BufferedInputFile(report.encode('utf-8'), filename=f"memory_{datetime.now():%Y%m%d_%H%M%S}.txt"),
+            caption="🧠 Eng ko'p xotira olgan joylar (oldingi snapshotga nisbatan o'sish)"
+        )
+    else:
+        await message.answer(memory_stats.format_report())
+
+@router.message(Command("retention"))
+async def admin_retention(message: Message):
+    """Admin: oxirgi tozalash hisoboti (/retention run - hozir ishga tushirish)"""
+    if not is_admin(message.from_user.id):
+        return
+    
+    if message.text.split()[-1] == "run":
+        progress = await message.answer("🧹 Tozalanmoqda...")
+        report = await asyncio.to_thread(retention.run_retention)
+        await progress.edit_text(retention.format_report(report))
+        return
+    
+    last_report = db.get_setting('last_retention_report')
+    if not last_report:
+        await message.answer("ℹ️ Tozalash hali ishlamagan. Hozir ishga tushirish: /retention run")
+        return
+    await message.answer(
+        retention.format_report(json.loads(last_report)) +
+        f"\n\n🕐 {db.get_setting('last_retention_at', '')[:16]}"
+    )
+
 @router.message(Command("withdrawals"))
 async def admin_withdrawals(message: Message):
-    """Admin: Pul yechish so'rovlarini ko'rish"""
+    """Admin: Pul yechish so'rovlari navbati"""
     if not is_admin(message.from_user.id):
         return
     
-    withdrawals = db.get_pending_withdrawals()
+    withdrawals, has_prev, has_next = db.get_withdrawals_page()
     
     if not withdrawals:
         await message.answer("✅ Kutilayotgan pul yechish so'rovlari yo'q.")
         return
     
-    text = f"💰 <b>Kutilayotgan so'rovlar:</b> {len(withdrawals)} ta\n\n"
-    for w in withdrawals:
-        text += f"#{w['id']} - {w['first_name']} - {w['amount']:,} so'm\n"
+    await message.answer(
+        format_withdrawals_page(withdrawals, 'all'),
+        reply_markup=kb.admin_withdrawals_keyboard(withdrawals, 'all', has_prev, has_next)
+    )
+
+@router.callback_query(F.data.startswith("wq|p|"))
+async def withdrawals_page_callback(callback: CallbackQuery):
+    """So'rovlar navbatida sahifalash va filtrlash"""
+    if not is_admin(callback.from_user.id):
+        return
+    
+    _, _, filter_key, direction, cursor_id = callback.data.split("|")
+    await show_withdrawals_page(callback, filter_key, int(cursor_id), direction)
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("wq|b|"))
+async def bulk_withdrawals_callback(callback: CallbackQuery):
+    """Sahifani ommaviy tasdiqlash/rad etishdan oldin so'rash"""
+    if not is_admin(callback.from_user.id):
+        return
+    
+    _, _, status, filter_key, first_id, last_id = callback.data.split("|")
+    first_id, last_id = int(first_id), int(last_id)
+    action = "tasdiqlansinmi" if status == "approved" else "rad etilsinmi"
+    
+    await callback.message.edit_text(
+        f"{callback.message.html_text}\n\n"
+        f"⚠️ <b>#{first_id} - #{last_id} oralig'idagi sahifa {action}?</b>",
+        reply_markup=kb.bulk_withdrawals_confirm_keyboard(status, filter_key, first_id, last_id)
+    )
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("wq|c|"))
+async def bulk_withdrawals_confirm_callback(callback: CallbackQuery):
+    """Sahifadagi so'rovlarni bitta tranzaksiyada tasdiqlash/rad etish"""
+    if not is_admin(callback.from_user.id):
+        return
     
-    await message.answer(text, reply_markup=kb.admin_withdrawals_keyboard(withdrawals))
+    _, _, status, filter_key, first_id, last_id = callback.data.split("|")
+    if status not in ("approved", "rejected"):
+        return
+    
+    # Statuslar, pul qaytarish va barcha xabarlar bitta tranzaksiyada
+    count, total = db.bulk_finish_withdrawals(filter_key, int(first_id), int(last_id), status)
+    if count:
+        outbox.wakeup()
+    
+    action = "tasdiqlandi" if status == "approved" else "rad etildi"
+    await callback.answer(f"{count} ta so'rov {action} ({total:,} so'm)", show_alert=True)
+    await show_withdrawals_page(callback, filter_key)
 
 @router.callback_query(F.data.startswith("view_withdrawal_"))
 async def view_withdrawal_callback(callback: CallbackQuery):
@@ -1829,31 +2106,19 @@ async def approve_withdrawal_callback(callback: CallbackQuery):
         return
     
     withdrawal_id = int(callback.data.replace("approve_withdrawal_", ""))
-    w = db.get_withdrawal_by_id(withdrawal_id)
     
+    # Status + foydalanuvchiga xabar bitta tranzaksiyada
+    w = db.finish_withdrawal(withdrawal_id, "approved")
     if not w:
-        await callback.answer("So'rov topilmadi!", show_alert=True)
+        await callback.answer("So'rov topilmadi yoki allaqachon ko'rib chiqilgan!", show_alert=True)
         return
-    
-    db.process_withdrawal(withdrawal_id, "approved")
+    outbox.wakeup()
     
     await callback.message.edit_text(
         f"✅ <b>So'rov #{withdrawal_id} tasdiqlandi!</b>\n\n"
         f"💵 {w['amount']:,} so'm\n"
         f"💳 {w['card_number']}"
     )
-    
-    # Foydalanuvchiga xabar
-    try:
-        await bot.send_message(
-            w['user_id'],
-            f"✅ <b>Pul yechish so'rovingiz tasdiqlandi!</b>\n\n"
-            f"💵 Summa: <b>{w['amount']:,}</b> so'm\n"
-            f"💳 Karta: <code>{w['card_number']}</code>\n\n"
-            f"Pul tez orada kartangizga o'tkaziladi!"
-        )
-    except:
-        pass
 
 @router.callback_query(F.data.startswith("reject_withdrawal_"))
 async def reject_withdrawal_callback(callback: CallbackQuery):
@@ -1862,31 +2127,18 @@ async def reject_withdrawal_callback(callback: CallbackQuery):
         return
     
     withdrawal_id = int(callback.data.replace("reject_withdrawal_", ""))
-    w = db.get_withdrawal_by_id(withdrawal_id)
     
+    # Status + pulni qaytarish + foydalanuvchiga xabar bitta tranzaksiyada
+    w = db.finish_withdrawal(withdrawal_id, "rejected")
     if not w:
-        await callback.answer("So'rov topilmadi!", show_alert=True)
+        await callback.answer("So'rov topilmadi yoki allaqachon ko'rib chiqilgan!", show_alert=True)
         return
-    
-    # Pulni qaytarish
-    db.add_balance(w['user_id'], w['amount'])
-    db.process_withdrawal(withdrawal_id, "rejected")
+    outbox.wakeup()
     
     await callback.message.edit_text(
         f"❌ <b>So'rov #{withdrawal_id} rad etildi!</b>\n\n"
         f"💵 {w['amount']:,} so'm foydalanuvchiga qaytarildi."
     )
-    
-    # Foydalanuvchiga xabar
-    try:
-        await bot.send_message(
-            w['user_id'],
-            f"❌ <b>Pul yechish so'rovingiz rad etildi!</b>\n\n"
-            f"💵 Summa: <b>{w['amount']:,}</b> so'm balansingizga qaytarildi.\n\n"
-            f"Sabab: Admin tomonidan rad etildi."
-        )
-    except:
-        pass
 
 @router.callback_query(F.data.startswith("history_"))
 async def show_history(callback: CallbackQuery):
@@ -1998,47 +2250,94 @@ async def contact_handler(message: Message):
 
 # ============ Background Tasks ============
 
+CLOCK_EMOJIS = ["🕛", "🕐", "🕑", "🕒", "🕓", "🕔", "🕕", "🕖", "🕗", "🕘", "🕙", "🕚"]
+
+def session_client(session, prefix):
+    """Saqlangan sessiyadan MTProto klienti; API ma'lumotlari bo'lmasa None"""
+    # Foydalanuvchining API ma'lumotlarini ishlatish
+    user_api_id = int(session.api_id or 0)
+    user_api_hash = session.api_hash or ''
+    
+    if not user_api_id or not user_api_hash:
+        logger.debug(f"No API credentials for user {session.user_id}")
+        return None
+    
+    return mtproto.create_client(
+        name=f"{prefix}_{session.user_id}",
+        api_id=user_api_id,
+        api_hash=user_api_hash,
+        session_string=session.session_string
+    )
+
+async def clock_pass():
+    """Barcha soat yoqilgan profillarni bir marta yangilash; sessiyalar sonini qaytaradi"""
+    sessions = db.get_active_clock_sessions()
+    if sessions and not mtproto.is_loaded():
+        # Birinchi faol sessiyada pyrogram ni event loop ni to'xtatmasdan yuklash
+        await asyncio.to_thread(mtproto.load)
+    
+    with log_pipeline.Tally(logger, "Clock pass") as tally:
+        for session in sessions:
+            try:
+                client = session_client(session, 'clock')
+                if client is None:
+                    tally.skip()
+                    continue
+                
+                async with client:
+                    # Hozirgi vaqtni olish
+                    now = datetime.now()
+                    current_clock = CLOCK_EMOJIS[now.hour % 12]
+                    time_str = now.strftime("%H:%M")
+                    
+                    # Foydalanuvchi ma'lumotlarini olish
+                    me = await client.get_me()
+                    new_last_name = f"{current_clock} {time_str}"
+                    
+                    # Profilni yangilash
+                    await client.update_profile(last_name=new_last_name)
+                    logger.debug(f"Clock updated for user {session.user_id}: {new_last_name}")
+                    tally.ok()
+                    
+            except Exception as e:
+                tally.fail(session.user_id, e)
+    
+    return len(sessions)
+
+async def online_pass():
+    """Barcha online yoqilgan akkauntlarni bir marta online qilish; sessiyalar sonini qaytaradi"""
+    sessions = db.get_active_online_sessions()
+    if sessions and not mtproto.is_loaded():
+        # Birinchi faol sessiyada pyrogram ni event loop ni to'xtatmasdan yuklash
+        await asyncio.to_thread(mtproto.load)
+    
+    with log_pipeline.Tally(logger, "Online pass") as tally:
+        for session in sessions:
+            try:
+                client = session_client(session, 'online')
+                if client is None:
+                    tally.skip()
+                    continue
+                
+                async with client:
+                    # Online statusni yangilash
+                    await mtproto.set_online(client)
+                    logger.debug(f"Online status updated for user {session.user_id}")
+                    tally.ok()
+                    
+            except Exception as e:
+                tally.fail(session.user_id, e)
+    
+    return len(sessions)
+
 async def update_user_clocks():
     """Foydalanuvchi profillariga soat qo'yish"""
     while True:
         try:
-            sessions = db.get_active_clock_sessions()
-            
-            for session in sessions:
-                try:
-                    # Foydalanuvchining API ma'lumotlarini ishlatish
-                    user_api_id = int(session.get('api_id', 0))
-                    user_api_hash = session.get('api_hash', '')
-                    
-                    if not user_api_id or not user_api_hash:
-                        logger.warning(f"No API credentials for user {session['user_id']}")
-                        continue
-                    
-                    client = Client(
-                        name=f"clock_{session['user_id']}",
-                        api_id=user_api_id,
-                        api_hash=user_api_hash,
-                        session_string=session['session_string']
-                    )
-                    
-                    async with client:
-                        # Hozirgi vaqtni olish
-                        now = datetime.now()
-                        clock_emojis = ["🕛", "🕐", "🕑", "🕒", "🕓", "🕔", "🕕", "🕖", "🕗", "🕘", "🕙", "🕚"]
-                        hour = now.hour % 12
-                        current_clock = clock_emojis[hour]
-                        time_str = now.strftime("%H:%M")
-                        
-                        # Foydalanuvchi ma'lumotlarini olish
-                        me = await client.get_me()
-                        new_last_name = f"{current_clock} {time_str}"
-                        
-                        # Profilni yangilash
-                        await client.update_profile(last_name=new_last_name)
-                        logger.info(f"Clock updated for user {session['user_id']}: {new_last_name}")
-                        
-                except Exception as e:
-                    logger.error(f"Clock update error for {session['user_id']}: {e}")
+            pass_started = time.perf_counter()
+            count = await clock_pass()
+            metrics.loop_pass_seconds.observe(time.perf_counter() - pass_started, loop='clock')
+            metrics.queue_depth.set(count, queue='clock_sessions')
                     
             # Har daqiqada yangilash
             await asyncio.sleep(60)
@@ -2051,36 +2350,10 @@ async def keep_users_online():
     """Foydalanuvchilarni online saqlash"""
     while True:
         try:
-            sessions = db.get_active_online_sessions()
-            
-            for session in sessions:
-                try:
-                    # Foydalanuvchining API ma'lumotlarini ishlatish
-                    user_api_id = int(session.get('api_id', 0))
-                    user_api_hash = session.get('api_hash', '')
-                    
-                    if not user_api_id or not user_api_hash:
-                        logger.warning(f"No API credentials for user {session['user_id']}")
-                        continue
-                    
-                    client = Client(
-                        name=f"online_{session['user_id']}",
-                        api_id=user_api_id,
-                        api_hash=user_api_hash,
-                        session_string=session['session_string']
-                    )
-                    
-                    async with client:
-                        # Online statusni yangilash
-                        await client.invoke(
-                            __import__('pyrogram.raw.functions', fromlist=['account']).account.UpdateStatus(
-                                offline=False
-                            )
-                        )
-                        logger.info(f"Online status updated for user {session['user_id']}")
-                        
-                except Exception as e:
-                    logger.error(f"Online update error for {session['user_id']}: {e}")
+            pass_started = time.perf_counter()
+            count = await online_pass()
+            metrics.loop_pass_seconds.observe(time.perf_counter() - pass_started, loop='online')
+            metrics.queue_depth.set(count, queue='online_sessions')
                     
             # Har 5 daqiqada yangilash
             await asyncio.sleep(300)
@@ -2089,17 +2362,146 @@ async def keep_users_online():
             logger.error(f"Online task error: {e}")
             await asyncio.sleep(300)
 
+async def run_auto_backup():
+    """Avtomatik zaxira olib adminlarga yuborish"""
+    try:
+        with metrics.loop_pass_seconds.time(loop='backup'):
+            files = await asyncio.to_thread(backup.create_scheduled_backup)
+    except Exception as e:
+        logger.error(f"Avto-zaxira xatosi: {e}")
+        return
+    
+    for admin_id in ADMINS:
+        try:
+            await send_backup_files(admin_id, files)
+        except Exception as e:
+            logger.error(f"Avto-zaxirani yuborishda xato ({admin_id}): {e}")
+    
+    logger.info(f"Avto-zaxira olindi: {', '.join(files)}")
+
+async def auto_backup_scheduler():
+    """Har kuni soat BACKUP_HOUR:00 da avtomatik zaxira"""
+    # Qayta ishga tushish tufayli o'tkazib yuborilgan zaxirani olish
+    if db.is_auto_backup_enabled() and backup.is_backup_due(max_age_hours=25):
+        await run_auto_backup()
+    
+    while True:
+        await asyncio.sleep(backup.seconds_until(BACKUP_HOUR))
+        if db.is_auto_backup_enabled():
+            await run_auto_backup()
+
+# ============ Xabarlar navbati (outbox) ============
+
+def render_notification(kind, payload):
+    """Outbox yozuvidan xabar matni va tugmalarini tayyorlash"""
+    if kind == 'referral_reward':
+        return (
+            f"🎉 <b>Yangi referal!</b>\n\n"
+            f"👤 <b>{payload['first_name']}</b> sizning havolangiz orqali qo'shildi.\n\n"
+            f"💰 <b>+{payload['reward']:,} so'm</b> balansingizga qo'shildi!\n"
+            f"💵 Joriy balans: <b>{payload['balance']:,}</b> so'm\n"
+            f"👥 Jami referallar: <b>{payload['ref_count']}</b> ta"
+        ), None
+    if kind == 'withdrawal_new':
+        return (
+            f"💰 <b>Yangi pul yechish so'rovi!</b>\n\n"
+            f"📋 So'rov: <b>#{payload['withdrawal_id']}</b>\n"
+            f"👤 Foydalanuvchi: {payload['first_name']} (<code>{payload['user_id']}</code>)\n"
+            f"💵 Summa: <b>{payload['amount']:,}</b> so'm\n"
+            f"💳 Karta: <code>{payload['card_number']}</code>\n\n"
+            f"Admin paneldan ko'ring: /withdrawals"
+        ), kb.process_withdrawal_keyboard(payload['withdrawal_id'])
+    if kind == 'withdrawal_approved':
+        return (
+            f"✅ <b>Pul yechish so'rovingiz tasdiqlandi!</b>\n\n"
+            f"💵 Summa: <b>{payload['amount']:,}</b> so'm\n"
+            f"💳 Karta: <code>{payload['card_number']}</code>\n\n"
+            f"Pul tez orada kartangizga o'tkaziladi!"
+        ), None
+    if kind == 'withdrawal_rejected':
+        return (
+            f"❌ <b>Pul yechish so'rovingiz rad etildi!</b>\n\n"
+            f"💵 Summa: <b>{payload['amount']:,}</b> so'm balansingizga qaytarildi.\n\n"
+            f"Sabab: Admin tomonidan rad etildi."
+        ), None
+    raise ValueError(f"Noma'lum xabar turi: {kind}")
+
+def prune_fsm_storage():
+    """FSM storage dan bo'sh yozuvlarni o'chirish
+
+    MemoryStorage har bir get_state() da yozuv yaratadi, shuning uchun botga
+    yozgan har bir foydalanuvchi xotirada qoladi. Holati ham, ma'lumoti ham
+    bo'lmagan yozuv standart qiymatdan farq qilmaydi - o'chirish xavfsiz.
+    """
+    empty = [key for key, record in storage.storage.items() if record.state is None and not record.data]
+    for key in empty:
+        del storage.storage[key]
+    return len(empty)
+
+def register_memory_caches():
+    """Xotira hisobiga keshlarni qo'shish (login klientlari tozalanmaydi - faqat o'lchanadi)"""
+    for name, (get, evict) in db.memory_caches().items():
+        memory_stats.register_cache(name, get, evict)
+    memory_stats.register_cache('fsm_storage', lambda: storage.storage, prune_fsm_storage)
+    memory_stats.register_cache('login_clients', lambda: active_clients)
+    memory_stats.register_cache('loop_stalls', lambda: loop_watchdog.stalls)
+    if throttler is not None:
+        memory_stats.register_cache('throttle_buckets', lambda: throttler.buckets, throttler.prune)
+
+register_memory_caches()
+
+@metrics.register_collector
+def collect_log_pipeline():
+    """/metrics uchun log navbati (yozilmagan yozuvlar log_pipeline da sanaladi)"""
+    metrics.queue_depth.set(log_pipeline.queue_depth(), queue='log')
+
+@metrics.register_collector
+def collect_write_buffers():
+    """/metrics uchun write-behind buferlardagi yozilmagan qatorlar"""
+    for name, (pending, _, _) in write_buffer.stats().items():
+        metrics.queue_depth.set(pending, queue=f"write_buffer_{name}")
+
 # ============ Ishga tushirish ============
 
+async def close_login_clients():
+    """Yakunlanmagan login jarayonlaridagi MTProto klientlarini uzish"""
+    for user_id, client in list(active_clients.items()):
+        try:
+            await client.disconnect()
+        except Exception as e:
+            logger.error(f"Login client ({user_id}) yopilmadi: {e}")
+    active_clients.clear()
+
 async def main():
     db.init_database()
     logger.info("Bot ishga tushirildi!")
     
-    # Background tasklarni ishga tushirish
-    asyncio.create_task(update_user_clocks())
-    asyncio.create_task(keep_users_online())
-    
-    await dp.start_polling(bot, skip_updates=True)
+    app = lifecycle.Lifecycle(bot, dp)
+    
+    # Background xizmatlar (yiqilsa qayta ishga tushiriladi)
+    app.add_service('clock', update_user_clocks)
+    app.add_service('online', keep_users_online)
+    app.add_service('auto_backup', auto_backup_scheduler)
+    app.add_service('outbox', lambda: outbox.run_dispatcher(bot, render_notification))
+    app.add_service('write_buffer', write_buffer.run_flusher)
+    app.add_service('retention', retention.run_scheduler)
+    app.add_service('loop_watchdog', loop_watchdog.run)
+    app.add_service('memory_budget', memory_stats.run_budget)
+    app.add_service('log_reporter', log_pipeline.run_reporter)
+    
+    app.on_shutdown(close_login_clients)
+    app.on_shutdown(write_buffer.flush_all)
+    app.on_shutdown(db.checkpoint)
+    
+    if TRACING:
+        tracing.start_exporter()
+        app.on_shutdown(tracing.stop_exporter)
+    if METRICS_PORT:
+        await metrics.start_server(METRICS_PORT)
+    # Oxirgi: boshqa hooklarning loglari ham yozib bo'linadi
+    app.on_shutdown(log_pipeline.stop)
+    
+    await app.run(skip_updates=True)
 
 if __name__ == "__main__":
     asyncio.run(main())
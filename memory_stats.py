@@ -0,0 +1,251 @@
+"""Xotira hisobi: keshlar hajmi, umumiy byudjet va tracemalloc snapshotlari
+
+Xotirada yashaydigan har bir kesh (DB keshlari, FSM storage, login
+klientlari va h.k.) register_cache() bilan ro'yxatga olinadi. Hajm
+taxminiy o'lchanadi: katta konteynerlarda birinchi DEEP_SIZE_SAMPLE ta
+element to'liq o'lchanib, o'rtachasi elementlar soniga ko'paytiriladi.
+Natijalar bot_cache_items/bot_cache_bytes gauge lariga yoziladi.
+
+Keshlar yig'indisi CACHE_MEMORY_BUDGET_MB dan oshsa run_budget() eng katta
+tozalanadigan keshlardan boshlab evict() chaqiradi (ma'lumot keyin bazadan
+qayta yuklanadi). Tozalab bo'lmaydigan keshlar faqat hisobotda ko'rinadi.
+
+tracemalloc odatda o'chiq (sekinlashtiradi): admin /memory start bilan
+yoqiladi, /memory snapshot oldingi snapshotga nisbatan eng ko'p xotira
+olgan qatorlarni fayl sifatida beradi.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import sys
+import tracemalloc
+import types
+from collections import deque
+from datetime import datetime
+
+import metrics
+from config import CACHE_MEMORY_BUDGET_MB, MEMORY_CHECK_INTERVAL, TRACEMALLOC_FRAMES
+
+logger = logging.getLogger(__name__)
+
+DEEP_SIZE_SAMPLE = 100
+DEEP_SIZE_DEPTH = 4
+DEEP_SIZE_MAX_OBJECTS = 20000  # Bitta kesh uchun ko'rib chiqiladigan obyektlar chegarasi
+
+_ATOMIC = (int, float, complex, bool, str, bytes, type(None))
+# Ichiga kirilmaydigan umumiy obyektlar (modullar, klasslar, funksiyalar, event loop)
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+           asyncio.AbstractEventLoop)
+_SEQUENCES = (list, tuple, set, frozenset, deque)
+
+# nom -> (get, evict); get() - kesh obyekti (yoki None), evict() - tozalangan elementlar soni
+_caches = {}
+_baseline = {'snapshot': None, 'at': None}
+
+# Snapshotlarda tracemalloc va importlib ning o'zi ko'rsatilmaydi
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def register_cache(name, get, evict=None):
+    """Keshni hisobga qo'shish; evict bo'lmasa kesh faqat o'lchanadi"""
+    _caches[name] = (get, evict)
+
+
+def _children(obj):
+    if isinstance(obj, dict):
+        return obj.items()
+    if isinstance(obj, _SEQUENCES):
+        return obj
+    if hasattr(obj, '__dict__'):
+        return vars(obj).values()
+    if hasattr(obj, '__slots__'):
+        return [getattr(obj, name, None) for name in obj.__slots__]
+    return None
+
+
+def deep_size(obj, depth=DEEP_SIZE_DEPTH, sample=DEEP_SIZE_SAMPLE, _seen=None):
+    """Obyekt va unga tegishli obyektlarning taxminiy hajmi, bayt"""
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if depth <= 0 or isinstance(obj, _ATOMIC) or len(seen) > DEEP_SIZE_MAX_OBJECTS:
+        return size
+    if isinstance(obj, _OPAQUE):
+        return 0
+
+    children = _children(obj)
+    if children is None:
+        return size
+    try:
+        total = len(children)
+        sampled = list(itertools.islice(children, sample))
+    except RuntimeError:
+        # Konteyner boshqa threadda o'zgardi - faqat o'zining hajmi
+        return size
+    if not sampled:
+        return size
+    child_size = 0
+    for child in sampled:
+        if isinstance(child, tuple) and isinstance(obj, dict):
+            child_size += sum(deep_size(part, depth - 1, sample, seen) for part in child)
+        else:
+            child_size += deep_size(child, depth - 1, sample, seen)
+    return size + child_size * total // len(sampled)
+
+
+def _items(obj):
+    try:
+        return len(obj)
+    except TypeError:
+        return 1
+
+
+def _measure(name):
+    """Bitta keshning (elementlar, bayt) qiymati; o'lchab bo'lmasa None"""
+    try:
+        obj = _caches[name][0]()
+    except Exception as e:
+        logger.error(f"Kesh '{name}' o'lchanmadi: {e}")
+        return None
+    return (0, 0) if obj is None else (_items(obj), deep_size(obj))
+
+
+def cache_sizes():
+    """{nom: (elementlar, bayt)}"""
+    sizes = {}
+    for name in _caches:
+        measured = _measure(name)
+        if measured is not None:
+            sizes[name] = measured
+    return sizes
+
+
+def rss_bytes():
+    """Jarayonning joriy RSS xotirasi (Linux); boshqa tizimlarda eng yuqori qiymat"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@metrics.register_collector
+def collect_memory():
+    """/metrics uchun keshlar hajmi va RSS"""
+    for name, (items, size) in cache_sizes().items():
+        metrics.cache_items.set(items, cache=name)
+        metrics.cache_bytes.set(size, cache=name)
+    metrics.process_memory_bytes.set(rss_bytes())
+
+
+def enforce_budget(budget=CACHE_MEMORY_BUDGET_MB * 1024 * 1024, sizes=None):
+    """Keshlar byudjetdan oshsa eng kattasidan boshlab tozalash; {nom: tozalangan elementlar}"""
+    sizes = sizes or cache_sizes()
+    total = sum(size for _, size in sizes.values())
+    evicted = {}
+    for name, (items, size) in sorted(sizes.items(), key=lambda item: -item[1][1]):
+        if total <= budget:
+            break
+        evict = _caches[name][1]
+        if evict is None or not items:
+            continue
+        freed = evict()
+        # Evictorlar keshni qisman tozalaydi - bo'shagan hajm qayta o'lchanadi
+        after_items, after_size = _measure(name) or (items, size)
+        if freed is None:
+            freed = max(items - after_items, 0)
+        evicted[name] = freed
+        metrics.cache_evictions_total.inc(freed, cache=name)
+        total -= max(size - after_size, 0)
+    if evicted:
+        logger.warning(f"Kesh byudjeti ({budget // 1024 // 1024} MB) oshdi, tozalandi: {evicted}")
+    return evicted
+
+
+async def run_budget(interval=MEMORY_CHECK_INTERVAL):
+    """Har interval soniyada keshlarni o'lchash va byudjetni ta'minlash (lifecycle xizmati)"""
+    while True:
+        await asyncio.sleep(interval)
+        sizes = cache_sizes()
+        for name, (items, size) in sizes.items():
+            metrics.cache_items.set(items, cache=name)
+            metrics.cache_bytes.set(size, cache=name)
+        enforce_budget(sizes=sizes)
+
+
+# ============ tracemalloc ============
+
+def start_tracing(frames=TRACEMALLOC_FRAMES):
+    """tracemalloc ni yoqish va boshlang'ich snapshot olish"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _baseline.update(snapshot=_take_snapshot(), at=datetime.now())
+
+
+def stop_tracing():
+    tracemalloc.stop()
+    _baseline.update(snapshot=None, at=None)
+
+
+def _take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+
+def snapshot_report(limit=30):
+    """Oldingi snapshotga nisbatan o'sish va eng katta allocatorlar (matn); yangi snapshot bazaga aylanadi"""
+    snapshot = _take_snapshot()
+    previous, previous_at = _baseline['snapshot'], _baseline['at']
+    current, peak = tracemalloc.get_traced_memory()
+    mb = 1024 * 1024
+    lines = [
+        f"tracemalloc: {current / mb:.1f} MB (eng yuqori {peak / mb:.1f} MB), "
+        f"RSS {rss_bytes() / mb:.1f} MB, {datetime.now():%Y-%m-%d %H:%M:%S}",
+    ]
+
+    if previous is not None:
+        lines.append(f"\n=== O'sish: {previous_at:%H:%M:%S} dan beri, qatorlar bo'yicha ===")
+        lines.extend(str(stat) for stat in snapshot.compare_to(previous, 'lineno')[:limit])
+        lines.append("\n=== O'sish: eng katta 5 ta stack ===")
+        for stat in snapshot.compare_to(previous, 'traceback')[:5]:
+            lines.append(f"\n{stat.size_diff / 1024:+.1f} KiB, {stat.count_diff:+d} blok")
+            lines.extend(stat.traceback.format())
+
+    lines.append("\n=== Jami: qatorlar bo'yicha ===")
+    lines.extend(str(stat) for stat in snapshot.statistics('lineno')[:limit])
+    lines.append("\n=== Jami: fayllar bo'yicha ===")
+    lines.extend(str(stat) for stat in snapshot.statistics('filename')[:15])
+
+    _baseline.update(snapshot=snapshot, at=datetime.now())
+    return '\n'.join(lines) + '\n'
+
+
+def format_report():
+    """Admin /memory uchun HTML hisobot"""
+    mb = 1024 * 1024
+    sizes = cache_sizes()
+    total = sum(size for _, size in sizes.values())
+    text = (
+        f"🧠 <b>Xotira</b>\n\n"
+        f"RSS: <b>{rss_bytes() / mb:.1f} MB</b>\n"
+        f"Keshlar: <b>{total / mb:.2f} MB</b> / byudjet {CACHE_MEMORY_BUDGET_MB} MB\n\n"
+    )
+    for name, (items, size) in sorted(sizes.items(), key=lambda item: -item[1][1]):
+        evictable = '' if _caches[name][1] else ' 🔒'
+        text += f"• <code>{name}</code>: {items:,} ta, {size / 1024:,.0f} KB{evictable}\n"
+
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        text += (f"\n🔬 tracemalloc yoqilgan: {current / mb:.1f} MB (eng yuqori {peak / mb:.1f} MB)\n"
+                 f"/memory snapshot - o'sish hisoboti, /memory stop - o'chirish")
+    else:
+        text += "\n🔬 tracemalloc o'chiq. Yoqish: /memory start"
+    return text
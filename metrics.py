@@ -0,0 +1,401 @@
+"""Ichki metrikalar va Prometheus /metrics endpointi
+
+Counter, Gauge va Histogram xotirada saqlanadi va Prometheus text formatida
+chiqariladi. Handlerlar, DB funksiyalari, Bot API so'rovlari va fon
+tsikllari shu yerda o'lchanadi. Qiymatlar threadlardan ham (asyncio.to_thread
+dagi DB chaqiruvlari) yangilanadi - har bir metrika o'z qulfi ostida o'zgaradi.
+"""
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import (
+    TelegramRetryAfter, TelegramBadRequest, TelegramForbiddenError, TelegramNotFound,
+    TelegramConflictError, TelegramUnauthorizedError, TelegramServerError, TelegramNetworkError
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REGISTRY = []
+_collectors = []
+_endpoints = {}
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (f'{name}="{_escape(value)}"' for name, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    """Faqat o'sadigan hisoblagich"""
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self):
+        """Qiymatlar nusxasi {labellar: qiymat} (boshqa threadlar yozayotganda ham xavfsiz)"""
+        with self._lock:
+            return dict(self.values)
+
+    def samples(self):
+        for key, value in self.snapshot().items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge(Counter):
+    """Joriy qiymat (navbat uzunligi, aktiv clientlar)"""
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self.values[key] = value
+
+
+class Histogram:
+    """Davomiylik taqsimoti (bucket, sum, count)"""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # key -> [bucket_counts, sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        """Qiymatlar nusxasi {labellar: (bucketlar, yig'indi, soni)}"""
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self.values.items()}
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def quantile(self, key, q, entry=None):
+        """Bucketlar bo'yicha taxminiy kvantil (bucket yuqori chegarasi)"""
+        counts, _, count = entry or self.snapshot()[key]
+        target = q * count
+        seen = 0
+        for bound, n in zip(self.buckets, counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def summary(self):
+        """[(labels, count, sum, avg, p95)] - jami vaqt bo'yicha kamayish tartibida"""
+        rows = []
+        for key, entry in self.snapshot().items():
+            _, total, count = entry
+            rows.append((dict(zip(self.labelnames, key)), count, total, total / count, self.quantile(key, 0.95, entry)))
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows
+
+    def samples(self):
+        for key, (counts, total, count) in self.snapshot().items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield f'{self.name}_bucket', _format_labels(self.labelnames, key, ('le', bound)), cumulative
+            yield f'{self.name}_bucket', _format_labels(self.labelnames, key, ('le', '+Inf')), count
+            yield f'{self.name}_sum', _format_labels(self.labelnames, key), total
+            yield f'{self.name}_count', _format_labels(self.labelnames, key), count
+
+
+# ============ Metrikalar ============
+
+updates_total = Counter('bot_updates_total', "Qayta ishlangan updatelar", ('event', 'status'))
+update_seconds = Histogram('bot_update_seconds', "Update ni to'liq qayta ishlash vaqti", ('event',))
+handler_seconds = Histogram('bot_handler_seconds', "Handler bajarilish vaqti", ('handler',))
+function_seconds = Histogram('bot_function_seconds', "Tanlangan funksiyalar bajarilish vaqti", ('function',))
+db_call_seconds = Histogram('bot_db_call_seconds', "database.py funksiyalari bajarilish vaqti", ('function',))
+db_statements_total = Counter('bot_db_statements_total', "Bajarilgan SQL statementlar", ('verb',))
+api_requests_total = Counter('bot_api_requests_total', "Bot API so'rovlari", ('method', 'status'))
+api_request_seconds = Histogram('bot_api_request_seconds', "Bot API so'rovlari vaqti", ('method',))
+loop_pass_seconds = Histogram('bot_loop_pass_seconds', "Fon tsikli bir aylanishi vaqti", ('loop',),
+                              buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+queue_depth = Gauge('bot_queue_depth', "Navbatlardagi elementlar soni", ('queue',))
+service_restarts_total = Counter('bot_service_restarts_total', "Qayta ishga tushirilgan fon xizmatlari", ('service',))
+loop_lag_seconds = Histogram('bot_loop_lag_seconds', "Event loop kechikishi (heartbeat bo'yicha)",
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+loop_stalls_total = Counter('bot_loop_stalls_total', "Event loop bloklanishlari", ('handler', 'db_function'))
+throttled_updates_total = Counter('bot_throttled_updates_total', "Cheklov tufayli tashlangan updatelar",
+                                  ('throttle_class', 'reason'))
+cache_items = Gauge('bot_cache_items', "Xotira keshlaridagi elementlar", ('cache',))
+cache_bytes = Gauge('bot_cache_bytes', "Xotira keshlarining taxminiy hajmi", ('cache',))
+cache_evictions_total = Counter('bot_cache_evictions_total', "Xotira byudjeti tufayli tozalangan elementlar", ('cache',))
+log_records_suppressed_total = Counter('bot_log_records_suppressed_total',
+                                      "Yozilmagan log yozuvlari: cheklov yoki to'la navbat", ('reason',))
+process_memory_bytes = Gauge('bot_process_memory_bytes', "Jarayon xotirasi (RSS)")
+
+
+def register_collector(func):
+    """/metrics so'ralganda chaqiriladigan funksiya (gauge larni yangilash uchun)"""
+    _collectors.append(func)
+    return func
+
+
+def register_endpoint(path):
+    """Metrics serverida qo'shimcha JSON endpoint: func() -> JSON ga aylanadigan qiymat"""
+    def decorator(func):
+        _endpoints[path] = func
+        return func
+    return decorator
+
+
+def collect():
+    """Barcha collectorlarni ishga tushirish"""
+    for func in _collectors:
+        try:
+            func()
+        except Exception as e:
+            logger.error(f"Metrika collector xatosi ({func.__name__}): {e}")
+
+
+def render():
+    """Prometheus text formatidagi barcha metrikalar"""
+    collect()
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type_name}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{labels} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def timed(name):
+    """Funksiya (sync yoki async) vaqtini function_seconds ga yozish"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with function_seconds.time(function=name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with function_seconds.time(function=name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ============ Aiogram middleware lar ============
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer middleware: har bir update soni va to'liq vaqti"""
+
+    async def __call__(self, handler, event, data):
+        event_type = event.event_type
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            update_seconds.observe(time.perf_counter() - start, event=event_type)
+            updates_total.inc(event=event_type, status=status)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware: aniq handler nomi bo'yicha vaqt"""
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        with handler_seconds.time(handler=name):
+            return await handler(event, data)
+
+
+API_ERROR_STATUSES = (
+    (TelegramRetryAfter, '429'),
+    (TelegramBadRequest, '400'),
+    (TelegramUnauthorizedError, '401'),
+    (TelegramForbiddenError, '403'),
+    (TelegramNotFound, '404'),
+    (TelegramConflictError, '409'),
+    (TelegramServerError, '5xx'),
+    (TelegramNetworkError, 'network'),
+)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Bot sessiyasi middleware: chiqayotgan so'rovlar metodi va natijasi bo'yicha"""
+
+    async def __call__(self, make_request, bot, method):
+        api_method = getattr(method, '__api_method__', type(method).__name__)
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            status = next((code for cls, code in API_ERROR_STATUSES if isinstance(e, cls)), 'error')
+            raise
+        finally:
+            api_request_seconds.observe(time.perf_counter() - start, method=api_method)
+            api_requests_total.inc(method=api_method, status=status)
+
+
+def setup_bot(dp, router, bot):
+    """Middleware larni dispatcher, router va bot sessiyasiga ulash"""
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    router.message.middleware(HandlerMetricsMiddleware())
+    router.callback_query.middleware(HandlerMetricsMiddleware())
+    router.chat_join_request.middleware(HandlerMetricsMiddleware())
+    bot.session.middleware(ApiMetricsMiddleware())
+
+
+# ============ Database ============
+
+DB_UNTIMED = {
+    'get_connection', 'write_lock', 'add_statement_listener', 'register_cache_invalidator',
+    'set_connection_factory', 'memory_caches',
+}
+
+
+def _count_statement(statement):
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'EMPTY'
+    db_statements_total.inc(verb=verb)
+
+
+def setup_database(db):
+    """database modulidagi ochiq funksiyalarni vaqt o'lchovchi wrapper bilan almashtirish
+
+    Modul ichidagi chaqiruvlar ham global nom orqali o'tgani uchun ular ham o'lchanadi.
+    """
+    db.add_statement_listener(_count_statement)
+    for name, func in list(vars(db).items()):
+        if (name.startswith('_') or name in DB_UNTIMED or not inspect.isfunction(func)
+                or func.__module__ != db.__name__ or inspect.isgeneratorfunction(func)):
+            continue
+        setattr(db, name, _timed_db_call(name, func))
+
+
+def _timed_db_call(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with db_call_seconds.time(function=name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+# ============ HTTP server ============
+
+async def start_server(port, host='0.0.0.0'):
+    """aiohttp serverda /metrics endpointini ishga tushirish"""
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(text=render(), content_type='text/plain', charset='utf-8')
+
+    def json_handler(func):
+        async def handle(request):
+            return web.json_response(func(), dumps=lambda value: json.dumps(value, ensure_ascii=False, default=str))
+        return handle
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    for path, func in _endpoints.items():
+        app.router.add_get(path, json_handler(func))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics server: http://{host}:{port}/metrics")
+    return runner
+
+
+# ============ Chat uchun qisqa hisobot ============
+
+def _format_histogram(title, histogram, label, limit):
+    rows = histogram.summary()[:limit]
+    if not rows:
+        return ''
+    text = f"<b>{title}</b>\n"
+    for labels, count, total, avg, p95 in rows:
+        text += f"• <code>{labels[label]}</code>: {count} ta, o'rt. {avg * 1000:.1f} ms, p95 ≤{p95 * 1000:.0f} ms\n"
+    return text + "\n"
+
+
+def perf_report(limit=8):
+    """Admin /perf uchun HTML hisobot"""
+    collect()
+    text = "📈 <b>Unumdorlik</b>\n\n"
+    text += _format_histogram("Handlerlar (jami vaqt bo'yicha)", handler_seconds, 'handler', limit)
+    text += _format_histogram("Funksiyalar", function_seconds, 'function', limit)
+    text += _format_histogram("DB funksiyalari", db_call_seconds, 'function', limit)
+    text += _format_histogram("Fon tsikllari", loop_pass_seconds, 'loop', limit)
+
+    api_requests = api_requests_total.snapshot()
+    if api_requests:
+        text += "<b>Bot API so'rovlari</b>\n"
+        for (method, status), count in sorted(api_requests.items(), key=lambda item: -item[1])[:limit * 2]:
+            text += f"• <code>{method}</code> [{status}]: {count}\n"
+        text += "\n"
+
+    db_statements = db_statements_total.snapshot()
+    if db_statements:
+        statements = ', '.join(f"{verb}: {count}" for (verb,), count in sorted(db_statements.items()))
+        text += f"<b>SQL statementlar</b>\n{statements}\n\n"
+
+    queues = queue_depth.snapshot()
+    if queues:
+        text += "<b>Navbatlar</b>\n"
+        for (queue,), value in sorted(queues.items()):
+            text += f"• {queue}: {value}\n"
+    return text
@@ -0,0 +1,71 @@
+"""Baza qatorlari uchun ixcham modellar
+
+Ko'p qatorli o'qishlarda har bir qator uchun dict o'rniga namedtuple asosidagi
+(__slots__ = ()) obyekt yaratiladi: qator maydon nomlarisiz tuple sifatida
+saqlanadi, row_factory uni to'g'ridan-to'g'ri quradi. Eski kod buzilmasligi
+uchun modellar dict kabi ham ishlaydi: row['user_id'], row.get('api_id'),
+dict(row). Yangi kodda atributlardan foydalaning: row.user_id.
+
+    cursor.row_factory = User.from_row
+    cursor.execute(f"SELECT {User.columns()} FROM users")
+"""
+from collections import namedtuple
+
+
+class RowModel:
+    """namedtuple modellariga dict ga o'xshash kirishni qo'shuvchi mixin
+
+    Faqat kalit bo'yicha o'qish dict kabi ishlaydi. `in`, for-aylanish,
+    len() va json.dumps() tuple qiymatlari ustida ishlaydi ('user_id' in row -
+    False; json.dumps(row) - ro'yxat), chunki namedtuple unpacking ni buzmaslik
+    uchun ular qayta aniqlanmagan. Kalitlar kerak bo'lsa dict(row) yoki
+    row._asdict() dan foydalaning.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        """sqlite3 row_factory: ustunlar tartibi _fields bilan bir xil bo'lishi kerak"""
+        return tuple.__new__(cls, row)
+
+    @classmethod
+    def columns(cls, alias=None):
+        """SELECT uchun ustunlar ro'yxati (ixtiyoriy jadval aliasi bilan)"""
+        prefix = f"{alias}." if alias else ''
+        return ', '.join(prefix + name for name in cls._fields)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self):
+        return self._fields
+
+
+def _model(name, fields):
+    """RowModel + namedtuple dan model klassi; _index - maydon nomi -> pozitsiya"""
+    cls = type(name, (RowModel, namedtuple(name, fields)), {'__slots__': ()})
+    cls._index = {field: i for i, field in enumerate(cls._fields)}
+    return cls
+
+
+User = _model('User', (
+    'user_id', 'first_name', 'last_name', 'username', 'phone_number', 'language_code', 'is_bot',
+    'is_premium', 'is_reachable', 'created_at', 'updated_at', 'referral_count', 'services_unlocked',
+))
+
+UserSession = _model('UserSession', (
+    'user_id', 'api_id', 'api_hash', 'phone_number', 'session_string', 'is_active',
+    'online_enabled', 'clock_enabled', 'created_at', 'updated_at',
+))
+
+# Navbat sahifasi uchun: withdrawals qatori + foydalanuvchi ismi
+PendingWithdrawal = _model('PendingWithdrawal', (
+    'id', 'user_id', 'amount', 'card_number', 'status', 'created_at', 'processed_at',
+    'first_name', 'username',
+))
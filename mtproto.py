@@ -0,0 +1,72 @@
+"""Foydalanuvchi akkauntlari uchun MTProto (pyrogram) klientlari
+
+Klientlar to'g'ridan-to'g'ri pyrogram.Client(...) bilan emas, create_client()
+orqali yaratiladi. Benchmark va testlarda set_client_factory() bilan soxta
+klient (tools/fake_mtproto.py) ulanadi.
+
+pyrogram (va tgcrypto) ni import qilish ~0.5 s oladi, shuning uchun u bot
+ishga tushishida emas, birinchi login yoki faol sessiya topilganda load()
+orqali yuklanadi. Xato klasslari: mtproto.errors.FloodWait va h.k.
+"""
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+_client_factory = None
+_client_hooks = []
+_pyrogram = None
+
+
+def load():
+    """pyrogram ni (bir marta) import qilish; modulni qaytaradi"""
+    global _pyrogram
+    if _pyrogram is None:
+        started = time.perf_counter()
+        module = importlib.import_module('pyrogram')
+        importlib.import_module('pyrogram.errors')
+        importlib.import_module('pyrogram.raw.functions.account')
+        _pyrogram = module
+        logger.info(f"pyrogram yuklandi ({time.perf_counter() - started:.2f} s)")
+    return _pyrogram
+
+
+def is_loaded():
+    return _pyrogram is not None
+
+
+def __getattr__(name):
+    # mtproto.errors - pyrogram.errors ga dangasa murojaat (except bloklari uchun)
+    if name == 'errors':
+        return load().errors
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def set_client_factory(factory):
+    """Klient yaratuvchini almashtirish (None - standart pyrogram.Client)
+
+    factory pyrogram.Client bilan bir xil kalit argumentlarni qabul qiladi.
+    """
+    global _client_factory
+    _client_factory = factory
+
+
+def add_client_hook(func):
+    """Har bir yangi klient bilan chaqiriladigan funksiya (masalan tracing uchun wrapperlar)"""
+    _client_hooks.append(func)
+    return func
+
+
+def create_client(name, api_id, api_hash, **kwargs):
+    """Yangi MTProto klienti (session_string, in_memory va h.k. kwargs orqali)"""
+    factory = _client_factory or load().Client
+    client = factory(name=name, api_id=api_id, api_hash=api_hash, **kwargs)
+    for hook in _client_hooks:
+        hook(client)
+    return client
+
+
+async def set_online(client):
+    """Akkauntni online ko'rsatish (account.updateStatus)"""
+    await client.invoke(load().raw.functions.account.UpdateStatus(offline=False))
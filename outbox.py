@@ -0,0 +1,93 @@
+"""Xabarlar navbati (outbox) dispetcheri
+
+Biznes o'zgarishi bilan bitta tranzaksiyada outbox jadvaliga yozilgan
+xabarlarni fonda, tezlik chegarasi va qayta urinishlar bilan yuboradi.
+"""
+import asyncio
+import json
+import logging
+import time
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter, TelegramBadRequest
+
+import database as db
+import metrics
+from config import OUTBOX_RATE, OUTBOX_MAX_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+_wakeup_event = asyncio.Event()
+
+
+def wakeup():
+    """Yangi xabar navbatga qo'yilganini dispetcherga bildirish"""
+    _wakeup_event.set()
+
+
+@metrics.register_collector
+def collect_queue_depth():
+    """/metrics uchun outbox navbati uzunligi"""
+    stats = db.get_outbox_stats()
+    metrics.queue_depth.set(stats.get('pending', 0), queue='outbox_pending')
+    metrics.queue_depth.set(stats.get('dead', 0), queue='outbox_dead')
+
+
+def backoff_seconds(attempts):
+    """Qayta urinishgacha kutish: 5s, 10s, 20s, ... (ko'pi bilan 10 daqiqa)"""
+    return min(5 * 2 ** attempts, 600)
+
+
+async def deliver(bot, notification, render):
+    """Bitta xabarni yuborish va natijani outbox ga yozish"""
+    notification_id = notification['id']
+    try:
+        text, reply_markup = render(notification['kind'], json.loads(notification['payload']))
+        await bot.send_message(notification['chat_id'], text, reply_markup=reply_markup)
+    except TelegramRetryAfter as e:
+        # Telegram chegarasi - urinish hisoblanmaydi
+        await asyncio.to_thread(
+            db.mark_notification_failed, notification_id, str(e), e.retry_after, False
+        )
+        return e.retry_after
+    except TelegramForbiddenError as e:
+        # Foydalanuvchi botni bloklagan - qayta urinishdan foyda yo'q
+        await asyncio.to_thread(db.mark_notification_failed, notification_id, str(e))
+        await asyncio.to_thread(db.set_user_reachable, notification['chat_id'], False)
+    except TelegramBadRequest as e:
+        await asyncio.to_thread(db.mark_notification_failed, notification_id, str(e))
+    except Exception as e:
+        attempts = notification['attempts'] + 1
+        retry_in = backoff_seconds(attempts) if attempts < OUTBOX_MAX_ATTEMPTS else None
+        await asyncio.to_thread(db.mark_notification_failed, notification_id, str(e), retry_in)
+        logger.warning(f"Outbox #{notification_id} yuborilmadi ({attempts}-urinish): {e}")
+    else:
+        await asyncio.to_thread(db.mark_notification_sent, notification_id)
+    return 0
+
+
+async def run_dispatcher(bot, render, rate=OUTBOX_RATE, batch_size=50, idle_interval=5):
+    """Outbox ni doimiy bo'shatib turish
+
+    render(kind, payload) -> (text, reply_markup) xabar matnini tayyorlaydi.
+    """
+    interval = 1 / rate
+    while True:
+        _wakeup_event.clear()
+        try:
+            batch = await asyncio.to_thread(db.get_due_notifications, batch_size)
+        except Exception as e:
+            logger.error(f"Outbox o'qishda xato: {e}")
+            batch = []
+        
+        pass_started = time.perf_counter()
+        for notification in batch:
+            pause = await deliver(bot, notification, render)
+            await asyncio.sleep(max(pause, interval))
+        if batch:
+            metrics.loop_pass_seconds.observe(time.perf_counter() - pass_started, loop='outbox')
+        
+        if len(batch) < batch_size:
+            try:
+                await asyncio.wait_for(_wakeup_event.wait(), timeout=idle_interval)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,210 @@
+"""Ma'lumotlarni saqlash muddati (retention) va bazani ixchamlash
+
+Har bir jadval uchun RETENTION_DAYS dan eski yozuvlar kichik
+tranzaksiyalarda (RETENTION_BATCH qatordan) o'chiriladi - yozuvchilar
+uzoq kutib qolmaydi. Qayta ishlangan pul yechish so'rovlari o'chirishdan
+oldin ARCHIVE_DIR dagi siqilgan JSONL faylga yoziladi, soni va summasi
+settings dagi archived_* hisobiga qo'shiladi (withdrawals_* hisoblagichlari
+qayta hisoblanganda kamaymaydi). Baza auto_vacuum=INCREMENTAL rejimida
+bo'lsa, bo'shagan sahifalar incremental_vacuum bilan qismlab faylga
+qaytariladi.
+
+Eski bazani INCREMENTAL rejimga o'tkazish (bir martalik to'liq VACUUM,
+bot to'xtatilganda):
+
+    python retention.py --convert
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+import backup
+import database as db
+from config import RETENTION_DAYS, RETENTION_BATCH, RETENTION_HOUR, ARCHIVE_DIR
+
+logger = logging.getLogger(__name__)
+
+# jadval -> (vaqt ustuni, qo'shimcha shart, arxivlansinmi)
+# join_requests: faol so'rovli kanallar yozuvlari obuna tekshiruvida kerak - o'chirilmaydi
+# change_journal: faqat inkremental rejim o'chiq bo'lsa - aks holda yozuvlar keyingi
+# deltaga kerak (to'liq zaxiraga kirganlarini backup.create_backup o'zi qirqadi)
+RETENTION_RULES = {
+    'join_requests': ('requested_at', "channel_id NOT IN (SELECT channel_id FROM channels WHERE is_active = 1)", False),
+    'bot_started': ('started_at', '', False),
+    'user_history': ('changed_at', '', False),
+    'withdrawals': ('processed_at', "status != 'pending'", True),
+    'outbox': ('created_at', "status IN ('sent', 'dead')", False),
+    'change_journal': ('changed_at', "(SELECT value FROM settings WHERE key = 'backup_mode') IS NOT 'incremental'", False),
+}
+
+# incremental_vacuum bir qadamda qaytaradigan sahifalar
+VACUUM_STEP_PAGES = 1000
+
+def _cutoff(days, now=None):
+    """Kun chegarasi: 'YYYY-MM-DD' - ham isoformat, ham '%Y-%m-%d %H:%M:%S' bilan solishtiriladi"""
+    return ((now or datetime.now()) - timedelta(days=days)).strftime('%Y-%m-%d')
+
+def _space(conn):
+    """(sahifa hajmi, jami sahifalar, bo'sh sahifalar)"""
+    return (conn.execute('PRAGMA page_size').fetchone()[0],
+            conn.execute('PRAGMA page_count').fetchone()[0],
+            conn.execute('PRAGMA freelist_count').fetchone()[0])
+
+def _archive(table, rows):
+    """Qatorlarni ARCHIVE_DIR/<jadval>_<oy>.jsonl.gz ga qo'shish (gzip a'zolari ketma-ket)"""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(ARCHIVE_DIR, f"{table}_{datetime.now().strftime('%Y%m')}.jsonl.gz")
+    with gzip.open(path, 'at', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(dict(row), ensure_ascii=False) + '\n')
+    return path
+
+def purge_table(table, days, batch_size=RETENTION_BATCH, pause=0.01, now=None):
+    """Jadvaldagi muddati o'tgan yozuvlarni id bo'yicha bo'laklab o'chirish
+
+    (o'chirilgan, arxivlangan) qatorlar sonini qaytaradi.
+    """
+    column, condition, archive = RETENTION_RULES[table]
+    where = f"{column} < :cutoff" + (f" AND {condition}" if condition else '')
+    cutoff = _cutoff(days, now)
+    deleted = archived = 0
+    last_id = 0
+
+    while True:
+        conn = db.get_connection()
+        try:
+            with db.write_lock(), conn:
+                rows = conn.execute(f'''
+                    SELECT * FROM {table} WHERE id > :last_id AND {where} ORDER BY id LIMIT :limit
+                ''', {'last_id': last_id, 'cutoff': cutoff, 'limit': batch_size}).fetchall()
+                if not rows:
+                    break
+                ids = [row['id'] for row in rows]
+                if table == 'withdrawals':
+                    db.preserve_withdrawal_totals(conn.cursor(), ids)
+                conn.execute(f"DELETE FROM {table} WHERE id IN ({','.join('?' * len(ids))})", ids)
+            # Arxivga faqat commit dan keyin - rollback bo'lsa qatorlar qayta yozilmaydi
+            if archive:
+                _archive(table, rows)
+                archived += len(rows)
+            deleted += len(ids)
+            last_id = ids[-1]
+        finally:
+            conn.close()
+        # Boshqa yozuvchilarga navbat berish
+        time.sleep(pause)
+
+    return deleted, archived
+
+def incremental_vacuum(max_pages=None, step=VACUUM_STEP_PAGES, pause=0.01):
+    """Bo'sh sahifalarni qismlab faylga qaytarish; qaytarilgan sahifalar soni
+
+    auto_vacuum=INCREMENTAL bo'lmasa hech narsa qilmaydi (0).
+    """
+    conn = db.get_connection()
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            return 0
+        reclaimed = 0
+        while True:
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            pages = min(step, free, max_pages - reclaimed if max_pages else free)
+            if pages <= 0:
+                break
+            with db.write_lock():
+                # Pragma har bir bo'shatilgan sahifa uchun qadam qiladi - oxirigacha o'qish kerak
+                conn.execute(f'PRAGMA incremental_vacuum({pages})').fetchall()
+            after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if after >= free:
+                break
+            reclaimed += free - after
+            time.sleep(pause)
+        return reclaimed
+    finally:
+        conn.close()
+
+def run_retention(days=None, batch_size=RETENTION_BATCH, now=None):
+    """Barcha jadvallar bo'yicha tozalash va ixchamlash; hisobot lug'ati"""
+    days = {**RETENTION_DAYS, **(days or {})}
+    started = time.perf_counter()
+    conn = db.get_connection()
+    page_size, pages_before, _ = _space(conn)
+    auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+    conn.close()
+
+    tables = {}
+    for table, table_days in days.items():
+        if table not in RETENTION_RULES or not table_days:
+            continue
+        deleted, archived = purge_table(table, table_days, batch_size, now=now)
+        tables[table] = {'days': table_days, 'deleted': deleted, 'archived': archived}
+
+    reclaimed = incremental_vacuum()
+    conn = db.get_connection()
+    _, pages_after, free_after = _space(conn)
+    conn.close()
+
+    report = {
+        'tables': tables,
+        'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(auto_vacuum, auto_vacuum),
+        'size_before': pages_before * page_size,
+        'size_after': pages_after * page_size,
+        'reclaimed_bytes': (pages_before - pages_after) * page_size,
+        'free_bytes': free_after * page_size,
+        'vacuumed_pages': reclaimed,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+    db.set_setting('last_retention_at', datetime.now().isoformat())
+    db.set_setting('last_retention_report', json.dumps(report))
+    return report
+
+def format_report(report):
+    """Hisobotni admin xabari uchun matnga aylantirish"""
+    mb = 1024 * 1024
+    lines = [f"🧹 <b>Ma'lumotlarni tozalash</b> ({report['seconds']} s)\n"]
+    for table, stats in report['tables'].items():
+        archived = f", arxiv: {stats['archived']}" if stats['archived'] else ''
+        lines.append(f"• {table} (>{stats['days']} kun): {stats['deleted']} ta{archived}")
+    lines.append(
+        f"\n💾 Baza: {report['size_before'] / mb:.1f} -> {report['size_after'] / mb:.1f} MB "
+        f"(qaytarildi: {report['reclaimed_bytes'] / mb:.1f} MB, bo'sh: {report['free_bytes'] / mb:.1f} MB)"
+    )
+    if report['auto_vacuum'] != 'incremental':
+        lines.append("⚠️ auto_vacuum=INCREMENTAL emas - joy faylga qaytarilmaydi (python retention.py --convert)")
+    return '\n'.join(lines)
+
+async def run_scheduler(hour=RETENTION_HOUR):
+    """Har kuni soat hour:00 da tozalash (lifecycle xizmati sifatida)"""
+    while True:
+        await asyncio.sleep(backup.seconds_until(hour))
+        try:
+            report = await asyncio.to_thread(run_retention)
+            logger.info(f"Retention: {report}")
+        except Exception as e:
+            logger.error(f"Retention xatosi: {e}")
+
+def convert_to_incremental():
+    """Bazani auto_vacuum=INCREMENTAL ga o'tkazish (to'liq VACUUM - yozuvlarni to'sadi)"""
+    conn = db.get_connection()
+    try:
+        with db.write_lock():
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ma'lumotlarni tozalash va bazani ixchamlash")
+    parser.add_argument('--convert', action='store_true', help="bazani auto_vacuum=INCREMENTAL ga o'tkazish")
+    args = parser.parse_args()
+
+    db.init_database()
+    if args.convert:
+        print(f"auto_vacuum = {convert_to_incremental()}")
+    print(json.dumps(run_retention(), indent=2, ensure_ascii=False))
@@ -0,0 +1,152 @@
+"""Foydalanuvchi bo'yicha cheklov (flood himoyasi) middleware
+
+Har bir (foydalanuvchi, sinf) juftligi uchun token bucket: THROTTLE_RATES
+dagi (rate, burst) bo'yicha soniyasiga rate ta token tiklanadi, ko'pi bilan
+burst ta yig'iladi. Handler sinfi uning nomi bo'yicha aniqlanadi
+(HANDLER_CLASSES), qolganlari: xabarlar - 'default', callbacklar - 'callback'.
+
+Limitdan oshgan update handlerga yetmaydi (DB va Bot API so'rovlarisiz):
+foydalanuvchiga oynada bir marta "biroz kuting" deyiladi, callbackga
+cache_time bilan javob beriladi - Telegram klienti shu vaqt ichida tugmani
+qayta yubormaydi. COALESCE sinflarida bir xil handler shu foydalanuvchi
+uchun hali ishlayotgan bo'lsa, takroriy update ham tashlanadi (masalan
+"✅ Tekshirish" ni ketma-ket bosish). Tashlanganlar
+bot_throttled_updates_total{throttle_class, reason} da sanaladi.
+"""
+import logging
+import math
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+import metrics
+from config import THROTTLE_RATES
+
+logger = logging.getLogger(__name__)
+
+# Handler nomi bo'yicha sinflar (metrics dagi kabi callback.__name__)
+HANDLER_CLASSES = {
+    'gated': {
+        'cmd_start', 'show_services', 'show_referral', 'show_support', 'phone_detect_service',
+        'profile_clock_service', 'online_24_7_service', 'my_info', 'search_user_start',
+        'check_subscription_callback',
+    },
+    'search': {'process_search_user', 'process_phone_detect'},
+    'login': {'process_api_id', 'process_api_hash', 'process_phone_number', 'process_code', 'process_2fa'},
+}
+_CLASS_BY_HANDLER = {name: cls for cls, names in HANDLER_CLASSES.items() for name in names}
+
+# Bir vaqtda faqat bittasi ishlaydigan sinflar (takroriy bosishlar birlashtiriladi)
+COALESCE = {'gated', 'callback', 'search'}
+
+# Shundan ko'p bucket bo'lsa to'lganlari (uzoq jim turganlar) tozalanadi
+PRUNE_THRESHOLD = 10000
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Inner middleware (message, callback_query): token bucket va takroriy updatelarni tashlash"""
+
+    def __init__(self, rates=THROTTLE_RATES, exempt=()):
+        self.rates = rates
+        self.exempt = set(exempt)
+        self.buckets = {}  # (user_id, sinf) -> [tokenlar, oxirgi yangilanish, ogohlantirish muddati]
+        self.inflight = set()  # (user_id, handler nomi)
+
+    def classify(self, event, handler_name):
+        cls = _CLASS_BY_HANDLER.get(handler_name)
+        if cls is None:
+            cls = 'callback' if isinstance(event, CallbackQuery) else 'default'
+        return cls
+
+    def take(self, key, cls, now):
+        """Bitta token olish; 0 - ruxsat, aks holda keyingi token uchun kutish (soniya)"""
+        rate, burst = self.rates[cls]
+        state = self.buckets.get(key)
+        if state is None:
+            if len(self.buckets) >= PRUNE_THRESHOLD:
+                self.prune(now)
+            state = self.buckets[key] = [burst, now, 0.0]
+        tokens = min(burst, state[0] + (now - state[1]) * rate)
+        state[1] = now
+        if tokens >= 1:
+            state[0] = tokens - 1
+            return 0
+        state[0] = tokens
+        return (1 - tokens) / rate
+
+    def prune(self, now=None):
+        """To'lib bo'lgan (jim qolgan) bucketlarni o'chirish; o'chirilganlar soni"""
+        now = now or time.monotonic()
+        idle = [key for key, (tokens, updated, _) in self.buckets.items()
+                if tokens + (now - updated) * self.rates[key[1]][0] >= self.rates[key[1]][1]]
+        for key in idle:
+            del self.buckets[key]
+        return len(idle)
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        if user is None or user.id in self.exempt:
+            return await handler(event, data)
+
+        name = getattr(getattr(data.get('handler'), 'callback', None), '__name__', 'unknown')
+        cls = self.classify(event, name)
+        running = (user.id, name)
+        if cls in COALESCE and running in self.inflight:
+            metrics.throttled_updates_total.inc(throttle_class=cls, reason='inflight')
+            if isinstance(event, CallbackQuery):
+                await self._answer_quietly(event)
+            return None
+
+        now = time.monotonic()
+        key = (user.id, cls)
+        wait = self.take(key, cls, now)
+        if wait:
+            metrics.throttled_updates_total.inc(throttle_class=cls, reason='rate')
+            await self._notify(event, key, wait, now)
+            return None
+
+        if cls not in COALESCE:
+            return await handler(event, data)
+        self.inflight.add(running)
+        try:
+            return await handler(event, data)
+        finally:
+            self.inflight.discard(running)
+
+    async def _notify(self, event, key, wait, now):
+        """Oynada bir marta ogohlantirish; qolgan tashlangan updatelar jim"""
+        state = self.buckets[key]
+        seconds = max(1, math.ceil(wait))
+        if now < state[2]:
+            if isinstance(event, CallbackQuery):
+                await self._answer_quietly(event)
+            return
+        state[2] = now + seconds
+        try:
+            if isinstance(event, CallbackQuery):
+                await event.answer(f"⏳ Juda tez! {seconds} soniyadan keyin urinib ko'ring.", cache_time=seconds)
+            else:
+                await event.answer(f"⏳ Juda tez! {seconds} soniyadan keyin urinib ko'ring.")
+        except Exception as e:
+            logger.debug(f"Throttle ogohlantirishi yuborilmadi ({key[0]}): {e}")
+
+    @staticmethod
+    async def _answer_quietly(callback):
+        """Tugmadagi yuklanish belgisini o'chirish (matnsiz javob)"""
+        try:
+            await callback.answer()
+        except Exception:
+            pass
+
+
+def setup(router, exempt=()):
+    """Middleware ni router.message va router.callback_query ga ulash; middleware obyektini qaytaradi
+
+    Boshqa inner middleware lardan (metrics, tracing) oldin ulanishi kerak - tashlangan
+    updatelar handler metrikalariga tushmaydi.
+    """
+    throttler = ThrottlingMiddleware(exempt=exempt)
+    router.message.middleware(throttler)
+    router.callback_query.middleware(throttler)
+    return throttler
@@ -0,0 +1,321 @@
+"""database.py funksiyalari benchmarki
+
+Har bir o'lcham (standart: 10k / 100k / 1M foydalanuvchi) uchun sintetik
+baza yaratiladi (--cache-dir da saqlanadi), uning nusxasida database.py
+dagi har bir ochiq funksiya cold va warm keshda o'lchanadi:
+- cold: har chaqiruvdan oldin fayl sahifalari OS keshidan chiqariladi
+  (posix_fadvise DONTNEED) va db.invalidate_caches() chaqiriladi;
+- warm: xuddi shu chaqiruvlar ketma-ket.
+Avval o'quvchi, keyin yozuvchi funksiyalar o'lchanadi. Natija - JSON.
+
+    python tools/bench_database.py --sizes 10000 100000 -o before.json
+    python tools/bench_database.py --compare before.json after.json
+"""
+import argparse
+import inspect
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+import benchutil  # noqa: E402
+import synthetic_db  # noqa: E402
+import database as db  # noqa: E402
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+
+# Benchmark qilinmaydigan infratuzilma funksiyalari
+NOT_BENCHMARKED = {
+    'add_statement_listener', 'set_connection_factory', 'get_connection', 'write_lock',
+    'register_cache_invalidator', 'init_database', 'migrate', 'checkpoint', 'memory_caches',
+    'preserve_withdrawal_totals',
+}
+CARD = '8600 0000 0000 0000'
+NEW_USER_BASE = 9000000000
+
+
+class FakeUser:
+    """add_or_update_user uchun aiogram User o'rnini bosuvchi"""
+
+    def __init__(self, user_id, first_name='Bench', username=''):
+        self.id = user_id
+        self.first_name = first_name
+        self.last_name = ''
+        self.username = username
+        self.language_code = 'uz'
+        self.is_bot = False
+        self.is_premium = False
+
+
+class Context:
+    """Chaqiruvlar uchun argumentlar manbai (seed bo'yicha deterministik)"""
+
+    def __init__(self, user_ids, seed, pool_size):
+        self.rng = random.Random(seed)
+        self.user_ids = user_ids
+        conn = db.get_connection()
+        self.referrers = [row[0] for row in conn.execute(
+            'SELECT referrer_id FROM referrals GROUP BY referrer_id')]
+        self.session_users = [row[0] for row in conn.execute('SELECT user_id FROM user_sessions')]
+        self.withdrawal_ids = [row[0] for row in conn.execute('SELECT id FROM withdrawals')] or [0]
+        conn.close()
+        self.referrers = self.referrers or user_ids[:1]
+        self.session_users = self.session_users or user_ids[:1]
+        self.pool_size = pool_size
+        self.pending_pool = []
+        self.outbox_pool = []
+
+    def user(self):
+        return self.rng.choice(self.user_ids)
+
+    def referrer(self):
+        return self.rng.choice(self.referrers)
+
+    def nth_user(self, i):
+        """add_*/remove_* juftliklari bir xil foydalanuvchilarga tushishi uchun"""
+        return self.user_ids[i % len(self.user_ids)]
+
+    def prepare_writes(self):
+        """Yozuvchi funksiyalar uchun kutilayotgan so'rovlar va outbox yozuvlari (o'lchanmaydi)"""
+        rich_user = self.referrers[0]
+        conn = db.get_connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO balances (user_id, balance, total_earned, total_withdrawn) VALUES (?, ?, ?, 0)
+                ON CONFLICT(user_id) DO UPDATE SET balance = balance + excluded.balance
+            ''', (rich_user, 10 ** 9, 10 ** 9))
+        conn.close()
+        self.pending_pool = [db.create_withdrawal_request(rich_user, 1000, CARD, 'Bench', [])
+                             for _ in range(self.pool_size * 2)]
+        for _ in range(self.pool_size * 2):
+            db.enqueue_notification(rich_user, 'bench', {})
+        conn = db.get_connection()
+        self.outbox_pool = [row[0] for row in conn.execute(
+            "SELECT id FROM outbox WHERE kind = 'bench' ORDER BY id")]
+        conn.close()
+
+
+def _rebuild_stats_counters():
+    conn = db.get_connection()
+    db.rebuild_stats_counters(conn)
+    conn.rollback()
+    conn.close()
+
+
+# nom -> (ctx, i) dan chaqiriladigan funksiya. Tartib muhim: o'quvchilar avval, yozuvchilar keyin.
+READ_CASES = {
+    'invalidate_caches': lambda c, i: db.invalidate_caches(),
+    'get_stats_counters': lambda c, i: db.get_stats_counters(),
+    'rebuild_stats_counters': lambda c, i: _rebuild_stats_counters(),
+    'get_daily_rollups': lambda c, i: db.get_daily_rollups(7),
+    'get_journal_head': lambda c, i: db.get_journal_head(),
+    'iter_journal': lambda c, i: list(db.iter_journal(0, db.get_journal_head())),
+    'load_settings': lambda c, i: db.load_settings(),
+    'get_setting': lambda c, i: db.get_setting('auto_backup'),
+    'is_auto_backup_enabled': lambda c, i: db.is_auto_backup_enabled(),
+    'is_incremental_backup_enabled': lambda c, i: db.is_incremental_backup_enabled(),
+    'get_referral_count': lambda c, i: db.get_referral_count(c.referrer()),
+    'is_services_unlocked': lambda c, i: db.is_services_unlocked(c.user()),
+    'load_unlocked_users': lambda c, i: db.load_unlocked_users(),
+    'get_referrals': lambda c, i: db.get_referrals(c.referrer()),
+    'get_user': lambda c, i: db.get_user(c.user()),
+    'get_user_by_username': lambda c, i: db.get_user_by_username(f"user{c.user()}"),
+    'get_user_history': lambda c, i: db.get_user_history(c.user()),
+    'get_all_users': lambda c, i: db.get_all_users(),
+    'get_users_page': lambda c, i: db.get_users_page(),
+    'get_users_count': lambda c, i: db.get_users_count(),
+    'get_user_groups': lambda c, i: db.get_user_groups(c.user()),
+    'load_channels': lambda c, i: db.load_channels(),
+    'get_active_channels': lambda c, i: db.get_active_channels(),
+    'get_request_channels': lambda c, i: db.get_request_channels(),
+    'has_join_request': lambda c, i: db.has_join_request(c.user(), synthetic_db.CHANNELS[2][0]),
+    'get_user_session': lambda c, i: db.get_user_session(c.rng.choice(c.session_users)),
+    'get_active_online_sessions': lambda c, i: db.get_active_online_sessions(),
+    'get_active_clock_sessions': lambda c, i: db.get_active_clock_sessions(),
+    'has_bot_started': lambda c, i: db.has_bot_started(c.user(), synthetic_db.CHANNELS[3][1]),
+    'get_user_balance': lambda c, i: db.get_user_balance(c.referrer()),
+    'get_withdrawals_page': lambda c, i: db.get_withdrawals_page('a100'),
+    'get_withdrawal_by_id': lambda c, i: db.get_withdrawal_by_id(c.rng.choice(c.withdrawal_ids)),
+    'get_due_notifications': lambda c, i: db.get_due_notifications(),
+    'get_outbox_stats': lambda c, i: db.get_outbox_stats(),
+}
+
+WRITE_CASES = {
+    'add_or_update_user': lambda c, i: db.add_or_update_user(FakeUser(NEW_USER_BASE + i)),
+    'update_user_phone': lambda c, i: db.update_user_phone(c.user(), f"+99890{i:07d}"),
+    'set_user_reachable': lambda c, i: db.set_user_reachable(c.user(), True),
+    'add_user_to_group': lambda c, i: db.add_user_to_group(c.user(), -100500000 - i, 'Bench guruh'),
+    'set_setting': lambda c, i: db.set_setting('bench', str(i)),
+    'toggle_auto_backup': lambda c, i: db.toggle_auto_backup(),
+    'toggle_backup_mode': lambda c, i: db.toggle_backup_mode(),
+    'credit_referral': lambda c, i: db.credit_referral(c.referrer(), NEW_USER_BASE + 2000000 + i, 1000, 'Bench'),
+    'add_channel': lambda c, i: db.add_channel(f"-100900{i}", f"@bench_{i}", 'Bench', 1),
+    'toggle_channel': lambda c, i: db.toggle_channel(f"-100900{i}"),
+    'remove_channel': lambda c, i: db.remove_channel(f"-100900{i}"),
+    'add_join_request': lambda c, i: db.add_join_request(c.nth_user(i), '-100777'),
+    'remove_join_request': lambda c, i: db.remove_join_request(c.nth_user(i), '-100777'),
+    'save_user_session': lambda c, i: db.save_user_session(NEW_USER_BASE + 3000000 + i, '1', 'h', '+998', 's'),
+    'update_session_settings': lambda c, i: db.update_session_settings(NEW_USER_BASE + 3000000 + i, online_enabled=1),
+    'delete_user_session': lambda c, i: db.delete_user_session(NEW_USER_BASE + 3000000 + i),
+    'add_bot_started': lambda c, i: db.add_bot_started(c.nth_user(i), '@bench_other_bot'),
+    'remove_bot_started': lambda c, i: db.remove_bot_started(c.nth_user(i), '@bench_other_bot'),
+    'create_withdrawal_request': lambda c, i: db.create_withdrawal_request(c.referrers[0], 1000, CARD, 'Bench', [1]),
+    'finish_withdrawal': lambda c, i: db.finish_withdrawal(c.pending_pool[i % c.pool_size], 'approved'),
+    'bulk_finish_withdrawals': lambda c, i: db.bulk_finish_withdrawals(
+        'all', c.pending_pool[c.pool_size + i % c.pool_size], c.pending_pool[c.pool_size + i % c.pool_size],
+        'rejected'),
+    'enqueue_notification': lambda c, i: db.enqueue_notification(c.user(), 'bench', {'i': i}),
+    'mark_notification_sent': lambda c, i: db.mark_notification_sent(c.outbox_pool[i % c.pool_size]),
+    'mark_notification_failed': lambda c, i: db.mark_notification_failed(
+        c.outbox_pool[c.pool_size + i % c.pool_size], 'bench', 5),
+    'trim_journal': lambda c, i: db.trim_journal(db.get_journal_head()),
+}
+
+
+def drop_os_cache(path):
+    """Baza fayllarini OS sahifa keshidan chiqarish (Linux); imkon bo'lmasa False"""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    for suffix in ('', '-wal', '-shm'):
+        if not os.path.exists(path + suffix):
+            continue
+        fd = os.open(path + suffix, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+
+def measure(func, ctx, iterations, budget, cold_path=None, start_index=0):
+    """func ni iterations marta (yoki budget soniya tugaguncha, kamida 3 marta) o'lchash
+
+    start_index - cold va warm o'lchovlar yozuvchi funksiyalarda turli kalitlarni ishlatishi uchun.
+    """
+    samples = []
+    deadline = time.perf_counter() + budget
+    for i in range(start_index, start_index + iterations):
+        if cold_path:
+            drop_os_cache(cold_path)
+            db.invalidate_caches()
+        start = time.perf_counter()
+        func(ctx, i)
+        samples.append(time.perf_counter() - start)
+        if len(samples) >= 3 and time.perf_counter() > deadline:
+            break
+    return benchutil.latency_summary(samples)
+
+
+def ensure_database(size, seed, cache_dir):
+    """Kesh papkasidagi tayyor bazani olish yoki yaratish"""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"bench_{size}_seed{seed}_v{db.SCHEMA_VERSION}.db")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        print(f"  baza yaratilmoqda: {path}", file=sys.stderr)
+        synthetic_db.build_database(path + '.tmp', size, seed)
+        os.replace(path + '.tmp', path)
+        print(f"  {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    return path
+
+
+def bench_size(size, args, workdir):
+    source = ensure_database(size, args.seed, args.cache_dir)
+    path = os.path.join(workdir, f"work_{size}.db")
+    shutil.copyfile(source, path)
+    db.DATABASE_FILE = path
+    db.invalidate_caches()
+
+    conn = db.get_connection()
+    user_ids = [row[0] for row in conn.execute('SELECT user_id FROM users')]
+    conn.close()
+    ctx = Context(user_ids, args.seed, args.iterations + args.cold_iterations)
+    cold_supported = hasattr(os, 'posix_fadvise')
+
+    results = {}
+    for cases, phase in ((READ_CASES, 'read'), (WRITE_CASES, 'write')):
+        if phase == 'write':
+            ctx.prepare_writes()
+        for name, func in cases.items():
+            if args.only and name not in args.only:
+                continue
+            print(f"  {size}: {name}", file=sys.stderr)
+            entry = {'phase': phase}
+            if cold_supported and not args.warm_only:
+                entry['cold'] = measure(func, ctx, args.cold_iterations, args.budget, cold_path=path)
+            entry['warm'] = measure(func, ctx, args.iterations, args.budget, start_index=args.cold_iterations)
+            results[name] = entry
+
+    size_bytes = os.path.getsize(path)
+    os.remove(path)
+    return {'db_size_bytes': size_bytes, 'functions': results}
+
+
+def public_functions():
+    return sorted(
+        name for name, func in vars(db).items()
+        if inspect.isfunction(func) and func.__module__ == db.__name__ and not name.startswith('_')
+    )
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='bench_db_')
+    try:
+        sizes = {str(size): bench_size(size, args, workdir) for size in args.sizes}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    covered = set(READ_CASES) | set(WRITE_CASES)
+    return {
+        'tool': 'bench_database',
+        'environment': benchutil.environment(),
+        'config': {
+            'sizes': args.sizes,
+            'seed': args.seed,
+            'iterations': args.iterations,
+            'cold_iterations': args.cold_iterations,
+            'schema_version': db.SCHEMA_VERSION,
+        },
+        'not_covered': [name for name in public_functions() if name not in covered and name not in NOT_BENCHMARKED],
+        'sizes': sizes,
+    }
+
+
+def compare(baseline_path, current_path, metric):
+    baseline = benchutil.load_report(baseline_path)
+    current = benchutil.load_report(current_path)
+    for size in sorted(set(baseline['sizes']) & set(current['sizes']), key=int):
+        for mode in ('warm', 'cold'):
+            old = {name: entry[mode] for name, entry in baseline['sizes'][size]['functions'].items() if mode in entry}
+            new = {name: entry[mode] for name, entry in current['sizes'][size]['functions'].items() if mode in entry}
+            if old or new:
+                benchutil.print_comparison(f"{size} foydalanuvchi, {mode} ({metric})",
+                                           benchutil.compare_rows(old, new, metric))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="database.py funksiyalari benchmarki")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--iterations', type=int, default=200, help="warm chaqiruvlar soni")
+    parser.add_argument('--cold-iterations', type=int, default=20, help="cold chaqiruvlar soni")
+    parser.add_argument('--budget', type=float, default=3.0, help="bitta funksiya/rejim uchun maksimal soniya")
+    parser.add_argument('--warm-only', action='store_true')
+    parser.add_argument('--only', nargs='+', help="faqat shu funksiyalar")
+    parser.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), 'sherlokbot_bench'))
+    parser.add_argument('-o', '--output', default='-', help="JSON hisobot fayli ('-' - stdout)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'))
+    parser.add_argument('--metric', default='p50_ms', help="solishtirish ko'rsatkichi (p50_ms, p95_ms, mean_ms)")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare, args.metric)
+    else:
+        benchutil.write_report(run(args), args.output)
@@ -0,0 +1,138 @@
+"""Qator modellari benchmarki: dict(sqlite3.Row) va models.py (namedtuple, __slots__)
+
+Sintetik bazada ko'p qatorli so'rovlar ikki usulda o'qiladi:
+- dict: row_factory = sqlite3.Row, natija [dict(r) for r in rows] (eski usul);
+- model: row_factory = Model.from_row (database.py dagi hozirgi usul).
+Har bir holat uchun qurish vaqti (p50), natija ro'yxatining xotirasi
+(tracemalloc) va maydonlarga kirish vaqti o'lchanadi; modellarda kirish
+row['key'] (model) va row.key (model_attributes) ko'rinishida alohida.
+
+    python tools/bench_rows.py --users 100000 -o rows.json
+"""
+import argparse
+import gc
+import operator
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+import benchutil  # noqa: E402
+import synthetic_db  # noqa: E402
+import database as db  # noqa: E402
+from models import User, UserSession, PendingWithdrawal  # noqa: E402
+
+# nom -> (model, SQL); SQL ustunlari model maydonlari tartibida
+CASES = {
+    'users': (User, f"SELECT {User.columns()} FROM users ORDER BY created_at DESC"),
+    'sessions': (UserSession, f"SELECT {UserSession.columns()} FROM user_sessions WHERE is_active = 1"),
+    'withdrawals': (PendingWithdrawal, f'''
+        SELECT {db._PENDING_WITHDRAWAL_COLUMNS}
+        FROM withdrawals w LEFT JOIN users u ON w.user_id = u.user_id ORDER BY w.id
+    '''),
+}
+
+
+def fetch_dicts(conn, model, sql):
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    return [dict(r) for r in cursor.execute(sql).fetchall()]
+
+
+def fetch_models(conn, model, sql):
+    cursor = conn.cursor()
+    cursor.row_factory = model.from_row
+    return cursor.execute(sql).fetchall()
+
+
+def touch(rows, fields):
+    """Eski handlerlardagi kabi har bir qatordan bir nechta maydonni string kalit bilan o'qish"""
+    total = 0
+    for row in rows:
+        for field in fields:
+            if row[field]:
+                total += 1
+    return total
+
+
+def touch_attributes(rows, fields):
+    """Xuddi shu maydonlarni atribut sifatida o'qish (faqat modellar uchun)"""
+    getters = [operator.attrgetter(field) for field in fields]
+    total = 0
+    for row in rows:
+        for getter in getters:
+            if getter(row):
+                total += 1
+    return total
+
+
+def measure(conn, fetch, model, sql, repeats, access_with=touch):
+    build = []
+    access = []
+    for _ in range(repeats):
+        gc.collect()
+        started = time.perf_counter()
+        rows = fetch(conn, model, sql)
+        build.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        access_with(rows, model._fields[:3])
+        access.append(time.perf_counter() - started)
+        del rows
+
+    gc.collect()
+    tracemalloc.start()
+    rows = fetch(conn, model, sql)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'rows': len(rows),
+        'build': benchutil.latency_summary(build),
+        'access': benchutil.latency_summary(access),
+        'memory_mb': round(size / 1024 / 1024, 2),
+        'bytes_per_row': round(size / len(rows), 1) if rows else 0.0,
+    }
+
+
+def run(args):
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix='bench_rows_'), 'rows.db')
+    if not (args.db and os.path.exists(path)):
+        print(f"Sintetik baza: {args.users} foydalanuvchi -> {path}", file=sys.stderr)
+        synthetic_db.build_database(path, args.users, args.seed)
+    conn = sqlite3.connect(path)
+
+    results = {}
+    for name, (model, sql) in CASES.items():
+        results[name] = {
+            'dict': measure(conn, fetch_dicts, model, sql, args.repeats),
+            'model': measure(conn, fetch_models, model, sql, args.repeats),
+            'model_attributes': measure(conn, fetch_models, model, sql, args.repeats, touch_attributes),
+        }
+        old, new = results[name]['dict'], results[name]['model']
+        print(f"{name:12} {new['rows']:>8} qator  qurish p50 {old['build']['p50_ms']:.1f} -> "
+              f"{new['build']['p50_ms']:.1f} ms  xotira {old['memory_mb']} -> {new['memory_mb']} MB",
+              file=sys.stderr)
+    conn.close()
+
+    return {
+        'tool': 'bench_rows',
+        'environment': benchutil.environment(),
+        'config': {'users': args.users, 'seed': args.seed, 'repeats': args.repeats},
+        'cases': results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="dict va __slots__ qator modellari benchmarki")
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--db', help="mavjud sintetik baza (berilmasa vaqtinchalik yaratiladi)")
+    parser.add_argument('-o', '--output', default='-', help="JSON hisobot fayli ('-' - stdout)")
+    args = parser.parse_args()
+    benchutil.write_report(run(args), args.output)
@@ -0,0 +1,191 @@
+"""Soat va online xizmatlari (clock_pass / online_pass) benchmarki
+
+Bazaga N ta soxta sessiya yoziladi, mtproto klienti tools/fake_mtproto.py
+dagi FakeNetwork bilan almashtiriladi va main.clock_pass() hamda
+main.online_pass() bir necha marta ishga tushiriladi. Hisobot (JSON):
+- o'tish davomiyligi va u xizmat oralig'iga (60 s / 300 s) sig'adimi;
+- soat siljishi: daqiqa boshidan profil yangilanguncha o'tgan vaqt;
+- daqiqasiga ulanishlar, eng ko'p bir vaqtdagi ulanishlar;
+- xotira: tracemalloc cho'qqisi va jarayon maxrss.
+
+--time-scale K barcha kechikishlarni K marta kichraytiradi, natijadagi
+vaqtlar esa K ga ko'paytiriladi (10k sessiyani tezroq taxminlash uchun;
+CPU ulushi ham K marta kattalashadi).
+
+    python tools/bench_sessions.py --sessions 1000 10000 --connect-latency 150 --time-scale 10 -o before.json
+    python tools/bench_sessions.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+import benchutil  # noqa: E402
+from fake_mtproto import FakeNetwork  # noqa: E402
+
+FIRST_USER_ID = 6000000000
+SERVICE_INTERVALS = {'clock': 60, 'online': 300}
+
+
+def prepare_environment():
+    """main import qilinishidan oldin muhit o'zgaruvchilari va ishchi papka"""
+    workdir = tempfile.mkdtemp(prefix='bench_sessions_')
+    os.environ.setdefault('BOT_TOKEN', '123456:' + 'A' * 35)
+    os.environ['DATABASE_FILE'] = os.path.join(workdir, 'placeholder.db')
+    os.environ['METRICS_PORT'] = '0'
+    os.chdir(workdir)
+    return workdir
+
+
+def fill_sessions(db, path, count):
+    """path da count ta (soat va online yoqilgan) sessiyali yangi baza"""
+    db.DATABASE_FILE = path
+    db.init_database()
+    now = datetime.now().isoformat()
+    conn = db.get_connection()
+    conn.executemany('''
+        INSERT INTO user_sessions (user_id, api_id, api_hash, phone_number, session_string, is_active,
+                                   online_enabled, clock_enabled, created_at, updated_at)
+        VALUES (?, '12345', 'hash', '+998900000000', ?, 1, 1, 1, ?, ?)
+    ''', [(FIRST_USER_ID + i, f"session_{FIRST_USER_ID + i}", now, now) for i in range(count)])
+    conn.commit()
+    conn.close()
+
+
+async def bench_service(main, service, network, passes, scale):
+    """Bitta xizmatni passes marta o'tkazish va natijani yig'ish"""
+    run_pass = main.clock_pass if service == 'clock' else main.online_pass
+    interval = SERVICE_INTERVALS[service]
+    durations = []
+    drifts = []
+    connects_before = network.connects
+    network.peak_connections = 0
+    network.profile_updates.clear()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(passes):
+        tick = time.time()
+        pass_started = time.perf_counter()
+        await run_pass()
+        durations.append((time.perf_counter() - pass_started) * scale)
+        drifts.extend((moment - tick) * scale for _, _, moment in network.profile_updates)
+        network.profile_updates.clear()
+    elapsed = (time.perf_counter() - started) * scale
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    connects = network.connects - connects_before
+    result = {
+        'interval_s': interval,
+        'pass_s': benchutil.latency_summary(durations),
+        'fits_interval': max(durations) < interval,
+        'connects': connects,
+        'connects_per_minute': round(connects / elapsed * 60, 1) if elapsed else 0.0,
+        'peak_connections': network.peak_connections,
+        'tracemalloc_peak_mb': round(peak / 1024 / 1024, 2),
+    }
+    if service == 'clock':
+        result['drift'] = benchutil.latency_summary(drifts)
+        # Oraliqdan kech yangilangan profillar keyingi daqiqani o'tkazib yuboradi
+        result['late_updates'] = sum(1 for drift in drifts if drift >= interval)
+    return result
+
+
+async def run(args):
+    workdir = prepare_environment()
+    # Har bir sessiya uchun log yozuvlari natijani buzmasligi uchun
+    logging.disable(logging.ERROR)
+
+    import main
+    import mtproto
+    import database as db
+
+    scale = args.time_scale
+    network = FakeNetwork(
+        connect_latency=args.connect_latency / 1000 / scale, call_latency=args.call_latency / 1000 / scale,
+        jitter=args.jitter / 1000 / scale, flood_rate=args.flood_rate, auth_fail_percent=args.auth_fail_percent,
+        seed=args.seed,
+    )
+    mtproto.set_client_factory(network.create_client)
+
+    sizes = {}
+    for count in args.sessions:
+        fill_sessions(db, os.path.join(workdir, f"sessions_{count}.db"), count)
+        print(f"{count} sessiya...", file=sys.stderr)
+        sizes[str(count)] = {
+            service: await bench_service(main, service, network, args.passes, scale)
+            for service in args.services
+        }
+    mtproto.set_client_factory(None)
+
+    return {
+        'tool': 'bench_sessions',
+        'environment': benchutil.environment(),
+        'config': {
+            'sessions': args.sessions,
+            'services': args.services,
+            'passes': args.passes,
+            'connect_latency_ms': args.connect_latency,
+            'call_latency_ms': args.call_latency,
+            'jitter_ms': args.jitter,
+            'flood_rate': args.flood_rate,
+            'auth_fail_percent': args.auth_fail_percent,
+            'time_scale': scale,
+            'seed': args.seed,
+        },
+        'sizes': sizes,
+        'network': network.stats(),
+        'maxrss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def compare(baseline_path, current_path):
+    baseline = benchutil.load_report(baseline_path)
+    current = benchutil.load_report(current_path)
+    if baseline['config'] != current['config']:
+        print("⚠️ Konfiguratsiyalar farq qiladi - natijalar to'g'ridan-to'g'ri solishtirilmaydi")
+
+    def flatten(report, key):
+        return {f"{size}/{service}": result[key]
+                for size, services in report['sizes'].items()
+                for service, result in services.items() if key in result}
+
+    benchutil.print_comparison("O'tish davomiyligi p95", benchutil.compare_rows(
+        flatten(baseline, 'pass_s'), flatten(current, 'pass_s'), 'p95_ms'))
+    benchutil.print_comparison("Soat siljishi p95", benchutil.compare_rows(
+        flatten(baseline, 'drift'), flatten(current, 'drift'), 'p95_ms'))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Soat/online xizmatlari benchmarki (soxta MTProto bilan)")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1000])
+    parser.add_argument('--services', nargs='+', choices=sorted(SERVICE_INTERVALS), default=['clock', 'online'])
+    parser.add_argument('--passes', type=int, default=1, help="har bir xizmat uchun o'tishlar soni")
+    parser.add_argument('--connect-latency', type=float, default=50, help="ulanish (start) vaqti, ms")
+    parser.add_argument('--call-latency', type=float, default=20, help="bitta so'rov vaqti, ms")
+    parser.add_argument('--jitter', type=float, default=0, help="qo'shimcha tasodifiy kechikish, ms")
+    parser.add_argument('--flood-rate', type=float, default=0, help="so'rovda FloodWait ehtimoli (0..1)")
+    parser.add_argument('--auth-fail-percent', type=int, default=0, help="bekor qilingan sessiyalar, %%")
+    parser.add_argument('--time-scale', type=float, default=1, help="kechikishlarni shuncha marta tezlashtirish")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('-o', '--output', default='-', help="JSON hisobot fayli ('-' - stdout)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help="ikki hisobotni solishtirish")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        # run() ishchi papkani o'zgartiradi
+        output = args.output if args.output == '-' else os.path.abspath(args.output)
+        benchutil.write_report(asyncio.run(run(args)), output)
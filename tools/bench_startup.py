@@ -0,0 +1,174 @@
+"""Bot ishga tushish vaqti: main.py importi va birinchi update gacha vaqt
+
+Har bir o'lchov yangi Python jarayonida:
+- import: `import main` davomiyligi, pyrogram yuklanganmi va -X importtime
+  bo'yicha eng og'ir modullar;
+- ishga tushish: lokal soxta Bot API (tools/fake_bot_api.py) ga ulangan
+  `python main.py` jarayoni boshlanishidan birinchi getUpdates gacha va
+  navbatdagi /start ga javob (sendMessage) gacha vaqt.
+
+Oldingi versiya bilan solishtirish uchun --root ga eski checkout beriladi:
+
+    git worktree add /tmp/before HEAD~1
+    python tools/bench_startup.py --root /tmp/before -o before.json
+    python tools/bench_startup.py -o after.json
+    python tools/bench_startup.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+import benchutil  # noqa: E402
+import fake_bot_api  # noqa: E402
+
+IMPORT_SNIPPET = (
+    "import sys, time; started = time.perf_counter(); import main; "
+    "print(time.perf_counter() - started, 'pyrogram' in sys.modules)"
+)
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def bot_environment(root, workdir, api_server=''):
+    env = dict(os.environ)
+    env.update({
+        'PYTHONPATH': root,
+        'PYTHONDONTWRITEBYTECODE': '1',
+        'BOT_TOKEN': '123456:' + 'A' * 35,
+        'DATABASE_FILE': os.path.join(workdir, 'startup.db'),
+        'METRICS_PORT': '0',
+        'TELEGRAM_API_SERVER': api_server,
+    })
+    return env
+
+
+def measure_import(root, runs):
+    """import main davomiyliklari va pyrogram yuklanganligi"""
+    seconds = []
+    pyrogram_loaded = False
+    with tempfile.TemporaryDirectory(prefix='bench_startup_') as workdir:
+        env = bot_environment(root, workdir)
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=workdir, env=env,
+                                    capture_output=True, text=True, check=True).stdout.split()
+            seconds.append(float(output[-2]))
+            pyrogram_loaded = output[-1] == 'True'
+    return seconds, pyrogram_loaded
+
+
+def heaviest_imports(root, limit):
+    """-X importtime bo'yicha eng ko'p vaqt olgan yuqori darajadagi importlar"""
+    with tempfile.TemporaryDirectory(prefix='bench_startup_') as workdir:
+        stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=workdir,
+                                env=bot_environment(root, workdir), capture_output=True, text=True).stderr
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # main ning bevosita importlari (bitta chekinish) - ichma-ich modullar ularning ichida
+        if match and len(match.group(3)) <= 3:
+            modules[match.group(4)] = int(match.group(2)) / 1000
+    ordered = sorted(modules.items(), key=lambda item: item[1], reverse=True)
+    return [{'module': name, 'cumulative_ms': ms} for name, ms in ordered[:limit]]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_update(update_id):
+    now = int(time.time())
+    user = {'id': 1080, 'is_bot': False, 'first_name': 'Startup'}
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': now, 'chat': {'id': 1080, 'type': 'private'},
+        'from': user, 'text': '/start',
+    }}
+
+
+async def measure_first_update(root, runs, timeout):
+    """python main.py boshlanishidan birinchi getUpdates va birinchi javob gacha vaqt"""
+    to_polling = []
+    to_first_update = []
+    for run in range(runs):
+        api = fake_bot_api.FakeBotApi()
+        port = free_port()
+        runner = await fake_bot_api.start(api, port=port)
+        api.updates.append(start_update(run + 1))
+        with tempfile.TemporaryDirectory(prefix='bench_startup_') as workdir:
+            started = time.perf_counter()
+            process = subprocess.Popen([sys.executable, os.path.join(root, 'main.py')], cwd=workdir,
+                                       env=bot_environment(root, workdir, f"http://127.0.0.1:{port}"),
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            polling = None
+            try:
+                while time.perf_counter() - started < timeout:
+                    if polling is None and api.stats.get('getUpdates:200'):
+                        polling = time.perf_counter() - started
+                    if api.stats.get('sendMessage:200'):
+                        to_polling.append(polling or time.perf_counter() - started)
+                        to_first_update.append(time.perf_counter() - started)
+                        break
+                    if process.poll() is not None:
+                        raise RuntimeError(f"main.py {process.returncode} kodi bilan to'xtadi")
+                    await asyncio.sleep(0.005)
+                else:
+                    raise RuntimeError(f"{timeout} s ichida /start ga javob kelmadi")
+            finally:
+                process.terminate()
+                process.wait()
+                await runner.cleanup()
+    return to_polling, to_first_update
+
+
+def run(args):
+    root = os.path.abspath(args.root)
+    import_seconds, pyrogram_loaded = measure_import(root, args.runs)
+    to_polling, to_first_update = asyncio.run(measure_first_update(root, args.runs, args.timeout))
+    return {
+        'tool': 'bench_startup',
+        'environment': benchutil.environment(),
+        'config': {'runs': args.runs},
+        'root': root,
+        'pyrogram_loaded_at_import': pyrogram_loaded,
+        'timings': {
+            'import_main': benchutil.latency_summary(import_seconds),
+            'time_to_polling': benchutil.latency_summary(to_polling),
+            'time_to_first_update': benchutil.latency_summary(to_first_update),
+        },
+        'heaviest_imports': heaviest_imports(root, args.top),
+    }
+
+
+def compare(baseline_path, current_path, metric):
+    baseline = benchutil.load_report(baseline_path)
+    current = benchutil.load_report(current_path)
+    print(f"pyrogram importda: {baseline['pyrogram_loaded_at_import']} -> {current['pyrogram_loaded_at_import']}")
+    benchutil.print_comparison(f"Ishga tushish ({metric})", benchutil.compare_rows(
+        baseline['timings'], current['timings'], metric))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bot ishga tushish vaqti benchmarki")
+    parser.add_argument('--root', default=os.path.dirname(TOOLS_DIR), help="o'lchanadigan loyiha papkasi")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=30, help="bitta ishga tushish uchun maksimal soniya")
+    parser.add_argument('--top', type=int, default=10, help="hisobotdagi eng og'ir importlar soni")
+    parser.add_argument('-o', '--output', default='-', help="JSON hisobot fayli ('-' - stdout)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'))
+    parser.add_argument('--metric', default='p50_ms', help="solishtirish ko'rsatkichi (p50_ms, mean_ms, max_ms)")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare, args.metric)
+    else:
+        benchutil.write_report(run(args), args.output)
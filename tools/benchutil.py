@@ -0,0 +1,85 @@
+"""Benchmark skriptlari uchun umumiy yordamchilar: percentil, JSON hisobot, solishtirish"""
+import json
+import platform
+import sqlite3
+import sys
+from datetime import datetime
+
+
+def percentile(values, q):
+    """Saralangan bo'lmagan ro'yxatdan q-percentil (0..100), chiziqli interpolyatsiya"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def latency_summary(seconds):
+    """Davomiyliklar ro'yxatidan ms dagi qisqa statistika"""
+    return {
+        'count': len(seconds),
+        'mean_ms': round(sum(seconds) / len(seconds) * 1000, 3) if seconds else 0.0,
+        'p50_ms': round(percentile(seconds, 50) * 1000, 3),
+        'p95_ms': round(percentile(seconds, 95) * 1000, 3),
+        'p99_ms': round(percentile(seconds, 99) * 1000, 3),
+        'max_ms': round(max(seconds) * 1000, 3) if seconds else 0.0,
+    }
+
+
+def environment():
+    """Natijalarni solishtirishda kerak bo'ladigan muhit ma'lumotlari"""
+    return {
+        'python': sys.version.split()[0],
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def write_report(report, path):
+    """Hisobotni JSON faylga (yoki path '-' bo'lsa stdout ga) yozish"""
+    text = json.dumps(report, indent=2, ensure_ascii=False, sort_keys=True)
+    if path == '-':
+        print(text)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_rows(baseline, current, metric):
+    """{nom: {metric: qiymat}} ko'rinishidagi ikki lug'atni solishtirish
+
+    [(nom, eski, yangi, o'zgarish %)] qaytaradi; o'zgarish eng kattasidan boshlab.
+    """
+    rows = []
+    for name in sorted(set(baseline) | set(current)):
+        old = baseline.get(name, {}).get(metric)
+        new = current.get(name, {}).get(metric)
+        if old is None or new is None:
+            change = None
+        elif old == 0:
+            change = 0.0 if new == 0 else float('inf')
+        else:
+            change = (new - old) / old * 100
+        rows.append((name, old, new, change))
+    rows.sort(key=lambda row: abs(row[3]) if row[3] is not None else -1, reverse=True)
+    return rows
+
+
+def print_comparison(title, rows, unit='ms'):
+    """compare_rows natijasini jadval ko'rinishida chiqarish"""
+    print(f"\n{title}")
+    width = max([len(str(row[0])) for row in rows] + [4])
+    for name, old, new, change in rows:
+        old_text = f"{old:.3f}" if isinstance(old, (int, float)) else '-'
+        new_text = f"{new:.3f}" if isinstance(new, (int, float)) else '-'
+        change_text = f"{change:+.1f}%" if change is not None else 'yangi/olib tashlangan'
+        print(f"  {str(name):<{width}}  {old_text:>12} -> {new_text:>12} {unit}  {change_text}")
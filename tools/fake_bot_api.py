@@ -0,0 +1,264 @@
+"""Lokal Bot API (Telegram o'rniga) - throughput ishlarini oflayn tekshirish uchun
+
+Bot ishlatadigan metodlar (getUpdates, sendMessage, copyMessage,
+getChatMember, getChat, getMe, sendDocument, editMessageText va
+yordamchilar) sozlanadigan kechikish, tasodifiy 429 (retry_after),
+bloklangan foydalanuvchilar (403) va chat/global tezlik chegaralari
+bilan javob beradi.
+
+    python tools/fake_bot_api.py --port 8081 --latency 40 --rate-429 0.01 --blocked-percent 5
+    TELEGRAM_API_SERVER=http://127.0.0.1:8081 python main.py
+
+GET /stats - metod va status bo'yicha hisoblagichlar (JSON);
+POST /updates - getUpdates navbatiga update (JSON obyekt yoki ro'yxat) qo'shish.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from aiohttp import web
+
+BOT_USER = {'id': 1000000001, 'is_bot': True, 'first_name': 'Fake Bot', 'username': 'fake_bot',
+            'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False}
+RATE_LIMITED_METHODS = {'sendMessage', 'copyMessage', 'sendDocument', 'editMessageText'}
+
+
+class TokenBucket:
+    """Soniyasiga rate ta so'rov, burst gacha yig'ilishi mumkin"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Token olish; bo'lmasa keyingi token uchun kutish soniyasi"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class FakeBotApi:
+    """Holat: sozlamalar, update navbati, chat chegaralari va statistika"""
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_429=0.0, retry_after=1, blocked_percent=0,
+                 member_percent=100, per_chat_rate=0.0, global_rate=0.0, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.blocked_percent = blocked_percent
+        self.member_percent = member_percent
+        self.per_chat_rate = per_chat_rate
+        self.global_bucket = TokenBucket(global_rate) if global_rate else None
+        self.chat_buckets = {}
+        self.rng = random.Random(seed)
+        self.updates = []
+        self.update_event = asyncio.Event()
+        self.message_id = 0
+        self.stats = defaultdict(int)
+
+    # ============ Yordamchilar ============
+
+    def is_blocked(self, chat_id):
+        """Foydalanuvchi botni bloklaganmi (chat ID bo'yicha deterministik)"""
+        return chat_id > 0 and chat_id % 100 < self.blocked_percent
+
+    def is_member(self, user_id):
+        return user_id % 100 < self.member_percent
+
+    def next_message(self, chat_id, **fields):
+        self.message_id += 1
+        chat_type = 'private' if chat_id > 0 else 'supergroup'
+        return {'message_id': self.message_id, 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': chat_type}, 'from': BOT_USER, **fields}
+
+    def rate_limited(self, method, chat_id):
+        """Tezlik chegarasi yoki tasodifiy 429; retry_after soniyasi yoki 0"""
+        if method not in RATE_LIMITED_METHODS:
+            return 0
+        if self.rate_429 and self.rng.random() < self.rate_429:
+            return self.retry_after
+        if self.global_bucket:
+            wait = self.global_bucket.take()
+            if wait:
+                return max(1, round(wait))
+        if self.per_chat_rate and chat_id is not None:
+            bucket = self.chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self.chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, burst=1)
+            wait = bucket.take()
+            if wait:
+                return max(1, round(wait))
+        return 0
+
+    # ============ Metodlar ============
+
+    async def get_updates(self, params):
+        offset = int(params.get('offset', 0) or 0)
+        timeout = float(params.get('timeout', 0) or 0)
+        limit = int(params.get('limit', 100) or 100)
+        self.updates = [update for update in self.updates if update['update_id'] >= offset]
+        if not self.updates and timeout:
+            self.update_event.clear()
+            try:
+                await asyncio.wait_for(self.update_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:limit]
+
+    def send_message(self, params):
+        chat_id = int(params['chat_id'])
+        return self.next_message(chat_id, text=params.get('text', ''))
+
+    def copy_message(self, params):
+        self.message_id += 1
+        return {'message_id': self.message_id}
+
+    def send_document(self, params):
+        chat_id = int(params['chat_id'])
+        # aiogram faylni alohida multipart maydonida yuboradi (document=attach://...)
+        document = next((value for value in params.values() if hasattr(value, 'filename')), None)
+        file_name = getattr(document, 'filename', None) or 'document'
+        return self.next_message(chat_id, caption=params.get('caption'), document={
+            'file_id': f"fake_{self.message_id + 1}", 'file_unique_id': f"u{self.message_id + 1}",
+            'file_name': file_name,
+        })
+
+    def edit_message_text(self, params):
+        if params.get('inline_message_id'):
+            return True
+        return {**self.next_message(int(params['chat_id']), text=params.get('text', '')),
+                'message_id': int(params['message_id']), 'edit_date': int(time.time())}
+
+    def get_chat_member(self, params):
+        user_id = int(params['user_id'])
+        status = 'member' if self.is_member(user_id) else 'left'
+        return {'status': status, 'user': {'id': user_id, 'is_bot': False, 'first_name': f"U{user_id}"}}
+
+    def get_chat(self, params):
+        chat_id = params['chat_id']
+        if str(chat_id).lstrip('-').isdigit():
+            chat_id = int(chat_id)
+            chat_type = 'private' if chat_id > 0 else 'channel'
+            return {'id': chat_id, 'type': chat_type, 'title': f"Chat {chat_id}"}
+        return {'id': -1009999999999, 'type': 'channel', 'title': chat_id, 'username': str(chat_id).lstrip('@')}
+
+    # ============ HTTP ============
+
+    async def handle_method(self, request):
+        method = request.match_info['method']
+        params = dict(await request.post())
+        for key, value in params.items():
+            # aiogram murakkab qiymatlarni JSON qatori sifatida yuboradi
+            if isinstance(value, str) and value[:1] in '[{':
+                try:
+                    params[key] = json.loads(value)
+                except ValueError:
+                    pass
+
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        chat_id = params.get('chat_id')
+        chat_id = int(chat_id) if chat_id is not None and str(chat_id).lstrip('-').isdigit() else None
+
+        retry_after = self.rate_limited(method, chat_id)
+        if retry_after:
+            return self.error(method, 429, f"Too Many Requests: retry after {retry_after}",
+                              parameters={'retry_after': retry_after})
+        if method in RATE_LIMITED_METHODS and chat_id is not None and self.is_blocked(chat_id):
+            return self.error(method, 403, "Forbidden: bot was blocked by the user")
+
+        handlers = {
+            'getMe': lambda p: BOT_USER,
+            'sendMessage': self.send_message,
+            'copyMessage': self.copy_message,
+            'sendDocument': self.send_document,
+            'editMessageText': self.edit_message_text,
+            'getChatMember': self.get_chat_member,
+            'getChat': self.get_chat,
+            'answerCallbackQuery': lambda p: True,
+            'deleteMessage': lambda p: True,
+            'deleteWebhook': lambda p: True,
+            'getWebhookInfo': lambda p: {'url': '', 'has_custom_certificate': False, 'pending_update_count': 0},
+        }
+        if method == 'getUpdates':
+            result = await self.get_updates(params)
+        elif method in handlers:
+            try:
+                result = handlers[method](params)
+            except (KeyError, ValueError) as e:
+                return self.error(method, 400, f"Bad Request: {e}")
+        else:
+            return self.error(method, 404, "Not Found: method not found")
+
+        self.stats[f"{method}:200"] += 1
+        return web.json_response({'ok': True, 'result': result})
+
+    def error(self, method, code, description, parameters=None):
+        self.stats[f"{method}:{code}"] += 1
+        body = {'ok': False, 'error_code': code, 'description': description}
+        if parameters:
+            body['parameters'] = parameters
+        return web.json_response(body, status=code)
+
+    async def handle_stats(self, request):
+        return web.json_response(dict(sorted(self.stats.items())))
+
+    async def handle_push_updates(self, request):
+        data = await request.json()
+        updates = data if isinstance(data, list) else [data]
+        self.updates.extend(updates)
+        self.update_event.set()
+        return web.json_response({'ok': True, 'queued': len(self.updates)})
+
+    def create_app(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get('/stats', self.handle_stats)
+        app.router.add_post('/updates', self.handle_push_updates)
+        app.router.add_route('*', '/bot{token}/{method}', self.handle_method)
+        return app
+
+
+async def start(api, host='127.0.0.1', port=8081):
+    """Serverni joriy event loop da ishga tushirish (benchmark skriptlari uchun)"""
+    runner = web.AppRunner(api.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokal soxta Telegram Bot API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=30, help="javob kechikishi, ms")
+    parser.add_argument('--jitter', type=float, default=0, help="qo'shimcha tasodifiy kechikish, ms")
+    parser.add_argument('--rate-429', type=float, default=0, help="tasodifiy 429 ehtimoli (0..1)")
+    parser.add_argument('--retry-after', type=int, default=1, help="429 javobidagi retry_after, s")
+    parser.add_argument('--blocked-percent', type=int, default=0, help="botni bloklagan foydalanuvchilar, %%")
+    parser.add_argument('--member-percent', type=int, default=100, help="kanal a'zolari (getChatMember), %%")
+    parser.add_argument('--per-chat-rate', type=float, default=1, help="bitta chatga soniyasiga xabar (0 - cheklovsiz)")
+    parser.add_argument('--global-rate', type=float, default=30, help="soniyasiga jami xabar (0 - cheklovsiz)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    fake = FakeBotApi(
+        latency=args.latency / 1000, jitter=args.jitter / 1000, rate_429=args.rate_429,
+        retry_after=args.retry_after, blocked_percent=args.blocked_percent,
+        member_percent=args.member_percent, per_chat_rate=args.per_chat_rate,
+        global_rate=args.global_rate, seed=args.seed,
+    )
+    print(f"{datetime.now():%H:%M:%S} Fake Bot API: http://{args.host}:{args.port}")
+    web.run_app(fake.create_app(), host=args.host, port=args.port, print=None)
@@ -0,0 +1,142 @@
+"""Soxta MTProto klienti - soat/online xizmatlarini real akkauntlarsiz sinash uchun
+
+FakeNetwork sozlanadigan ulanish va so'rov kechikishi, tasodifiy FloodWait
+va avtorizatsiya xatolari (AUTH_KEY_UNREGISTERED) bilan pyrogram.Client ning
+bot ishlatadigan qismini taqlid qiladi hamda statistikani yig'adi:
+
+    network = FakeNetwork(connect_latency=0.2, flood_rate=0.01)
+    mtproto.set_client_factory(network.create_client)
+"""
+import asyncio
+import random
+import time
+import zlib
+from collections import defaultdict
+
+from pyrogram.errors import FloodWait, AuthKeyUnregistered, PhoneCodeInvalid
+
+
+class FakeNetwork:
+    """Klientlar uchun umumiy sozlamalar va statistika"""
+
+    def __init__(self, connect_latency=0.0, call_latency=0.0, jitter=0.0, flood_rate=0.0,
+                 flood_seconds=5, auth_fail_percent=0, seed=1):
+        self.connect_latency = connect_latency
+        self.call_latency = call_latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.auth_fail_percent = auth_fail_percent
+        self.rng = random.Random(seed)
+        self.connects = 0
+        self.open_connections = 0
+        self.peak_connections = 0
+        self.calls = defaultdict(int)
+        self.errors = defaultdict(int)
+        # (klient nomi, yangi last_name, time.time()) - soat siljishini hisoblash uchun
+        self.profile_updates = []
+
+    def create_client(self, name, api_id, api_hash, session_string=None, **kwargs):
+        """mtproto.set_client_factory() uchun: pyrogram.Client bilan bir xil imzo"""
+        return FakeClient(self, name, session_string)
+
+    def is_revoked(self, session_string):
+        """Sessiya bekor qilinganmi (sessiya qatori bo'yicha deterministik)"""
+        return bool(session_string) and zlib.crc32(session_string.encode()) % 100 < self.auth_fail_percent
+
+    async def delay(self, base):
+        seconds = base + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+        if seconds:
+            await asyncio.sleep(seconds)
+
+    def stats(self):
+        return {
+            'connects': self.connects,
+            'peak_connections': self.peak_connections,
+            'calls': dict(sorted(self.calls.items())),
+            'errors': dict(sorted(self.errors.items())),
+        }
+
+
+class FakeClient:
+    """pyrogram.Client o'rnida: start/stop, get_me, update_profile, invoke va login metodlari"""
+
+    def __init__(self, network, name, session_string=None):
+        self.network = network
+        self.name = name
+        self.session_string = session_string
+        self.is_connected = False
+
+    async def connect(self):
+        network = self.network
+        await network.delay(network.connect_latency)
+        network.connects += 1
+        network.open_connections += 1
+        network.peak_connections = max(network.peak_connections, network.open_connections)
+        self.is_connected = True
+
+    async def disconnect(self):
+        if self.is_connected:
+            self.is_connected = False
+            self.network.open_connections -= 1
+
+    async def start(self):
+        await self.connect()
+        try:
+            if self.network.is_revoked(self.session_string):
+                self.network.errors['AUTH_KEY_UNREGISTERED'] += 1
+                raise AuthKeyUnregistered()
+        except Exception:
+            await self.disconnect()
+            raise
+        return self
+
+    async def stop(self):
+        await self.disconnect()
+        return self
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    async def _call(self, method):
+        network = self.network
+        if not self.is_connected:
+            raise ConnectionError("Client has not been started yet")
+        await network.delay(network.call_latency)
+        network.calls[method] += 1
+        if network.flood_rate and network.rng.random() < network.flood_rate:
+            network.errors['FLOOD_WAIT'] += 1
+            raise FloodWait(value=network.flood_seconds)
+
+    async def get_me(self):
+        await self._call('get_me')
+        return {'id': zlib.crc32(self.name.encode()), 'is_self': True}
+
+    async def update_profile(self, first_name=None, last_name=None, bio=None):
+        await self._call('update_profile')
+        self.network.profile_updates.append((self.name, last_name, time.time()))
+        return True
+
+    async def invoke(self, query, *args, **kwargs):
+        await self._call(type(query).__name__)
+        return True
+
+    async def send_code(self, phone_number):
+        await self._call('send_code')
+        return type('SentCode', (), {'phone_code_hash': 'fake_hash'})()
+
+    async def sign_in(self, phone_number, phone_code_hash, phone_code):
+        await self._call('sign_in')
+        if phone_code != '12345':
+            raise PhoneCodeInvalid()
+        return True
+
+    async def check_password(self, password):
+        await self._call('check_password')
+        return True
+
+    async def export_session_string(self):
+        return self.session_string or f"fake_session_{self.name}"
@@ -0,0 +1,295 @@
+"""Bot throughput benchmarki (Telegram ga ulanmasdan)
+
+Sintetik Update lar (/start ref_..., menyu tugmalari, callbacklar, join
+requestlar) dp.feed_update orqali handlerlarga beriladi. Bot sessiyasi
+stub bilan almashtiriladi: har bir API so'rovi --api-latency ms kutib,
+muvaffaqiyatli javob qaytaradi. Natija - JSON (throughput, handlerlar
+bo'yicha p50/p95/p99, DB vaqti ulushi, API so'rovlari).
+
+    python tools/loadtest.py --users 100000 --updates 5000 -o run.json
+    python tools/loadtest.py --compare base.json run.json
+    python tools/loadtest.py --updates 500 --trace traces.jsonl  # keyin tools/trace_summary.py
+"""
+import argparse
+import asyncio
+import inspect
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+import benchutil  # noqa: E402
+
+# Update turlari va ularning ulushi
+UPDATE_MIX = {
+    'start_referral': 25,
+    'start': 10,
+    'menu': 35,
+    'callback': 20,
+    'join_request': 10,
+}
+MENU_BUTTONS = ["🗂 Xizmatlar", "👥 Referal", "⬅️ Orqaga", "🆘 Qo'llab-quvvatlash"]
+CALLBACKS = ["check_subscription", "my_ref_stats", "withdraw_money"]
+BOT_USER_ID = 1000000001
+
+
+def prepare_environment(args):
+    """main import qilinishidan oldin muhit o'zgaruvchilari va ishchi papka"""
+    workdir = tempfile.mkdtemp(prefix='loadtest_')
+    os.environ.setdefault('BOT_TOKEN', '123456:' + 'A' * 35)
+    os.environ['DATABASE_FILE'] = os.path.abspath(args.db) if args.db else os.path.join(workdir, 'loadtest.db')
+    os.environ['METRICS_PORT'] = '0'
+    # Sintetik foydalanuvchilar tez-tez takrorlanadi - cheklov throughput o'lchovini buzmasin
+    os.environ.setdefault('THROTTLING', '0')
+    if args.trace:
+        os.environ['TRACING'] = '1'
+        os.environ['TRACE_SAMPLE_RATE'] = '1'
+        args.trace = os.path.abspath(args.trace)
+    os.chdir(workdir)
+    return os.environ['DATABASE_FILE']
+
+
+def make_stub_session(latency):
+    """Har bir so'rovga latency soniyadan keyin muvaffaqiyatli javob beruvchi sessiya"""
+    from aiogram.client.session.base import BaseSession
+    from aiogram import methods
+    from aiogram.types import Message, Chat, User, ChatMemberMember
+
+    bot_user = User(id=BOT_USER_ID, is_bot=True, first_name='Loadtest', username='loadtest_bot')
+
+    class StubSession(BaseSession):
+        async def make_request(self, bot, method, timeout=None):
+            if latency:
+                await asyncio.sleep(latency)
+            if isinstance(method, methods.GetMe):
+                return bot_user
+            if isinstance(method, methods.GetChatMember):
+                return ChatMemberMember(user=User(id=method.user_id, is_bot=False, first_name='U'))
+            if isinstance(method, methods.GetChat):
+                return Chat(id=int(method.chat_id) if str(method.chat_id).lstrip('-').isdigit() else 1, type='channel')
+            if method.__returning__ is Message:
+                chat_id = getattr(method, 'chat_id', None) or 1
+                return Message(message_id=1, date=datetime.now(), chat=Chat(id=int(chat_id), type='private'),
+                               text=getattr(method, 'text', None))
+            return True
+
+        async def close(self):
+            pass
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            yield b''
+
+    return StubSession()
+
+
+def generate_updates(count, user_ids, seed):
+    """Deterministik (seed bo'yicha) Update lar ro'yxati: [(turi, Update)]"""
+    from aiogram.types import Update, Message, CallbackQuery, Chat, User, ChatJoinRequest
+
+    rng = random.Random(seed)
+    kinds = list(UPDATE_MIX)
+    weights = list(UPDATE_MIX.values())
+    next_new_user = max(user_ids) + 1 if user_ids else 7000000000
+    now = datetime.now()
+    updates = []
+
+    def existing_user():
+        # Faol foydalanuvchilar ko'proq yangi ro'yxatdan o'tganlar orasida
+        return user_ids[int(len(user_ids) * (1 - rng.random() ** 2))] if user_ids else 1
+
+    for update_id in range(1, count + 1):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == 'start_referral':
+            user_id = next_new_user
+            next_new_user += 1
+            text = f"/start ref_{existing_user()}"
+        else:
+            user_id = existing_user()
+            text = "/start" if kind == 'start' else rng.choice(MENU_BUTTONS)
+
+        user = User(id=user_id, is_bot=False, first_name=f"U{user_id % 1000}", language_code='uz')
+        chat = Chat(id=user_id, type='private')
+        message = Message(message_id=update_id, date=now, chat=chat, from_user=user, text=text)
+
+        if kind == 'callback':
+            update = Update(update_id=update_id, callback_query=CallbackQuery(
+                id=str(update_id), from_user=user, chat_instance='loadtest', data=rng.choice(CALLBACKS),
+                message=Message(message_id=update_id, date=now, chat=chat, from_user=user, text='menu')
+            ))
+        elif kind == 'join_request':
+            update = Update(update_id=update_id, chat_join_request=ChatJoinRequest(
+                chat=Chat(id=-1001000000003, type='channel'), from_user=user, user_chat_id=user_id, date=now
+            ))
+        else:
+            update = Update(update_id=update_id, message=message)
+        updates.append((kind, update))
+    return updates
+
+
+class HandlerTimer:
+    """Inner middleware: handler nomi bo'yicha xom davomiyliklar"""
+
+    def __init__(self):
+        self.samples = {}
+
+    async def __call__(self, handler, event, data):
+        name = getattr(getattr(data.get('handler'), 'callback', None), '__name__', 'unknown')
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - start)
+
+
+class DbTimer:
+    """database funksiyalarining faqat eng tashqi chaqiruvlari vaqti (ichma-ich hisoblanmaydi)"""
+
+    def __init__(self, db):
+        self.total = 0.0
+        self.calls = 0
+        self._depth = 0
+        for name, func in list(vars(db).items()):
+            if (inspect.isfunction(func) and func.__module__ == db.__name__ and not name.startswith('_')
+                    and not inspect.isgeneratorfunction(inspect.unwrap(func))
+                    and name not in ('get_connection', 'write_lock')):
+                setattr(db, name, self._wrap(func))
+
+    def _wrap(self, func):
+        def wrapper(*args, **kwargs):
+            self._depth += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.total += time.perf_counter() - start
+                    self.calls += 1
+        wrapper.__wrapped__ = func
+        return wrapper
+
+
+async def run(args):
+    db_path = prepare_environment(args)
+
+    import synthetic_db
+    if not (args.db and args.reuse_db and os.path.exists(db_path)):
+        print(f"Sintetik baza: {args.users} foydalanuvchi -> {db_path}", file=sys.stderr)
+        user_ids = synthetic_db.build_database(db_path, args.users, args.seed)
+    else:
+        import sqlite3
+        conn = sqlite3.connect(db_path)
+        user_ids = [row[0] for row in conn.execute('SELECT user_id FROM users ORDER BY created_at, user_id')]
+        conn.close()
+
+    import main
+    import metrics
+    import database as db
+
+    main.bot.session = make_stub_session(args.api_latency / 1000)
+    main.bot.session.middleware(metrics.ApiMetricsMiddleware())
+    if args.trace:
+        import tracing
+        main.bot.session.middleware(tracing.ApiTracingMiddleware())
+        tracing.start_exporter(args.trace)
+    db.init_database()
+
+    handler_timer = HandlerTimer()
+    for observer in (main.router.message, main.router.callback_query, main.router.chat_join_request):
+        observer.middleware(handler_timer)
+    db_timer = DbTimer(db)
+
+    updates = generate_updates(args.updates, user_ids, args.seed)
+    queue = asyncio.Queue()
+    for item in updates:
+        queue.put_nowait(item)
+    latencies = {}
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            kind, update = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                await main.dp.feed_update(main.bot, update)
+            except Exception:
+                errors += 1
+            latencies.setdefault(kind, []).append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    if args.trace:
+        tracing.stop_exporter()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    api_calls = {}
+    for (method, status), count in metrics.api_requests_total.snapshot().items():
+        api_calls[f"{method}:{status}"] = count
+
+    return {
+        'tool': 'loadtest',
+        'environment': benchutil.environment(),
+        'config': {
+            'users': len(user_ids),
+            'updates': args.updates,
+            'concurrency': args.concurrency,
+            'api_latency_ms': args.api_latency,
+            'seed': args.seed,
+            'mix': UPDATE_MIX,
+        },
+        'elapsed_s': round(elapsed, 3),
+        'throughput_ups': round(len(all_latencies) / elapsed, 2),
+        'errors': errors,
+        'latency': benchutil.latency_summary(all_latencies),
+        'update_kinds': {kind: benchutil.latency_summary(values) for kind, values in latencies.items()},
+        'handlers': {name: benchutil.latency_summary(values) for name, values in handler_timer.samples.items()},
+        'db': {
+            'calls': db_timer.calls,
+            'time_s': round(db_timer.total, 3),
+            'time_share': round(db_timer.total / elapsed, 4),
+        },
+        'api_calls': api_calls,
+    }
+
+
+def compare(baseline_path, current_path):
+    baseline = benchutil.load_report(baseline_path)
+    current = benchutil.load_report(current_path)
+    if baseline['config'] != current['config']:
+        print("⚠️ Konfiguratsiyalar farq qiladi - natijalar to'g'ridan-to'g'ri solishtirilmaydi")
+    print(f"Throughput: {baseline['throughput_ups']} -> {current['throughput_ups']} update/s")
+    print(f"DB ulushi: {baseline['db']['time_share']:.1%} -> {current['db']['time_share']:.1%}")
+    benchutil.print_comparison("Handlerlar p95", benchutil.compare_rows(
+        baseline['handlers'], current['handlers'], 'p95_ms'))
+    benchutil.print_comparison("Update turlari p95", benchutil.compare_rows(
+        baseline['update_kinds'], current['update_kinds'], 'p95_ms'))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bot handlerlari uchun yuklama testi")
+    parser.add_argument('--users', type=int, default=10000, help="sintetik bazadagi foydalanuvchilar")
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50, help="bir vaqtda qayta ishlanadigan updatelar")
+    parser.add_argument('--api-latency', type=float, default=30, help="stub Bot API javob vaqti, ms")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--db', help="baza fayli (berilmasa vaqtinchalik)")
+    parser.add_argument('--reuse-db', action='store_true', help="--db mavjud bo'lsa qayta yaratmaslik")
+    parser.add_argument('--trace', metavar='FILE', help="barcha updatelar tracelarini shu faylga yozish")
+    parser.add_argument('-o', '--output', default='-', help="JSON hisobot fayli ('-' - stdout)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help="ikki hisobotni solishtirish")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        # run() ishchi papkani o'zgartiradi
+        output = args.output if args.output == '-' else os.path.abspath(args.output)
+        benchutil.write_report(asyncio.run(run(args)), output)
@@ -0,0 +1,198 @@
+"""Benchmark uchun sintetik SQLite baza
+
+Foydalanuvchilar, referallar, tarix, join requestlar, sessiyalar va pul
+yechish so'rovlari real taqsimotlarga yaqin holda yaratiladi:
+- ro'yxatdan o'tish vaqti oxirgi yilga, yangi kunlarga zichroq;
+- referallarni oz sonli faol foydalanuvchilar ko'p keltiradi (power-law);
+- pul yechish faqat yetarli balansi borlarda, ko'pi tasdiqlangan.
+
+    python tools/synthetic_db.py --users 100000 -o bench.db
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db  # noqa: E402
+from config import REFERRAL_REWARD, MIN_WITHDRAWAL, REQUIRED_REFERRALS  # noqa: E402
+
+FIRST_NAMES = ['Ali', 'Vali', 'Aziz', 'Dilshod', 'Jasur', 'Malika', 'Nilufar', 'Sardor', 'Shahnoza', 'Bekzod']
+LANGUAGES = ['uz'] * 6 + ['ru'] * 3 + ['en']
+BATCH = 10000
+
+# Sintetik kanallar: (channel_id, username, title, is_request, is_bot)
+CHANNELS = [
+    ('-1001000000001', '@bench_channel_1', 'Bench kanal 1', 0, 0),
+    ('-1001000000002', '@bench_channel_2', 'Bench kanal 2', 0, 0),
+    ('-1001000000003', '', "Bench so'rovli kanal", 1, 0),
+    ('@bench_bot', '@bench_bot', 'Bench bot', 0, 1),
+]
+FIRST_USER_ID = 5000000000
+
+
+def _ts(moment):
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _batched(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(cursor, sql, rows):
+    for batch in _batched(rows):
+        cursor.executemany(sql, batch)
+
+
+def build_database(path, users, seed=1, now=None):
+    """path da users ta foydalanuvchili baza yaratish; mavjud fayl o'chiriladi
+
+    Yuklash vaqtida triggerlar o'chiriladi, oxirida migrate() ularni qayta
+    yaratadi va hisoblagichlar/rollup larni to'liq qayta hisoblaydi.
+    """
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    rng = random.Random(seed)
+    now = now or datetime.now().replace(microsecond=0)
+    db.DATABASE_FILE = path
+    db.init_database()
+
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA synchronous=OFF')
+    for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+        cursor.execute(f"DROP TRIGGER {row['name']}")
+
+    # Ro'yxatdan o'tish vaqti: oxirgi 365 kun, yangi kunlarga zichroq; ID lar vaqt bilan o'sadi
+    offsets = sorted((365 * 86400 * (1 - rng.random() ** 0.5) for _ in range(users)), reverse=True)
+    created = [now - timedelta(seconds=int(offset)) for offset in offsets]
+    user_ids = []
+    next_id = FIRST_USER_ID
+    for _ in range(users):
+        next_id += rng.randint(1, 2000)
+        user_ids.append(next_id)
+
+    def user_rows():
+        for user_id, moment in zip(user_ids, created):
+            username = f"user{user_id}" if rng.random() < 0.6 else ''
+            yield (user_id, rng.choice(FIRST_NAMES), '', username, rng.choice(LANGUAGES),
+                   1 if rng.random() < 0.07 else 0, 1 if rng.random() < 0.97 else 0, _ts(moment), _ts(moment))
+
+    _insert(cursor, '''
+        INSERT INTO users (user_id, first_name, last_name, username, language_code,
+                           is_premium, is_reachable, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', user_rows())
+
+    # Referallar: 40% foydalanuvchi taklif orqali keladi, taklif qiluvchi - oldingi foydalanuvchilardan
+    # biri, r**3 tufayli erta (faol) foydalanuvchilar ko'p referal keltiradi
+    referral_counts = {}
+
+    def referral_rows():
+        for i in range(1, users):
+            if rng.random() >= 0.4:
+                continue
+            referrer = user_ids[int(i * rng.random() ** 3)]
+            referral_counts[referrer] = referral_counts.get(referrer, 0) + 1
+            yield referrer, user_ids[i], _ts(created[i])
+
+    _insert(cursor, 'INSERT INTO referrals (referrer_id, referred_id, joined_at) VALUES (?, ?, ?)', referral_rows())
+    cursor.execute('''
+        UPDATE users SET referral_count = (SELECT COUNT(*) FROM referrals WHERE referrer_id = users.user_id)
+    ''')
+    cursor.execute('UPDATE users SET services_unlocked = referral_count >= ?', (REQUIRED_REFERRALS,))
+
+    # Balans va pul yechish so'rovlari
+    withdrawal_rows = []
+    balance_rows = []
+    for user_id, count in referral_counts.items():
+        earned = count * REFERRAL_REWARD
+        withdrawn = 0
+        while earned - withdrawn >= MIN_WITHDRAWAL and rng.random() < 0.6:
+            amount = rng.randint(MIN_WITHDRAWAL, earned - withdrawn) // 1000 * 1000
+            moment = now - timedelta(seconds=rng.randint(0, 60 * 86400))
+            roll = rng.random()
+            status = 'approved' if roll < 0.7 else 'rejected' if roll < 0.85 else 'pending'
+            processed = moment + timedelta(hours=rng.randint(1, 48)) if status != 'pending' else None
+            withdrawal_rows.append((user_id, amount, '8600 0000 0000 0000', status, moment.isoformat(),
+                                    processed.isoformat() if processed else None))
+            if status != 'rejected':
+                withdrawn += amount
+        balance_rows.append((user_id, earned - withdrawn, earned, withdrawn, now.isoformat()))
+
+    _insert(cursor, '''
+        INSERT INTO balances (user_id, balance, total_earned, total_withdrawn, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', balance_rows)
+    withdrawal_rows.sort(key=lambda row: row[4])
+    _insert(cursor, '''
+        INSERT INTO withdrawals (user_id, amount, card_number, status, created_at, processed_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', withdrawal_rows)
+
+    # Profil o'zgarishlari tarixi: ko'pchilikda yo'q, ba'zilarda bir nechta
+    def history_rows():
+        for user_id, moment in zip(user_ids, created):
+            changes = 0
+            while rng.random() < 0.3 and changes < 10:
+                changes += 1
+                field = rng.choice(('first_name', 'last_name', 'username'))
+                yield (user_id, field, 'old', 'new',
+                       _ts(moment + timedelta(seconds=rng.randint(0, max(1, int((now - moment).total_seconds()))))))
+
+    _insert(cursor, '''
+        INSERT INTO user_history (user_id, field_name, old_value, new_value, changed_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', history_rows())
+
+    cursor.executemany('''
+        INSERT INTO channels (channel_id, channel_username, channel_title, is_active, is_request_channel, is_bot, added_at)
+        VALUES (?, ?, ?, 1, ?, ?, ?)
+    ''', [(*channel, _ts(now)) for channel in CHANNELS])
+
+    _insert(cursor, 'INSERT INTO join_requests (user_id, channel_id, requested_at) VALUES (?, ?, ?)', (
+        (user_id, CHANNELS[2][0], _ts(moment))
+        for user_id, moment in zip(user_ids, created) if rng.random() < 0.3
+    ))
+    _insert(cursor, 'INSERT INTO bot_started (user_id, bot_username, started_at) VALUES (?, ?, ?)', (
+        (user_id, CHANNELS[3][1], _ts(moment))
+        for user_id, moment in zip(user_ids, created) if rng.random() < 0.2
+    ))
+    _insert(cursor, '''
+        INSERT INTO user_sessions (user_id, api_id, api_hash, phone_number, session_string, is_active,
+                                   online_enabled, clock_enabled, created_at, updated_at)
+        VALUES (?, '12345', 'hash', '+998900000000', 'session', 1, ?, ?, ?, ?)
+    ''', (
+        (user_id, 1 if rng.random() < 0.5 else 0, 1 if rng.random() < 0.5 else 0, _ts(moment), _ts(moment))
+        for user_id, moment in zip(user_ids, created) if rng.random() < 0.02
+    ))
+
+    # Triggerlar va hisoblagichlarni qayta yaratish
+    cursor.execute('DELETE FROM stats_counters')
+    cursor.execute('DELETE FROM daily_rollups')
+    conn.commit()
+    db.migrate(conn)
+    conn.commit()
+    conn.close()
+    return user_ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sintetik benchmark bazasini yaratish")
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('-o', '--output', default='bench.db')
+    args = parser.parse_args()
+    build_database(args.output, args.users, args.seed)
+    print(f"{args.output}: {args.users} foydalanuvchi")
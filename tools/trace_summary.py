@@ -0,0 +1,157 @@
+"""tracing.py yozgan JSONL tracelar bo'yicha qisqa hisobot
+
+Handlerlar bo'yicha: tracelar soni, p50/p95/max davomiylik va vaqtning
+DB, Bot API va MTProto spanlari orasida taqsimlanishi (o'rtacha ms).
+So'ng eng sekin tracelar span daraxti bilan chiqariladi. Aylantirilgan
+fayllar (traces.jsonl.1, .2, ...) ham o'qiladi.
+
+    python tools/trace_summary.py
+    python tools/trace_summary.py traces/traces.jsonl --handler cmd_start --top 5
+    python tools/trace_summary.py --trace 3f2a9c1d0b7e4a55
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from collections import defaultdict
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TOOLS_DIR)
+
+import benchutil  # noqa: E402
+
+DEFAULT_FILE = os.getenv("TRACE_FILE", "traces/traces.jsonl")
+SPAN_KINDS = ('db', 'api', 'mtproto')
+TRACE_MAX_LINES = 1000
+
+
+def trace_files(path):
+    """Asosiy fayl va uning aylantirilgan nusxalari (eskisidan yangisiga)"""
+    rotated = sorted(glob.glob(f"{glob.escape(path)}.[0-9]*"), key=lambda name: -int(name.rsplit('.', 1)[1]))
+    return rotated + ([path] if os.path.exists(path) else [])
+
+
+def load_traces(path, since=None):
+    traces = []
+    for name in trace_files(path):
+        with open(name, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    trace = json.loads(line)
+                except ValueError:
+                    # Aylantirish paytida kesilib qolgan qator
+                    continue
+                if since and trace['start'] < since:
+                    continue
+                traces.append(trace)
+    return traces
+
+
+def handler_of(trace):
+    return trace.get('handler') or trace['name']
+
+
+def kind_totals(trace):
+    """Har bir tur bo'yicha o'z vaqti (ichma-ich bir xil turdagi spanlar ikki marta sanalmaydi)"""
+    spans = {span['id']: span for span in trace['spans']}
+    totals = dict.fromkeys(SPAN_KINDS, 0.0)
+    for span in trace['spans']:
+        if span['kind'] not in totals:
+            continue
+        parent = spans.get(span['parent'])
+        while parent is not None and parent['kind'] != span['kind']:
+            parent = spans.get(parent['parent'])
+        if parent is None:
+            totals[span['kind']] += span['duration_ms']
+    return totals
+
+
+def summarize(traces):
+    """{handler: {count, p50_ms, p95_ms, max_ms, db_ms, api_ms, mtproto_ms, errors}}"""
+    groups = defaultdict(list)
+    for trace in traces:
+        groups[handler_of(trace)].append(trace)
+
+    rows = {}
+    for handler, items in groups.items():
+        latency = benchutil.latency_summary([trace['duration_ms'] / 1000 for trace in items])
+        totals = [kind_totals(trace) for trace in items]
+        rows[handler] = {
+            'count': len(items),
+            'p50_ms': latency['p50_ms'],
+            'p95_ms': latency['p95_ms'],
+            'max_ms': latency['max_ms'],
+            **{f"{kind}_ms": round(sum(t[kind] for t in totals) / len(items), 1) for kind in SPAN_KINDS},
+            'errors': sum(1 for trace in items if trace['status'] != 'ok'),
+        }
+    return dict(sorted(rows.items(), key=lambda item: -item[1]['p95_ms']))
+
+
+def format_tree(trace, limit=60):
+    """Span daraxti: boshlanish (ms), davomiylik, nom; limit qatordan keyin qisqartiriladi"""
+    children = defaultdict(list)
+    for span in trace['spans']:
+        children[span['parent']].append(span)
+    lines = []
+
+    def walk(parent, depth):
+        for span in sorted(children[parent], key=lambda s: s['start_ms']):
+            if len(lines) >= limit:
+                return
+            error = f"  !{span['error']}" if 'error' in span else ''
+            lines.append(f"  {span['start_ms']:>9.1f} {span['duration_ms']:>9.1f} ms  {'  ' * depth}{span['name']}{error}")
+            walk(span['id'], depth + 1)
+
+    walk(0, 0)
+    hidden = len(trace['spans']) - len(lines) + trace.get('dropped_spans', 0)
+    if hidden > 0:
+        lines.append(f"  ... yana {hidden} span")
+    return '\n'.join(lines)
+
+
+def print_report(traces, top):
+    summary = summarize(traces)
+    print(f"{len(traces)} trace\n")
+    print(f"{'handler':32} {'soni':>6} {'p50':>8} {'p95':>8} {'max':>8} {'db':>7} {'api':>7} {'mtproto':>8} {'xato':>5}")
+    for handler, row in summary.items():
+        print(f"{handler[:32]:32} {row['count']:>6} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['max_ms']:>8.1f} "
+              f"{row['db_ms']:>7.1f} {row['api_ms']:>7.1f} {row['mtproto_ms']:>8.1f} {row['errors']:>5}")
+
+    if top:
+        print(f"\nEng sekin {top} trace:")
+        for trace in sorted(traces, key=lambda t: -t['duration_ms'])[:top]:
+            print_trace(trace)
+
+
+def print_trace(trace, limit=60):
+    print(f"\n{trace['trace_id']}  {trace['start']}  {handler_of(trace)}  {trace['duration_ms']:.1f} ms  "
+          f"[{trace['status']}, {trace['sampled_by']}]  user={trace.get('user_id')}")
+    print(format_tree(trace, limit))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tracelar bo'yicha handlerlar va eng sekin updatelar hisoboti")
+    parser.add_argument('path', nargs='?', default=DEFAULT_FILE, help="trace fayli (aylantirilganlari ham o'qiladi)")
+    parser.add_argument('--handler', help="faqat shu handler tracelari")
+    parser.add_argument('--since', help="shu vaqtdan keyingilar (ISO, masalan 2024-05-01T12:00)")
+    parser.add_argument('--top', type=int, default=10, help="eng sekin tracelar soni")
+    parser.add_argument('--trace', help="bitta trace ni trace_id bo'yicha to'liq chiqarish")
+    parser.add_argument('--json', action='store_true', help="handlerlar jadvalini JSON ko'rinishida")
+    args = parser.parse_args()
+
+    traces = load_traces(args.path, args.since)
+    if args.handler:
+        traces = [trace for trace in traces if handler_of(trace) == args.handler]
+    if not traces:
+        sys.exit(f"Trace topilmadi: {args.path}")
+
+    if args.trace:
+        found = [trace for trace in traces if trace['trace_id'] == args.trace]
+        if not found:
+            sys.exit(f"Trace topilmadi: {args.trace}")
+        print_trace(found[0], limit=TRACE_MAX_LINES)
+    elif args.json:
+        print(json.dumps(summarize(traces), indent=2, ensure_ascii=False))
+    else:
+        print_report(traces, args.top)
@@ -0,0 +1,273 @@
+"""Updatelar uchun yengil tracing: spanlar va lokal JSONL eksport
+
+Har bir update uchun outer middleware root span ochadi; handler, database.py
+funksiyalari, Bot API so'rovlari va MTProto (pyrogram) chaqiruvlari uning
+ichida child span sifatida yoziladi. Joriy span contextvars orqali
+uzatiladi, shuning uchun asyncio.to_thread ichidagi DB chaqiruvlari ham
+to'g'ri update ga tushadi. Trace ochiq bo'lmasa wrapperlar faqat bitta
+ContextVar.get() qiladi.
+
+Update tugagach trace quyidagi hollarda TRACE_FILE ga bitta JSON qator
+bo'lib yoziladi: TRACE_SAMPLE_RATE ulushi (tasodifiy), TRACE_SLOW_MS dan
+sekin yoki xato bilan tugagan updatelar (doim). Fayl QueueListener
+threadida yoziladi va TRACE_FILE_MAX_MB da aylantiriladi.
+
+    python tools/trace_summary.py --top 10
+"""
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+import mtproto
+from config import (
+    TRACE_SAMPLE_RATE, TRACE_SLOW_MS, TRACE_MAX_SPANS, TRACE_FILE, TRACE_FILE_MAX_MB, TRACE_FILE_BACKUPS
+)
+
+logger = logging.getLogger(__name__)
+
+# (trace, ota span id) - joriy update konteksti
+_current = contextvars.ContextVar('trace_span', default=None)
+
+_exporter = logging.getLogger('tracing.export')
+_exporter.propagate = False
+_listener = None
+
+MTPROTO_TRACED = ('connect', 'disconnect', 'start', 'stop', 'invoke')
+
+
+class Trace:
+    """Bitta update davomida yig'ilgan spanlar"""
+    __slots__ = ('trace_id', 'name', 'attrs', 'started_at', 'started', 'spans', 'dropped', '_ids', 'finished')
+
+    def __init__(self, name, **attrs):
+        self.trace_id = f"{random.getrandbits(64):016x}"
+        self.name = name
+        self.attrs = attrs
+        self.started_at = datetime.now().isoformat(timespec='milliseconds')
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self._ids = itertools.count(1)
+        self.finished = False
+
+    def add_span(self, span_id, parent, name, kind, started, error, attrs):
+        # Update tugagandan keyin ishlayotgan tasklar (create_task) spanlari tashlanadi
+        if self.finished or len(self.spans) >= TRACE_MAX_SPANS:
+            self.dropped += 1
+            return
+        span = {
+            'id': span_id, 'parent': parent, 'name': name, 'kind': kind,
+            'start_ms': round((started - self.started) * 1000, 3),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+        }
+        if error:
+            span['error'] = error
+        if attrs:
+            span['attrs'] = attrs
+        self.spans.append(span)
+
+    def to_dict(self, duration, status, sampled_by):
+        return {
+            'trace_id': self.trace_id, 'name': self.name, 'start': self.started_at,
+            'duration_ms': round(duration * 1000, 3), 'status': status, 'sampled_by': sampled_by,
+            **self.attrs, 'spans': self.spans, 'dropped_spans': self.dropped,
+        }
+
+
+def current_trace():
+    context = _current.get()
+    return context[0] if context else None
+
+
+@contextmanager
+def span(name, kind='internal', **attrs):
+    """Joriy trace ichida child span (trace yo'q bo'lsa hech narsa qilmaydi)"""
+    context = _current.get()
+    if context is None:
+        yield None
+        return
+    trace, parent = context
+    span_id = next(trace._ids)
+    token = _current.set((trace, span_id))
+    started = time.perf_counter()
+    error = None
+    try:
+        yield trace
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        trace.add_span(span_id, parent, name, kind, started, error, attrs)
+
+
+def _sampled_by(duration, status):
+    if status != 'ok':
+        return 'error'
+    if duration * 1000 >= TRACE_SLOW_MS:
+        return 'slow'
+    if random.random() < TRACE_SAMPLE_RATE:
+        return 'rate'
+    return None
+
+
+async def trace_root(name, func, **attrs):
+    """func() ni yangi trace ichida bajarish; tanlansa eksport qilish"""
+    trace = Trace(name, **attrs)
+    token = _current.set((trace, 0))
+    status = 'ok'
+    try:
+        return await func()
+    except BaseException as e:
+        status = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        trace.finished = True
+        duration = time.perf_counter() - trace.started
+        sampled_by = _sampled_by(duration, status)
+        if sampled_by and _listener is not None:
+            _exporter.info(json.dumps(trace.to_dict(duration, status, sampled_by), ensure_ascii=False, default=str))
+
+
+# ============ Aiogram ============
+
+class UpdateTracingMiddleware(BaseMiddleware):
+    """Outer middleware: har bir update uchun root span"""
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        return await trace_root(
+            f"update.{event.event_type}", lambda: handler(event, data),
+            update_id=event.update_id, event=event.event_type, user_id=user.id if user else None,
+        )
+
+
+class HandlerTracingMiddleware(BaseMiddleware):
+    """Inner middleware: handler nomini trace ga yozish va handler spani"""
+
+    async def __call__(self, handler, event, data):
+        trace = current_trace()
+        if trace is None:
+            return await handler(event, data)
+        name = getattr(getattr(data.get('handler'), 'callback', None), '__name__', 'unknown')
+        trace.attrs['handler'] = name
+        with span(f"handler.{name}", 'handler'):
+            return await handler(event, data)
+
+
+class ApiTracingMiddleware(BaseRequestMiddleware):
+    """Bot sessiyasi middleware: har bir Bot API so'rovi uchun span"""
+
+    async def __call__(self, make_request, bot, method):
+        if _current.get() is None:
+            return await make_request(bot, method)
+        with span(f"api.{getattr(method, '__api_method__', type(method).__name__)}", 'api'):
+            return await make_request(bot, method)
+
+
+# ============ Database va MTProto ============
+
+def _traced_db_call(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current.get() is None:
+            return func(*args, **kwargs)
+        with span(f"db.{name}", 'db'):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def setup_database(db, skip=()):
+    """database modulidagi ochiq funksiyalarni span yozuvchi wrapper bilan almashtirish"""
+    for name, func in list(vars(db).items()):
+        if (name.startswith('_') or name in skip or not inspect.isfunction(func)
+                or getattr(func, '__module__', None) != db.__name__ or inspect.isgeneratorfunction(func)):
+            continue
+        setattr(db, name, _traced_db_call(name, func))
+
+
+def _query_name(query):
+    """pyrogram raw funksiyasi nomi: 'functions.account.UpdateStatus' -> 'account.UpdateStatus'"""
+    qualname = getattr(query, 'QUALNAME', type(query).__name__)
+    return qualname.removeprefix('functions.')
+
+
+def _traced_client_method(name, method):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        if _current.get() is None:
+            return await method(*args, **kwargs)
+        span_name = f"mtproto.{_query_name(args[0])}" if name == 'invoke' and args else f"mtproto.{name}"
+        with span(span_name, 'mtproto'):
+            return await method(*args, **kwargs)
+    return wrapper
+
+
+def trace_client(client):
+    """mtproto.create_client hooki: klient metodlarini instance darajasida o'rash
+
+    pyrogram ning yuqori darajadagi metodlari (send_code, get_me, ...) self.invoke
+    orqali ishlagani uchun ular ham RPC nomi bilan ko'rinadi.
+    """
+    for name in MTPROTO_TRACED:
+        method = getattr(client, name, None)
+        if method is not None:
+            setattr(client, name, _traced_client_method(name, method))
+    return client
+
+
+# ============ Eksport ============
+
+def start_exporter(path=TRACE_FILE):
+    """Aylanuvchi JSONL faylga yozuvchi QueueListener threadini ishga tushirish"""
+    global _listener
+    if _listener is not None:
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=TRACE_FILE_MAX_MB * 1024 * 1024, backupCount=TRACE_FILE_BACKUPS, encoding='utf-8'
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    records = queue.SimpleQueue()
+    _exporter.addHandler(logging.handlers.QueueHandler(records))
+    _exporter.setLevel(logging.INFO)
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    logger.info(f"Tracing: {path} (sample {TRACE_SAMPLE_RATE}, sekin ≥{TRACE_SLOW_MS} ms)")
+
+
+def stop_exporter():
+    """Navbatdagi tracelarni yozib, threadni to'xtatish (shutdown hook)"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _exporter.handlers.clear()
+    _listener = None
+
+
+def setup(dp, router, bot, db, db_skip=()):
+    """Middleware lar, DB wrapperlari va MTProto hookini ulash (eksport - start_exporter)"""
+    dp.update.outer_middleware(UpdateTracingMiddleware())
+    router.message.middleware(HandlerTracingMiddleware())
+    router.callback_query.middleware(HandlerTracingMiddleware())
+    router.chat_join_request.middleware(HandlerTracingMiddleware())
+    bot.session.middleware(ApiTracingMiddleware())
+    setup_database(db, db_skip)
+    mtproto.add_client_hook(trace_client)
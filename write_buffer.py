@@ -0,0 +1,167 @@
+"""Write-behind bufer: ko'p sonli mayda yozuvlarni bitta tranzaksiyaga yig'ish
+
+Masalan so'rovli kanal reklama qilinganda soniyalar ichida minglab join
+request keladi; har biri alohida commit (fsync) qilinmasligi uchun yozuvlar
+xotirada kalit bo'yicha birlashtiriladi va har WRITE_BUFFER_MAX_DELAY_MS
+yoki WRITE_BUFFER_MAX_ROWS qatorda executemany bilan bitta tranzaksiyada
+yoziladi. contains()/discard() orqali hali yozilmagan qatorlar - shu
+jumladan yozilayotgan (inflight) partiya ham - ko'rinadi (read-your-writes).
+
+run_flusher() ishlamayotgan bo'lsa (skriptlar, benchmarklar) buferlash
+o'chiq - har bir yozuv darhol yoziladi.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from config import WRITE_BUFFER_MAX_ROWS, WRITE_BUFFER_MAX_DELAY_MS
+
+logger = logging.getLogger(__name__)
+
+_buffers = []
+
+
+class WriteBuffer:
+    """Bitta jadval uchun bufer: kalit -> SQL parametrlari"""
+
+    def __init__(self, name, sql, delete_sql, connect, max_rows=WRITE_BUFFER_MAX_ROWS, keep='last'):
+        """sql - bitta qator uchun INSERT/UPSERT; delete_sql - kalit bo'yicha DELETE;
+        connect() - sqlite3 ulanishi
+
+        keep='last' - bir kalitga qayta yozuv oldingisini almashtiradi (UPSERT),
+        keep='first' - birinchisi qoladi (INSERT OR IGNORE).
+        """
+        self.name = name
+        self.sql = sql
+        self.delete_sql = delete_sql
+        self.connect = connect
+        self.max_rows = max_rows
+        self.keep = keep
+        self.pending = {}
+        self.inflight = {}  # flush() yozayotgan partiya (commit bo'lguncha)
+        self.discarded = set()  # yozish paytida bekor qilingan inflight kalitlar
+        self.flushed_rows = 0
+        self.flushes = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # flush() lar ketma-ket (flush_all() yozilayotgan partiyani ham kutadi)
+        self._loop = None
+        self._full = None
+        _buffers.append(self)
+
+    @property
+    def enabled(self):
+        return self._loop is not None
+
+    def add(self, key, params):
+        """Yozuvni buferga qo'shish (flusher ishlamasa - darhol yozish)"""
+        if not self.enabled:
+            self._write([params])
+            return
+        with self._lock:
+            if self.keep == 'last' or key not in self.pending:
+                self.pending[key] = params
+            full = len(self.pending) >= self.max_rows
+        if full:
+            self._loop.call_soon_threadsafe(self._full.set)
+
+    def contains(self, key):
+        """Kalit buferda (hali yozilmagan yoki yozilayotgan) bormi"""
+        with self._lock:
+            return key in self.pending or (key in self.inflight and key not in self.discarded)
+
+    def discard(self, key):
+        """Yozilmagan yozuvni bekor qilish (DELETE dan oldin)
+
+        Kalit yozilayotgan partiyada bo'lsa, flush() uning qatorini partiya
+        bilan bitta tranzaksiyada o'chiradi (delete_sql) - aks holda chaqiruvchining
+        DELETE i commit dan oldin bajarilib, qator qayta paydo bo'lardi.
+        """
+        with self._lock:
+            self.pending.pop(key, None)
+            if key in self.inflight:
+                self.discarded.add(key)
+
+    def _write(self, rows, tombstones=False):
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany(self.sql, rows)
+                if tombstones:
+                    # Yozish qulfi shu tranzaksiyada: bundan keyingi discard() larning
+                    # DELETE lari commit ni kutadi, oldingilari shu yerda qo'llanadi
+                    with self._lock:
+                        deleted = list(self.discarded)
+                    conn.executemany(self.delete_sql, deleted)
+        finally:
+            conn.close()
+
+    def flush(self):
+        """Buferdagi barcha qatorlarni bitta tranzaksiyada yozish; yozilganlar sonini qaytaradi"""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            if not self.pending:
+                return 0
+            batch = self.inflight = self.pending
+            self.pending = {}
+        try:
+            self._write(list(batch.values()), tombstones=True)
+        except Exception:
+            # Yozilmagan qatorlarni qaytarish (shu orada kelgan yangilari ustun, bekor qilinganlari tashlanadi)
+            with self._lock:
+                for key, params in batch.items():
+                    if key not in self.discarded and (self.keep == 'first' or key not in self.pending):
+                        self.pending[key] = params
+                self.inflight = {}
+                self.discarded.clear()
+            raise
+        with self._lock:
+            self.inflight = {}
+            self.discarded.clear()
+        self.flushed_rows += len(batch)
+        self.flushes += 1
+        return len(batch)
+
+
+def flush_all():
+    """Barcha buferlarni sinxron yozish (to'xtashda va bazani almashtirishdan oldin)"""
+    total = 0
+    for buffer in _buffers:
+        try:
+            total += buffer.flush()
+        except Exception as e:
+            logger.error(f"Bufer '{buffer.name}' yozilmadi: {e}")
+    return total
+
+
+def stats():
+    """{bufer nomi: (kutayotgan qatorlar, jami yozilgan qatorlar, flushlar)}"""
+    return {buffer.name: (len(buffer.pending), buffer.flushed_rows, buffer.flushes) for buffer in _buffers}
+
+
+async def run_flusher(max_delay=WRITE_BUFFER_MAX_DELAY_MS / 1000):
+    """Buferlashni yoqish va buferlarni vaqt yoki hajm bo'yicha yozib turish"""
+    loop = asyncio.get_running_loop()
+    full = asyncio.Event()
+    for buffer in _buffers:
+        buffer._full = full
+        buffer._loop = loop
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(full.wait(), timeout=max_delay)
+            except asyncio.TimeoutError:
+                pass
+            full.clear()
+            if any(buffer.pending for buffer in _buffers):
+                started = time.perf_counter()
+                count = await asyncio.to_thread(flush_all)
+                logger.debug(f"Write buffer: {count} qator, {time.perf_counter() - started:.3f} s")
+    finally:
+        # Flusher to'xtadi - keyingi yozuvlar darhol yoziladi, qolganlari shu yerda yoziladi
+        for buffer in _buffers:
+            buffer._loop = None
+        flush_all()